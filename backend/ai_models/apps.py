@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AiModelsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ai_models"
+
+    def ready(self):
+        import ai_models.signals
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_models", "0002_posturediagnosis"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="posturediagnosis",
+            name="snapshot_variants",
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name="快照缩略图"
+            ),
+        ),
+    ]
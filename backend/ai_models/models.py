@@ -60,6 +60,7 @@ class PostureDiagnosis(models.Model):
     
     # 图片/关键点数据
     snapshot = models.ImageField("快照", upload_to='posture_snapshots/', null=True, blank=True)
+    snapshot_variants = models.JSONField("快照缩略图", default=dict, blank=True, editable=False)
     landmarks_data = models.JSONField("关键点原始数据", null=True, blank=True)
     
     suggested_exercises = models.ManyToManyField(Exercise, blank=True, verbose_name="纠正性训练建议")
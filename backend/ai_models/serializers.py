@@ -1,19 +1,25 @@
 from rest_framework import serializers
 from .models import AIAnalysisSession, AIModelConfig, PostureDiagnosis
 from exercises.serializers import ExerciseSerializer
+from utils.media_derivatives import SNAPSHOT_DISPLAY_WIDTH, VariantURLsField, pick_variant
 
 class PostureDiagnosisSerializer(serializers.ModelSerializer):
     suggested_exercises_detail = ExerciseSerializer(source='suggested_exercises', many=True, read_only=True)
+    snapshot_thumb = serializers.SerializerMethodField()
+    snapshot_variants = VariantURLsField()
 
     class Meta:
         model = PostureDiagnosis
         fields = (
             'id', 'diagnosis_type', 'score', 'summary', 'detailed_report', 
-            'snapshot', 'landmarks_data', 'suggested_exercises', 
+            'snapshot', 'snapshot_thumb', 'snapshot_variants', 'landmarks_data', 'suggested_exercises', 
             'suggested_exercises_detail', 'created_at'
         )
         read_only_fields = ('user', 'created_at')
 
+    def get_snapshot_thumb(self, obj):
+        """列表里展示的 WebP 缩略图，尚未生成时为 None (使用 snapshot 原图)"""
+        return pick_variant(self.context.get('request'), obj.snapshot_variants, SNAPSHOT_DISPLAY_WIDTH)
 class AIAnalysisSessionSerializer(serializers.ModelSerializer):
     class Meta:
         model = AIAnalysisSession
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from utils.media_derivatives import schedule_derivatives
+from .models import PostureDiagnosis
+
+
+@receiver(post_save, sender=PostureDiagnosis)
+def generate_snapshot_derivatives(sender, instance, **kwargs):
+    """诊断快照保存后生成多档 WebP 缩略图"""
+    schedule_derivatives(instance, 'snapshot')
@@ -1,11 +1,21 @@
 from django.contrib import admin
-from .models import UserDailyStats, UserBodyMetric, ExerciseProgress
+from .models import UserDailyStats, UserPeriodStats, UserMuscleVolume, UserBodyMetric, ExerciseProgress, ExercisePersonalRecord
 
 @admin.register(UserDailyStats)
 class UserDailyStatsAdmin(admin.ModelAdmin):
     list_display = ('user', 'date', 'total_duration_minutes', 'total_calories_burned', 'average_form_score')
     list_filter = ('date', 'user')
 
+@admin.register(UserPeriodStats)
+class UserPeriodStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'period', 'period_start', 'total_duration_minutes', 'total_calories_burned', 'completed_sessions')
+    list_filter = ('period', 'user')
+
+@admin.register(UserMuscleVolume)
+class UserMuscleVolumeAdmin(admin.ModelAdmin):
+    list_display = ('user', 'date', 'muscle', 'volume', 'sets_count')
+    list_filter = ('muscle', 'user')
+
 @admin.register(UserBodyMetric)
 class UserBodyMetricAdmin(admin.ModelAdmin):
     list_display = ('user', 'date', 'weight', 'bmi')
@@ -13,5 +23,10 @@ class UserBodyMetricAdmin(admin.ModelAdmin):
 
 @admin.register(ExerciseProgress)
 class ExerciseProgressAdmin(admin.ModelAdmin):
-    list_display = ('user', 'exercise', 'date', 'max_weight', 'best_form_score')
+    list_display = ('user', 'exercise', 'date', 'max_weight', 'estimated_1rm', 'best_form_score')
+    list_filter = ('exercise', 'user')
+
+@admin.register(ExercisePersonalRecord)
+class ExercisePersonalRecordAdmin(admin.ModelAdmin):
+    list_display = ('user', 'exercise', 'best_weight', 'best_reps', 'best_volume', 'estimated_1rm', 'updated_at')
     list_filter = ('exercise', 'user')
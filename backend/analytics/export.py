@@ -0,0 +1,171 @@
+"""
+用户训练历史的流式导出 (CSV / JSON Lines / Parquet)
+
+所有数据集都通过 values() + iterator(chunk_size=...) 走服务端游标逐批读取，
+边读边写，内存占用与用户的历史数据量无关。Parquet 依赖 pyarrow，未安装时
+该格式不可用。
+"""
+import csv
+import json
+from datetime import date, datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+from exercises.models import UserExerciseRecord
+from training.models import UserTrainingExerciseRecord, UserTrainingSession
+from users.models import TrainingLog
+from .models import UserBodyMetric
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet 为可选格式
+    pa = pq = None
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def available_formats():
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet' or pa is not None]
+
+
+class ExportDataset:
+    """一个导出数据集：模型、归属用户的查询路径、排序和导出列 [(列名, 查询路径)]"""
+
+    def __init__(self, model, user_lookup, ordering, columns):
+        self.model = model
+        self.user_lookup = user_lookup
+        self.ordering = ordering
+        self.columns = columns
+
+    @property
+    def header(self):
+        return [name for name, _ in self.columns]
+
+    def queryset(self, user_id):
+        plain = [name for name, lookup in self.columns if name == lookup]
+        renamed = {name: F(lookup) for name, lookup in self.columns if name != lookup}
+        return self.model.objects.filter(**{self.user_lookup: user_id}).order_by(
+            *self.ordering, 'pk'
+        ).values(*plain, **renamed)
+
+    def rows(self, user_id, chunk_size=EXPORT_CHUNK_SIZE):
+        return self.queryset(user_id).iterator(chunk_size=chunk_size)
+
+    def _field(self, lookup):
+        model, field = self.model, None
+        for part in lookup.split('__'):
+            field = model._meta.get_field(part)
+            model = field.related_model or model
+        if field.is_relation:
+            field = field.target_field
+        return field
+
+    def arrow_schema(self):
+        types = {
+            'AutoField': pa.int64(), 'BigAutoField': pa.int64(), 'IntegerField': pa.int64(),
+            'PositiveIntegerField': pa.int64(), 'FloatField': pa.float64(), 'BooleanField': pa.bool_(),
+            'DateField': pa.date32(), 'DateTimeField': pa.timestamp('us', tz='UTC'),
+        }
+        return pa.schema([
+            (name, types.get(self._field(lookup).get_internal_type(), pa.string()))
+            for name, lookup in self.columns
+        ])
+
+
+EXPORT_DATASETS = {
+    'sessions': ExportDataset(UserTrainingSession, 'user_id', ['start_time'], [
+        ('id', 'id'), ('plan_name', 'plan__name'), ('plan_day_number', 'plan_day__day_number'),
+        ('start_time', 'start_time'), ('end_time', 'end_time'), ('is_completed', 'is_completed'),
+        ('total_exercises', 'total_exercises'), ('completed_exercises', 'completed_exercises'),
+        ('calories_burned', 'calories_burned'), ('performance_score', 'performance_score'),
+    ]),
+    'training_records': ExportDataset(UserTrainingExerciseRecord, 'session__user_id', ['created_at'], [
+        ('id', 'id'), ('session_id', 'session_id'), ('exercise_id', 'exercise_id'),
+        ('exercise_name', 'exercise__name'), ('sets_completed', 'sets_completed'),
+        ('reps_completed', 'reps_completed'), ('weights_used', 'weights_used'),
+        ('duration_seconds_actual', 'duration_seconds_actual'), ('form_score', 'form_score'),
+        ('created_at', 'created_at'),
+    ]),
+    'exercise_records': ExportDataset(UserExerciseRecord, 'user_id', ['created_at'], [
+        ('id', 'id'), ('exercise_id', 'exercise_id'), ('exercise_name', 'exercise__name'),
+        ('count', 'count'), ('duration', 'duration'), ('accuracy_score', 'accuracy_score'),
+        ('calories_burned', 'calories_burned'), ('created_at', 'created_at'),
+    ]),
+    'logs': ExportDataset(TrainingLog, 'user_id', ['created_at'], [
+        ('id', 'id'), ('action_name', 'action_name'), ('count', 'count'), ('duration', 'duration'),
+        ('accuracy_score', 'accuracy_score'), ('calories', 'calories'), ('created_at', 'created_at'),
+    ]),
+    'body_metrics': ExportDataset(UserBodyMetric, 'user_id', ['date'], [
+        ('date', 'date'), ('weight', 'weight'), ('height', 'height'),
+        ('body_fat_percentage', 'body_fat_percentage'), ('muscle_mass', 'muscle_mass'), ('bmi', 'bmi'),
+    ]),
+}
+
+
+def _flat(value):
+    """CSV / Parquet 的单元格取值：JSON 字段序列化为字符串"""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """csv.writer 的伪文件对象：write 直接返回整行，供生成器逐行产出"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(name, user_id, chunk_size=EXPORT_CHUNK_SIZE):
+    dataset = EXPORT_DATASETS[name]
+    writer = csv.writer(_Echo())
+    yield writer.writerow(dataset.header)
+    for row in dataset.rows(user_id, chunk_size):
+        yield writer.writerow([_flat(row[column]) for column in dataset.header])
+
+
+def iter_jsonl(names, user_id, chunk_size=EXPORT_CHUNK_SIZE):
+    """多个数据集依次输出到同一个流，每行带 dataset 字段区分来源"""
+    for name in names:
+        dataset = EXPORT_DATASETS[name]
+        for row in dataset.rows(user_id, chunk_size):
+            line = {'dataset': name}
+            line.update((column, row[column]) for column in dataset.header)
+            yield json.dumps(line, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def write_parquet(name, user_id, fileobj, chunk_size=EXPORT_CHUNK_SIZE):
+    """按 chunk_size 行一个 row group 写入 Parquet，返回写入的行数"""
+    if pa is None:
+        raise RuntimeError("Parquet 导出需要安装 pyarrow")
+    dataset = EXPORT_DATASETS[name]
+    schema = dataset.arrow_schema()
+    json_columns = [
+        column for column, lookup in dataset.columns
+        if dataset._field(lookup).get_internal_type() == 'JSONField'
+    ]
+    total = 0
+    with pq.ParquetWriter(fileobj, schema) as writer:
+        batch = []
+        for row in dataset.rows(user_id, chunk_size):
+            for column in json_columns:
+                row[column] = _flat(row[column])
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                total += len(batch)
+                batch = []
+        if batch or not total:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            total += len(batch)
+    return total
@@ -0,0 +1,258 @@
+"""
+基于 Redis 有序集合的社区排行榜
+
+榜单: 本周卡路里、本周训练分钟数、当前连续训练天数，各有全站榜和按运动基础
+(UserProfile.fitness_level) 划分的分组榜。周榜分数取自 UserPeriodStats 的周汇总，
+连续天数取自 UserStats，二者变化时用 ZADD 写入绝对值 (重复写入幂等，不会漂移)；
+排名与邻近名次查询均为 O(log n)。定时任务从数据库全量重建做对账。
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from users.models import UserProfile, UserStats
+from .models import UserPeriodStats
+
+LEADERBOARD_PREFIX = "lb"
+WEEKLY_METRICS = {
+    'calories': 'total_calories_burned',
+    'minutes': 'total_duration_minutes',
+}
+METRICS = tuple(WEEKLY_METRICS) + ('streak',)
+COHORTS = tuple(value for value, _ in UserProfile._meta.get_field('fitness_level').choices)
+ALL_COHORT = 'all'
+
+# 周榜保留的周数 (含本周)，过期的 key 由 Redis 自动清理
+WEEKS_KEPT = 5
+REBUILD_BATCH_SIZE = 1000
+
+
+def _redis():
+    """默认缓存为 django-redis 时返回底层连接，否则 (如测试用本地内存缓存) 返回 None"""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        return None
+
+
+def board_key(metric, cohort=ALL_COHORT, week_start=None):
+    if metric == 'streak':
+        return f"{LEADERBOARD_PREFIX}:streak:{cohort}"
+    return f"{LEADERBOARD_PREFIX}:{metric}:{week_start.isoformat()}:{cohort}"
+
+
+def current_week_start(today=None):
+    today = today or timezone.localdate()
+    return today - timedelta(days=today.weekday())
+
+
+def effective_streak(current_streak, last_training_date, today=None):
+    """昨天及以前都没练的用户连续天数已中断，榜单上按 0 计"""
+    today = today or timezone.localdate()
+    if not last_training_date or (today - last_training_date).days > 1:
+        return 0
+    return current_streak
+
+
+def _cohort_of(user_id):
+    return UserProfile.objects.filter(user_id=user_id).values_list('fitness_level', flat=True).first()
+
+
+def _keys_for(metric, cohort, week_start=None):
+    keys = [board_key(metric, ALL_COHORT, week_start)]
+    if cohort:
+        keys.append(board_key(metric, cohort, week_start))
+    return keys
+
+
+def _week_ttl(week_start):
+    """周榜的过期秒数：该周开始后 WEEKS_KEPT 周过期，至少保留一天"""
+    remaining = week_start + timedelta(weeks=WEEKS_KEPT) - timezone.localdate()
+    return max(remaining.days * 86400, 86400)
+
+
+class LeaderboardService:
+    """排行榜的增量写入、查询与全量重建；Redis 不可用时写入静默跳过"""
+
+    @staticmethod
+    def _write(apply):
+        """事务提交后执行，排行榜出错不影响训练数据的写入"""
+        def run():
+            client = _redis()
+            if client is None:
+                return
+            try:
+                pipe = client.pipeline(transaction=False)
+                apply(pipe)
+                pipe.execute()
+            except RedisError as exc:
+                print(f"排行榜更新失败: {exc}")
+        transaction.on_commit(run)
+
+    @staticmethod
+    def update_week(user_id, week_start, totals):
+        """某用户某周的汇总变化后调用，totals 为 None 表示该周已无训练"""
+        if week_start <= current_week_start() - timedelta(weeks=WEEKS_KEPT):
+            return
+        cohort = _cohort_of(user_id)
+        ttl = _week_ttl(week_start)
+
+        def apply(pipe):
+            for metric, field in WEEKLY_METRICS.items():
+                for key in _keys_for(metric, cohort, week_start):
+                    if totals and totals.get(field):
+                        pipe.zadd(key, {user_id: float(totals[field])})
+                        pipe.expire(key, ttl)
+                    else:
+                        pipe.zrem(key, user_id)
+        LeaderboardService._write(apply)
+
+    @staticmethod
+    def update_streak(user_id, current_streak, last_training_date):
+        score = effective_streak(current_streak, last_training_date)
+        cohort = _cohort_of(user_id)
+
+        def apply(pipe):
+            for key in _keys_for('streak', cohort):
+                if score:
+                    pipe.zadd(key, {user_id: score})
+                else:
+                    pipe.zrem(key, user_id)
+        LeaderboardService._write(apply)
+
+    @staticmethod
+    def move_cohort(user_id, old_cohort, new_cohort):
+        """运动基础变化时把分数从旧分组榜搬到新分组榜"""
+        client = _redis()
+        if client is None:
+            return
+        week_start = current_week_start()
+        keys = [('streak', None)] + [(metric, week_start) for metric in WEEKLY_METRICS]
+        try:
+            for metric, week in keys:
+                old_key, new_key = board_key(metric, old_cohort, week), board_key(metric, new_cohort, week)
+                score = client.zscore(old_key, user_id)
+                if score is None:
+                    continue
+                pipe = client.pipeline(transaction=True)
+                pipe.zrem(old_key, user_id)
+                pipe.zadd(new_key, {user_id: score})
+                if week:
+                    pipe.expire(new_key, _week_ttl(week))
+                pipe.execute()
+        except RedisError as exc:
+            print(f"排行榜分组迁移失败: {exc}")
+
+    @staticmethod
+    def _entries(rows, start):
+        return [
+            {'rank': start + i + 1, 'user_id': int(member), 'score': score}
+            for i, (member, score) in enumerate(rows)
+        ]
+
+    @staticmethod
+    def standings(metric, cohort=ALL_COHORT, user_id=None, limit=10, radius=2, week_start=None):
+        """
+        榜单前 limit 名，以及 user_id 的名次和前后各 radius 名邻近用户。
+        Redis 不可用时返回 None。
+        """
+        client = _redis()
+        if client is None:
+            return None
+        key = board_key(metric, cohort, week_start or current_week_start())
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.zcard(key)
+            pipe.zrevrange(key, 0, limit - 1, withscores=True)
+            if user_id is not None:
+                pipe.zrevrank(key, user_id)
+                pipe.zscore(key, user_id)
+            results = pipe.execute()
+
+            data = {
+                'total': results[0],
+                'top': LeaderboardService._entries(results[1], 0),
+                'me': None,
+                'neighborhood': [],
+            }
+            if user_id is not None and results[2] is not None:
+                rank = results[2]
+                data['me'] = {'rank': rank + 1, 'score': results[3]}
+                start = max(rank - radius, 0)
+                data['neighborhood'] = LeaderboardService._entries(
+                    client.zrevrange(key, start, rank + radius, withscores=True), start
+                )
+        except RedisError as exc:
+            print(f"排行榜查询失败: {exc}")
+            return None
+        return data
+
+    @staticmethod
+    def scores_from_db(metric, week_start=None, today=None):
+        """从数据库流式读出 (user_id, 运动基础, 分数)，供全量重建使用"""
+        if metric == 'streak':
+            rows = UserStats.objects.filter(current_training_streak__gt=0).values_list(
+                'user_id', 'user__profile__fitness_level', 'current_training_streak', 'last_training_date'
+            )
+            for user_id, cohort, streak, last_date in rows.iterator(chunk_size=REBUILD_BATCH_SIZE):
+                score = effective_streak(streak, last_date, today)
+                if score:
+                    yield user_id, cohort, score
+            return
+
+        field = WEEKLY_METRICS[metric]
+        rows = UserPeriodStats.objects.filter(
+            period='week', period_start=week_start, **{f'{field}__gt': 0}
+        ).values_list('user_id', 'user__profile__fitness_level', field)
+        for user_id, cohort, score in rows.iterator(chunk_size=REBUILD_BATCH_SIZE):
+            yield user_id, cohort, float(score)
+
+    @staticmethod
+    def rebuild(today=None):
+        """
+        从数据库全量重建本周周榜和连续天数榜：先写入临时 key，
+        写完后用 RENAME 原子替换，重建期间读到的始终是完整榜单。返回写入的条目数
+        """
+        client = _redis()
+        if client is None:
+            return 0
+        week_start = current_week_start(today)
+        written = 0
+        for metric in METRICS:
+            week = None if metric == 'streak' else week_start
+            targets = {cohort: board_key(metric, cohort, week) for cohort in (ALL_COHORT,) + COHORTS}
+            staging = {cohort: f"{key}:rebuild" for cohort, key in targets.items()}
+            client.delete(*staging.values())
+
+            pending = {}
+            for user_id, cohort, score in LeaderboardService.scores_from_db(metric, week, today):
+                for name in (ALL_COHORT, cohort):
+                    if name in staging:
+                        pending.setdefault(staging[name], {})[user_id] = score
+                written += 1
+                if written % REBUILD_BATCH_SIZE == 0:
+                    LeaderboardService._flush(client, pending)
+                    pending = {}
+            LeaderboardService._flush(client, pending)
+
+            pipe = client.pipeline(transaction=True)
+            for cohort, key in targets.items():
+                if client.exists(staging[cohort]):
+                    pipe.rename(staging[cohort], key)
+                    if week:
+                        pipe.expire(key, _week_ttl(week))
+                else:
+                    # 空榜单没有临时 key，直接删除旧榜
+                    pipe.delete(key)
+            pipe.execute()
+        return written
+
+    @staticmethod
+    def _flush(client, pending):
+        pipe = client.pipeline(transaction=False)
+        for key, mapping in pending.items():
+            pipe.zadd(key, mapping)
+        pipe.execute()
@@ -0,0 +1,40 @@
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from analytics.export import EXPORT_DATASETS, EXPORT_FORMATS, available_formats, iter_csv, iter_jsonl, write_parquet
+
+
+class Command(BaseCommand):
+    help = '流式导出用户训练历史 (训练会话、动作记录、训练日志、身体指标)，每个数据集一个文件'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', required=True,
+                            help='要导出的用户 ID，可重复传入')
+        parser.add_argument('--format', dest='fmt', default='jsonl', choices=list(EXPORT_FORMATS),
+                            help='导出格式，parquet 需要安装 pyarrow')
+        parser.add_argument('--dataset', action='append', dest='datasets', choices=list(EXPORT_DATASETS),
+                            help='只导出指定数据集，可重复传入，默认全部')
+        parser.add_argument('--output-dir', default='.', help='输出目录')
+
+    def handle(self, *args, **options):
+        fmt = options['fmt']
+        if fmt not in available_formats():
+            raise CommandError("Parquet 导出需要安装 pyarrow")
+        names = options.get('datasets') or list(EXPORT_DATASETS)
+        output_dir = options['output_dir']
+        os.makedirs(output_dir, exist_ok=True)
+
+        users = User.objects.filter(id__in=options['user_ids']).values_list('id', 'username')
+        for user_id, username in users:
+            for name in names:
+                path = os.path.join(output_dir, f"{username}_{name}.{EXPORT_FORMATS[fmt][1]}")
+                if fmt == 'parquet':
+                    with open(path, 'wb') as fileobj:
+                        write_parquet(name, user_id, fileobj)
+                else:
+                    stream = iter_csv(name, user_id) if fmt == 'csv' else iter_jsonl([name], user_id)
+                    with open(path, 'w', encoding='utf-8', newline='') as fileobj:
+                        fileobj.writelines(stream)
+                self.stdout.write(f"已导出 {path}")
+        self.stdout.write(self.style.SUCCESS("导出完成。"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+from analytics.leaderboards import LeaderboardService, _redis
+
+
+class Command(BaseCommand):
+    help = '从数据库全量重建 Redis 排行榜 (本周卡路里、训练分钟数、连续训练天数)'
+
+    def handle(self, *args, **options):
+        if _redis() is None:
+            raise CommandError("排行榜需要默认缓存使用 django-redis")
+        self.stdout.write("正在重建排行榜...")
+        count = LeaderboardService.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"已写入 {count} 条排行榜分数。"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from analytics.services import MuscleVolumeService
+
+
+class Command(BaseCommand):
+    help = '由训练组明细全量重建用户 × 部位 × 日期训练量 (UserMuscleVolume)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='只重建指定用户 ID，可重复传入')
+
+    def handle(self, *args, **options):
+        user_ids = options.get('user_ids')
+        self.stdout.write("正在重建部位训练量...")
+        count = MuscleVolumeService.rebuild(user_ids=user_ids)
+        self.stdout.write(self.style.SUCCESS(f"已写入 {count} 条部位训练量。"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from analytics.services import PeriodStatsService
+
+
+class Command(BaseCommand):
+    help = '由 UserDailyStats 全量重建按周/按月的预聚合统计 (UserPeriodStats)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='只重建指定用户 ID，可重复传入')
+
+    def handle(self, *args, **options):
+        user_ids = options.get('user_ids')
+        self.stdout.write("正在重建周期统计数据...")
+        count = PeriodStatsService.rebuild(user_ids=user_ids)
+        self.stdout.write(self.style.SUCCESS(f"已写入 {count} 条周期统计。"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from analytics.services import PersonalRecordService
+
+
+class Command(BaseCommand):
+    help = '回填每日估算 1RM (ExerciseProgress.estimated_1rm) 并全量重建个人最佳记录 (ExercisePersonalRecord)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='只重建指定用户 ID，可重复传入')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='逐组明细每批读取的行数')
+        parser.add_argument('--skip-1rm', action='store_true', help='跳过 1RM 回填，只由现有每日行重建 PR')
+
+    def handle(self, *args, **options):
+        user_ids = options.get('user_ids')
+        if not options['skip_1rm']:
+            self.stdout.write("正在回填每日估算 1RM...")
+            count = PersonalRecordService.backfill_1rm(user_ids=user_ids, chunk_size=options['chunk_size'])
+            self.stdout.write(f"已回填 {count} 条每日 1RM。")
+        self.stdout.write("正在重建个人最佳记录...")
+        count = PersonalRecordService.rebuild(user_ids=user_ids)
+        self.stdout.write(self.style.SUCCESS(f"已写入 {count} 条个人最佳记录。"))
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserPeriodStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("week", "周"), ("month", "月")],
+                        max_length=10,
+                        verbose_name="统计粒度",
+                    ),
+                ),
+                (
+                    "period_start",
+                    models.DateField(
+                        help_text="周为周一，月为 1 号", verbose_name="周期开始日期"
+                    ),
+                ),
+                (
+                    "total_duration_minutes",
+                    models.IntegerField(default=0, verbose_name="总训练时长(分)"),
+                ),
+                (
+                    "total_calories_burned",
+                    models.FloatField(default=0.0, verbose_name="总消耗卡路里"),
+                ),
+                (
+                    "completed_sessions",
+                    models.IntegerField(default=0, verbose_name="完成会话数"),
+                ),
+                (
+                    "completed_exercises",
+                    models.IntegerField(default=0, verbose_name="完成动作数"),
+                ),
+                ("days_count", models.IntegerField(default=0, verbose_name="统计天数")),
+                (
+                    "form_score_sum",
+                    models.FloatField(default=0.0, verbose_name="每日平均评分之和"),
+                ),
+                (
+                    "average_form_score",
+                    models.FloatField(default=0.0, verbose_name="平均动作评分"),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="period_stats",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "周期统计",
+                "verbose_name_plural": "周期统计",
+                "ordering": ["-period_start"],
+                "unique_together": {("user", "period", "period_start")},
+            },
+        ),
+    ]
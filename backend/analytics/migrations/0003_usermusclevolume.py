@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0002_userperiodstats"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserMuscleVolume",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="统计日期")),
+                (
+                    "muscle",
+                    models.CharField(
+                        choices=[
+                            ("chest", "胸部"),
+                            ("back", "背部"),
+                            ("shoulders", "肩部"),
+                            ("arms", "手臂"),
+                            ("abs", "腹部"),
+                            ("legs", "腿部"),
+                            ("glutes", "臀部"),
+                            ("full_body", "全身"),
+                        ],
+                        max_length=20,
+                        verbose_name="目标肌群",
+                    ),
+                ),
+                ("volume", models.FloatField(default=0.0, verbose_name="训练量 (kg)")),
+                ("sets_count", models.IntegerField(default=0, verbose_name="有效组数")),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="muscle_volumes",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "部位训练量",
+                "verbose_name_plural": "部位训练量",
+                "ordering": ["-date", "muscle"],
+                "unique_together": {("user", "date", "muscle")},
+            },
+        ),
+    ]
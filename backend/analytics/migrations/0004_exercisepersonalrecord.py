@@ -0,0 +1,111 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("analytics", "0003_usermusclevolume"),
+        ("exercises", "0006_exercise_tags"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exerciseprogress",
+            name="estimated_1rm",
+            field=models.FloatField(
+                default=0.0,
+                help_text="当天各组按 Epley 公式估算的最大值",
+                verbose_name="估算 1RM (kg)",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ExercisePersonalRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "best_weight",
+                    models.FloatField(default=0.0, verbose_name="最大重量 (kg)"),
+                ),
+                (
+                    "best_weight_date",
+                    models.DateField(
+                        blank=True, null=True, verbose_name="最大重量达成日期"
+                    ),
+                ),
+                (
+                    "best_reps",
+                    models.IntegerField(default=0, verbose_name="最高单组次数"),
+                ),
+                (
+                    "best_reps_date",
+                    models.DateField(
+                        blank=True, null=True, verbose_name="最高次数达成日期"
+                    ),
+                ),
+                (
+                    "best_volume",
+                    models.FloatField(default=0.0, verbose_name="单日最大训练量 (kg)"),
+                ),
+                (
+                    "best_volume_date",
+                    models.DateField(
+                        blank=True, null=True, verbose_name="最大训练量达成日期"
+                    ),
+                ),
+                (
+                    "best_form_score",
+                    models.FloatField(default=0.0, verbose_name="最佳动作评分"),
+                ),
+                (
+                    "best_form_score_date",
+                    models.DateField(
+                        blank=True, null=True, verbose_name="最佳评分达成日期"
+                    ),
+                ),
+                (
+                    "estimated_1rm",
+                    models.FloatField(default=0.0, verbose_name="估算 1RM (kg)"),
+                ),
+                (
+                    "estimated_1rm_date",
+                    models.DateField(
+                        blank=True, null=True, verbose_name="1RM 达成日期"
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "exercise",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="exercises.exercise",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="personal_records",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "个人最佳记录",
+                "verbose_name_plural": "个人最佳记录",
+                "unique_together": {("user", "exercise")},
+            },
+        ),
+    ]
@@ -26,6 +26,56 @@ class UserDailyStats(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.date}"
 
+class UserPeriodStats(models.Model):
+    """按周/按月预聚合的训练统计，由 UserDailyStats 汇总而来，供长区间报表使用"""
+    PERIOD_CHOICES = [
+        ('week', '周'),
+        ('month', '月'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='period_stats')
+    period = models.CharField("统计粒度", max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField("周期开始日期", help_text="周为周一，月为 1 号")
+
+    total_duration_minutes = models.IntegerField("总训练时长(分)", default=0)
+    total_calories_burned = models.FloatField("总消耗卡路里", default=0.0)
+    completed_sessions = models.IntegerField("完成会话数", default=0)
+    completed_exercises = models.IntegerField("完成动作数", default=0)
+
+    # 平均评分按“每日平均分的平均”计算，保留分子分母以便跨周期合并
+    days_count = models.IntegerField("统计天数", default=0)
+    form_score_sum = models.FloatField("每日平均评分之和", default=0.0)
+    average_form_score = models.FloatField("平均动作评分", default=0.0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "周期统计"
+        verbose_name_plural = "周期统计"
+        unique_together = ('user', 'period', 'period_start')
+        ordering = ['-period_start']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.get_period_display()} {self.period_start}"
+
+class UserMuscleVolume(models.Model):
+    """用户每个部位每天的训练量 (重量 * 次数，自重组按固定系数折算)，随动作记录增量维护"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='muscle_volumes')
+    date = models.DateField("统计日期")
+    muscle = models.CharField("目标肌群", max_length=20, choices=Exercise.TARGET_MUSCLE_CHOICES)
+
+    volume = models.FloatField("训练量 (kg)", default=0.0)
+    sets_count = models.IntegerField("有效组数", default=0)
+
+    class Meta:
+        verbose_name = "部位训练量"
+        verbose_name_plural = "部位训练量"
+        unique_together = ('user', 'date', 'muscle')
+        ordering = ['-date', 'muscle']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.date} {self.get_muscle_display()}: {self.volume}"
+
 class UserBodyMetric(models.Model):
     """用户身体指标历史记录"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='body_metrics')
@@ -60,6 +110,7 @@ class ExerciseProgress(models.Model):
     max_reps = models.IntegerField("最高单组次数", default=0)
     total_volume = models.FloatField("总训练量 (kg)", default=0.0, help_text="重量 * 次数 * 组数")
     best_form_score = models.FloatField("最佳动作评分", default=0.0)
+    estimated_1rm = models.FloatField("估算 1RM (kg)", default=0.0, help_text="当天各组按 Epley 公式估算的最大值")
 
     class Meta:
         verbose_name = "动作进步追踪"
@@ -68,3 +119,30 @@ class ExerciseProgress(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.exercise.name} - {self.date}"
+
+
+class ExercisePersonalRecord(models.Model):
+    """用户在某动作上的历史最佳 (PR)，由 ExerciseProgress 的每日最大值增量维护"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='personal_records')
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE)
+
+    best_weight = models.FloatField("最大重量 (kg)", default=0.0)
+    best_weight_date = models.DateField("最大重量达成日期", null=True, blank=True)
+    best_reps = models.IntegerField("最高单组次数", default=0)
+    best_reps_date = models.DateField("最高次数达成日期", null=True, blank=True)
+    best_volume = models.FloatField("单日最大训练量 (kg)", default=0.0)
+    best_volume_date = models.DateField("最大训练量达成日期", null=True, blank=True)
+    best_form_score = models.FloatField("最佳动作评分", default=0.0)
+    best_form_score_date = models.DateField("最佳评分达成日期", null=True, blank=True)
+    estimated_1rm = models.FloatField("估算 1RM (kg)", default=0.0)
+    estimated_1rm_date = models.DateField("1RM 达成日期", null=True, blank=True)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "个人最佳记录"
+        verbose_name_plural = "个人最佳记录"
+        unique_together = ('user', 'exercise')
+
+    def __str__(self):
+        return f"{self.user.username} - {self.exercise.name} PR"
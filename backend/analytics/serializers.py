@@ -1,11 +1,16 @@
 from rest_framework import serializers
-from .models import UserDailyStats, UserBodyMetric, ExerciseProgress
+from .models import UserDailyStats, UserPeriodStats, UserBodyMetric, ExerciseProgress, ExercisePersonalRecord
 
 class UserDailyStatsSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserDailyStats
         fields = '__all__'
 
+class UserPeriodStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserPeriodStats
+        exclude = ('days_count', 'form_score_sum')
+
 class UserBodyMetricSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserBodyMetric
@@ -17,3 +22,10 @@ class ExerciseProgressSerializer(serializers.ModelSerializer):
     class Meta:
         model = ExerciseProgress
         fields = '__all__'
+
+class ExercisePersonalRecordSerializer(serializers.ModelSerializer):
+    exercise_name = serializers.ReadOnlyField(source='exercise.name')
+
+    class Meta:
+        model = ExercisePersonalRecord
+        exclude = ('user',)
@@ -0,0 +1,715 @@
+import threading
+from abc import ABC, abstractmethod
+from datetime import timedelta
+from itertools import groupby
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Case, Count, DurationField, ExpressionWrapper, F, FloatField, Max, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from exercises.models import Exercise
+from training.models import UserTrainingExerciseRecord, UserTrainingExerciseSet, UserTrainingSession
+from .models import ExercisePersonalRecord, ExerciseProgress, UserDailyStats, UserMuscleVolume, UserPeriodStats
+
+
+# 没填重量的自重动作 (如俯卧撑) 按固定系数折算部位训练量
+BODYWEIGHT_LOAD_KG = 20.0
+
+# Epley 公式只在中低次数区间可靠，超过该次数的组不参与 1RM 估算
+E1RM_MAX_REPS = 12
+
+
+def estimate_1rm(weight, reps):
+    """Epley 公式: 1RM = 重量 × (1 + 次数 / 30)，单次即为重量本身"""
+    if weight is None or reps is None or not 1 <= reps <= E1RM_MAX_REPS:
+        return 0.0
+    return float(weight) if reps == 1 else weight * (1 + reps / 30)
+
+
+def estimate_1rm_array(weights, reps):
+    """estimate_1rm 的向量化版本，用于批量回填"""
+    valid = (reps >= 1) & (reps <= E1RM_MAX_REPS)
+    return np.where(valid, np.where(reps == 1, weights, weights * (1 + reps / 30)), 0.0)
+
+
+def _e1rm_expression():
+    """estimate_1rm 的 SQL 版本，在逐组明细表上聚合"""
+    return Case(
+        When(reps=1, then=F('weight')),
+        When(reps__gt=1, reps__lte=E1RM_MAX_REPS, then=F('weight') * (1 + F('reps') / 30.0)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def record_contribution(set_rows, form_score):
+    """
+    单条动作记录的贡献: (训练量, 最大重量, 最高次数, 动作评分, 部位负荷, 有效组数, 估算 1RM)
+    set_rows 为 parse_set_rows 解析出的逐组明细；部位负荷与有效组数用于部位×日期
+    训练量 (自重组按 BODYWEIGHT_LOAD_KG 折算)，其余用于进步追踪
+    """
+    volume = sum(reps * weight for _, reps, weight in set_rows if reps is not None and weight is not None)
+    max_w = max((weight for _, _, weight in set_rows if weight is not None), default=0.0)
+    max_r = max((reps for _, reps, _ in set_rows if reps is not None), default=0)
+    load = sum(
+        reps * (BODYWEIGHT_LOAD_KG if weight is None else weight)
+        for _, reps, weight in set_rows if reps is not None
+    )
+    sets = sum(1 for _, reps, _ in set_rows if reps is not None)
+    e1rm = max((estimate_1rm(weight, reps) for _, reps, weight in set_rows), default=0.0)
+    return float(volume), float(max_w), max_r, form_score or 0.0, float(load), sets, e1rm
+
+
+def refresh_exercise_progress(user_id, exercise_id, date, progress=None):
+    """
+    全量重算某用户某动作某天的进步追踪 (增量维护无法确定新最大值时的兜底)
+    训练量和最大值直接在逐组明细表上用 SQL 聚合
+    """
+    if progress is None:
+        progress, _ = ExerciseProgress.objects.get_or_create(
+            user_id=user_id, exercise_id=exercise_id, date=date
+        )
+
+    records = UserTrainingExerciseRecord.objects.filter(
+        session__user_id=user_id,
+        exercise_id=exercise_id,
+        created_at__date=date
+    )
+    sets = UserTrainingExerciseSet.objects.filter(record__in=records).aggregate(
+        volume=Sum(F('reps') * F('weight'), output_field=FloatField()),
+        max_weight=Max('weight'),
+        max_reps=Max('reps'),
+        e1rm=Max(_e1rm_expression()),
+    )
+    progress.total_volume = sets['volume'] or 0.0
+    progress.max_weight = sets['max_weight'] or 0.0
+    progress.max_reps = sets['max_reps'] or 0
+    progress.estimated_1rm = sets['e1rm'] or 0.0
+    progress.best_form_score = records.aggregate(best=Max('form_score'))['best'] or 0.0
+    progress.save()
+    return progress
+
+
+class _CommitBatch(ABC):
+    """
+    事务内合并的待办批次：同一事务里的多次变动先攒在一起，提交后只执行一次；
+    事务回滚时 Django 会丢弃 on_commit 回调，批次随之作废。不在事务中时立即执行。
+    """
+    _local = None  # 子类各自持有一个 threading.local()
+
+    @classmethod
+    def collect(cls, *args):
+        batch = getattr(cls._local, 'batch', None)
+        connection = transaction.get_connection()
+        pending = batch is not None and connection.in_atomic_block and any(
+            entry[1] == batch._run for entry in connection.run_on_commit
+        )
+        if not pending:
+            batch = cls()
+            cls._local.batch = batch
+        batch.add(*args)
+        if not pending:
+            transaction.on_commit(batch._run)
+
+    def _run(self):
+        if getattr(self._local, 'batch', None) is self:
+            self._local.batch = None
+        self.flush()
+
+    @abstractmethod
+    def add(self, *args):
+        """把一次变动并入批次"""
+
+    @abstractmethod
+    def flush(self):
+        """提交后执行批次"""
+
+
+class _ProgressBatch(_CommitBatch):
+    """ExerciseProgress 增量，key 为 (user_id, exercise_id, date)"""
+    _local = threading.local()
+
+    def __init__(self):
+        self.deltas = {}
+
+    def add(self, changes):
+        for key, contribution, sign in changes:
+            self._add(key, contribution, sign)
+
+    def _add(self, key, contribution, sign):
+        """contribution 为 None 表示不知道该记录原先的贡献，整天重新扫描"""
+        volume, max_w, max_r, score, load, sets, e1rm = contribution or (0.0,) * 7
+        delta = self.deltas.setdefault(key, {
+            'volume': 0.0, 'max_weight': 0.0, 'max_reps': 0, 'best_form_score': 0.0, 'estimated_1rm': 0.0,
+            'removed_weight': 0.0, 'removed_reps': 0, 'removed_form_score': 0.0, 'removed_1rm': 0.0,
+            'load': 0.0, 'sets': 0, 'rescan': False,
+        })
+        if contribution is None:
+            delta['rescan'] = True
+            return
+        delta['volume'] += sign * volume
+        delta['load'] += sign * load
+        delta['sets'] += sign * sets
+        if sign > 0:
+            delta['max_weight'] = max(delta['max_weight'], max_w)
+            delta['max_reps'] = max(delta['max_reps'], max_r)
+            delta['best_form_score'] = max(delta['best_form_score'], score)
+            delta['estimated_1rm'] = max(delta['estimated_1rm'], e1rm)
+        else:
+            delta['removed_weight'] = max(delta['removed_weight'], max_w)
+            delta['removed_reps'] = max(delta['removed_reps'], max_r)
+            delta['removed_form_score'] = max(delta['removed_form_score'], score)
+            delta['removed_1rm'] = max(delta['removed_1rm'], e1rm)
+
+    def flush(self):
+        pr_changes = {}
+        for (user_id, exercise_id, date), delta in self.deltas.items():
+            with transaction.atomic():
+                progress, _ = ExerciseProgress.objects.select_for_update().get_or_create(
+                    user_id=user_id, exercise_id=exercise_id, date=date
+                )
+                before = PersonalRecordService.day_values(progress)
+                # 被删掉/改小的记录恰好持有当前最大值时，新最大值只能重新扫描得到
+                held_max = delta['rescan'] or (
+                    (delta['removed_weight'] > 0 and delta['removed_weight'] >= progress.max_weight)
+                    or (delta['removed_reps'] > 0 and delta['removed_reps'] >= progress.max_reps)
+                    or (delta['removed_form_score'] > 0 and delta['removed_form_score'] >= progress.best_form_score)
+                    or (delta['removed_1rm'] > 0 and delta['removed_1rm'] >= progress.estimated_1rm)
+                )
+                if held_max:
+                    refresh_exercise_progress(user_id, exercise_id, date, progress=progress)
+                else:
+                    progress.total_volume = max(progress.total_volume + delta['volume'], 0.0)
+                    progress.max_weight = max(progress.max_weight, delta['max_weight'])
+                    progress.max_reps = max(progress.max_reps, delta['max_reps'])
+                    progress.best_form_score = max(progress.best_form_score, delta['best_form_score'])
+                    progress.estimated_1rm = max(progress.estimated_1rm, delta['estimated_1rm'])
+                    progress.save()
+            pr_changes.setdefault((user_id, exercise_id), []).append(
+                (date, before, PersonalRecordService.day_values(progress))
+            )
+
+        PersonalRecordService.apply(pr_changes)
+        MuscleVolumeService.apply(self.deltas)
+        MuscleVolumeService.refresh_days([key for key, delta in self.deltas.items() if delta['rescan']])
+
+
+class ExerciseProgressAggregator:
+    """
+    ExerciseProgress (以及部位×日期训练量) 的增量维护
+
+    记录的增删改只换算成对 (用户, 动作, 日期) 的增量：训练量直接加减，
+    最大值取 max，删除或改小持有最大值的记录时才回退到全量重算。同一事务内
+    的增量先合并，提交后每个 key 只写一次库。
+    """
+
+    @staticmethod
+    def record_key(user_id, record):
+        return (user_id, record.exercise_id, timezone.localtime(record.created_at).date())
+
+    @staticmethod
+    def add_records(user_id, records):
+        """批量写入 (bulk_create 不触发信号) 后调用"""
+        changes = [
+            (ExerciseProgressAggregator.record_key(user_id, record),
+             record_contribution(record.set_rows(), record.form_score), 1)
+            for record in records
+        ]
+        if changes:
+            _ProgressBatch.collect(changes)
+
+    @staticmethod
+    def replace(old_key, old_contribution, new_key, new_contribution):
+        changes = []
+        if old_key is not None:
+            changes.append((old_key, old_contribution, -1))
+        if new_key is not None:
+            changes.append((new_key, new_contribution, 1))
+        if changes:
+            _ProgressBatch.collect(changes)
+
+    @staticmethod
+    def rescan(*keys):
+        """记录原先的贡献未知 (加载时相关字段被延迟) 时，提交后按逐组明细重算这些天"""
+        changes = [(key, None, 0) for key in set(keys) if key is not None]
+        if changes:
+            _ProgressBatch.collect(changes)
+
+
+class PersonalRecordService:
+    """
+    ExercisePersonalRecord (历史最佳) 的维护
+
+    PR 是每日进步追踪行的最大值：某天的值变大时直接比较更新 (O(1))，
+    持有 PR 的那天被改小时才重新扫描该用户该动作的每日行。
+    """
+
+    # PR 字段 -> ExerciseProgress 字段
+    FIELDS = {
+        'best_weight': 'max_weight',
+        'best_reps': 'max_reps',
+        'best_volume': 'total_volume',
+        'best_form_score': 'best_form_score',
+        'estimated_1rm': 'estimated_1rm',
+    }
+
+    @staticmethod
+    def day_values(progress):
+        return {field: getattr(progress, source) for field, source in PersonalRecordService.FIELDS.items()}
+
+    @staticmethod
+    def apply(changes):
+        """changes: {(user_id, exercise_id): [(日期, 变化前的每日值, 变化后的每日值), ...]}"""
+        for (user_id, exercise_id), days in changes.items():
+            with transaction.atomic():
+                record, _ = ExercisePersonalRecord.objects.select_for_update().get_or_create(
+                    user_id=user_id, exercise_id=exercise_id
+                )
+                lost_pr = any(
+                    before[field] > after[field] and before[field] >= getattr(record, field)
+                    for _, before, after in days for field in PersonalRecordService.FIELDS
+                )
+                if lost_pr:
+                    PersonalRecordService.refresh(user_id, exercise_id, record=record)
+                    continue
+
+                changed = False
+                for date, _, after in sorted(days, key=lambda day: day[0]):
+                    for field in PersonalRecordService.FIELDS:
+                        if after[field] > getattr(record, field):
+                            setattr(record, field, after[field])
+                            setattr(record, f'{field}_date', date)
+                            changed = True
+                if changed:
+                    record.save()
+
+    @staticmethod
+    def _best_of(days):
+        """days: 按日期升序的 (date, *每日值)，返回 {PR 字段: (最大值, 最早达成日期)}"""
+        best = {field: (0, None) for field in PersonalRecordService.FIELDS}
+        for date, *values in days:
+            for field, value in zip(PersonalRecordService.FIELDS, values):
+                if value and value > best[field][0]:
+                    best[field] = (value, date)
+        return best
+
+    @staticmethod
+    def _assign(record, best):
+        for field, (value, date) in best.items():
+            setattr(record, field, value)
+            setattr(record, f'{field}_date', date)
+
+    @staticmethod
+    def refresh(user_id, exercise_id, record=None):
+        """由该用户该动作的全部每日行重算 PR"""
+        if record is None:
+            record, _ = ExercisePersonalRecord.objects.get_or_create(user_id=user_id, exercise_id=exercise_id)
+        days = ExerciseProgress.objects.filter(user_id=user_id, exercise_id=exercise_id).order_by(
+            'date'
+        ).values_list('date', *PersonalRecordService.FIELDS.values())
+        PersonalRecordService._assign(record, PersonalRecordService._best_of(days))
+        record.save()
+        return record
+
+    @staticmethod
+    def backfill_1rm(user_ids=None, chunk_size=5000):
+        """
+        分块流式读取逐组明细，用 NumPy 批量计算每组的估算 1RM，按 (用户, 动作, 日期)
+        取最大值回填到 ExerciseProgress.estimated_1rm，返回更新的行数
+        """
+        sets = UserTrainingExerciseSet.objects.filter(
+            weight__isnull=False, reps__gte=1, reps__lte=E1RM_MAX_REPS
+        )
+        progress_rows = ExerciseProgress.objects.all()
+        if user_ids is not None:
+            sets = sets.filter(record__session__user_id__in=user_ids)
+            progress_rows = progress_rows.filter(user_id__in=user_ids)
+        progress_rows.update(estimated_1rm=0.0)
+
+        rows = sets.annotate(
+            user_id=F('record__session__user_id'),
+            exercise_id=F('record__exercise_id'),
+            day=TruncDate('record__created_at'),
+        ).order_by('user_id', 'exercise_id', 'day').values_list('user_id', 'exercise_id', 'day', 'reps', 'weight')
+
+        updated = 0
+        carry = {}
+        chunk = []
+        for row in rows.iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                carry = PersonalRecordService._reduce_chunk(chunk, carry)
+                # 数据按 key 有序，除最后一个 key 外都已完整，可以先写库
+                last = chunk[-1][:3]
+                done = {key: value for key, value in carry.items() if key != last}
+                updated += PersonalRecordService._write_1rm(done)
+                carry = {last: carry[last]}
+                chunk = []
+        if chunk:
+            carry = PersonalRecordService._reduce_chunk(chunk, carry)
+        updated += PersonalRecordService._write_1rm(carry)
+        return updated
+
+    @staticmethod
+    def _reduce_chunk(chunk, carry):
+        user_ids, exercise_ids, days, reps, weights = zip(*chunk)
+        e1rm = estimate_1rm_array(np.array(weights, dtype=np.float64), np.array(reps, dtype=np.int64))
+        users = np.array(user_ids, dtype=np.int64)
+        exercises = np.array(exercise_ids, dtype=np.int64)
+        ordinals = np.array([day.toordinal() for day in days], dtype=np.int64)
+        boundary = (users[1:] != users[:-1]) | (exercises[1:] != exercises[:-1]) | (ordinals[1:] != ordinals[:-1])
+        starts = np.flatnonzero(np.r_[True, boundary])
+        for start, value in zip(starts, np.maximum.reduceat(e1rm, starts)):
+            key = (user_ids[start], exercise_ids[start], days[start])
+            carry[key] = max(carry.get(key, 0.0), float(value))
+        return carry
+
+    @staticmethod
+    def _write_1rm(values):
+        if not values:
+            return 0
+        user_ids = {key[0] for key in values}
+        exercise_ids = {key[1] for key in values}
+        dates = [key[2] for key in values]
+        rows = ExerciseProgress.objects.filter(
+            user_id__in=user_ids, exercise_id__in=exercise_ids, date__range=(min(dates), max(dates))
+        ).values_list('pk', 'user_id', 'exercise_id', 'date')
+        changed = [
+            ExerciseProgress(pk=pk, estimated_1rm=values[(user_id, exercise_id, date)])
+            for pk, user_id, exercise_id, date in rows
+            if (user_id, exercise_id, date) in values
+        ]
+        ExerciseProgress.objects.bulk_update(changed, ['estimated_1rm'], batch_size=1000)
+        return len(changed)
+
+    @staticmethod
+    def rebuild(user_ids=None):
+        """由 ExerciseProgress 每日行全量重建 PR 表，返回写入的行数"""
+        days = ExerciseProgress.objects.all()
+        existing = ExercisePersonalRecord.objects.all()
+        if user_ids is not None:
+            days = days.filter(user_id__in=user_ids)
+            existing = existing.filter(user_id__in=user_ids)
+
+        rows = days.order_by('user_id', 'exercise_id', 'date').values_list(
+            'user_id', 'exercise_id', 'date', *PersonalRecordService.FIELDS.values()
+        )
+        records = []
+        for key, group in groupby(rows.iterator(chunk_size=2000), key=lambda row: row[:2]):
+            record = ExercisePersonalRecord(user_id=key[0], exercise_id=key[1])
+            PersonalRecordService._assign(record, PersonalRecordService._best_of(row[2:] for row in group))
+            records.append(record)
+        with transaction.atomic():
+            existing.delete()
+            ExercisePersonalRecord.objects.bulk_create(records, batch_size=1000)
+        return len(records)
+
+
+class MuscleVolumeService:
+    """UserMuscleVolume (用户 × 部位 × 日期 训练量) 的增量维护与全量重建"""
+
+    @staticmethod
+    def apply(deltas):
+        """deltas: {(user_id, exercise_id, date): {'load': ..., 'sets': ...}}，按部位合并后写入"""
+        exercise_ids = {exercise_id for _, exercise_id, _ in deltas}
+        muscles = dict(Exercise.objects.filter(id__in=exercise_ids).values_list('id', 'target_muscle'))
+
+        merged = {}
+        for (user_id, exercise_id, date), delta in deltas.items():
+            muscle = muscles.get(exercise_id)
+            if muscle is None or (not delta['load'] and not delta['sets']):
+                continue
+            load, sets = merged.get((user_id, muscle, date), (0.0, 0))
+            merged[(user_id, muscle, date)] = (load + delta['load'], sets + delta['sets'])
+
+        for (user_id, muscle, date), (load, sets) in merged.items():
+            updated = UserMuscleVolume.objects.filter(user_id=user_id, muscle=muscle, date=date).update(
+                volume=F('volume') + load, sets_count=F('sets_count') + sets
+            )
+            if not updated:
+                UserMuscleVolume.objects.get_or_create(
+                    user_id=user_id, muscle=muscle, date=date,
+                    defaults={'volume': max(load, 0.0), 'sets_count': max(sets, 0)},
+                )
+
+    @staticmethod
+    def refresh_days(keys):
+        """keys: [(user_id, exercise_id, date)]，按逐组明细重算涉及的 (用户, 部位, 日期) 行"""
+        muscles = dict(Exercise.objects.filter(id__in={key[1] for key in keys}).values_list('id', 'target_muscle'))
+        targets = {(user_id, muscles[exercise_id], date) for user_id, exercise_id, date in keys if exercise_id in muscles}
+        for user_id, muscle, date in targets:
+            row = UserTrainingExerciseSet.objects.filter(
+                reps__isnull=False, record__session__user_id=user_id,
+                record__exercise__target_muscle=muscle, record__created_at__date=date,
+            ).aggregate(
+                volume=Sum(F('reps') * Coalesce('weight', Value(BODYWEIGHT_LOAD_KG)), output_field=FloatField()),
+                sets_count=Count('id'),
+            )
+            UserMuscleVolume.objects.update_or_create(
+                user_id=user_id, muscle=muscle, date=date,
+                defaults={'volume': row['volume'] or 0.0, 'sets_count': row['sets_count']},
+            )
+
+    @staticmethod
+    def rebuild(user_ids=None):
+        """由逐组明细表按 (用户, 部位, 日期) 分组全量重建，返回写入的行数"""
+        sets = UserTrainingExerciseSet.objects.filter(reps__isnull=False)
+        existing = UserMuscleVolume.objects.all()
+        if user_ids is not None:
+            sets = sets.filter(record__session__user_id__in=user_ids)
+            existing = existing.filter(user_id__in=user_ids)
+
+        grouped = sets.annotate(
+            user_id=F('record__session__user_id'),
+            muscle=F('record__exercise__target_muscle'),
+            day=TruncDate('record__created_at'),
+        ).values('user_id', 'muscle', 'day').annotate(
+            volume=Sum(F('reps') * Coalesce('weight', Value(BODYWEIGHT_LOAD_KG)), output_field=FloatField()),
+            sets_count=Count('id'),
+        ).order_by()
+
+        rows = [
+            UserMuscleVolume(
+                user_id=row['user_id'], muscle=row['muscle'], date=row['day'],
+                volume=row['volume'] or 0.0, sets_count=row['sets_count'],
+            )
+            for row in grouped.iterator(chunk_size=2000)
+        ]
+        with transaction.atomic():
+            existing.delete()
+            UserMuscleVolume.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+class _DailyStatsBatch(_CommitBatch):
+    """待重算的 (user_id, date)，同一事务内去重"""
+    _local = threading.local()
+
+    def __init__(self):
+        self.keys = set()
+
+    def add(self, user_id, date):
+        self.keys.add((user_id, date))
+
+    def flush(self):
+        if getattr(settings, 'ANALYTICS_ROLLUP_ASYNC', False):
+            from .tasks import rollup_daily_stats
+            for user_id, date in self.keys:
+                rollup_daily_stats.delay(user_id, date.isoformat())
+            return
+        for user_id, date in self.keys:
+            DailyStatsService.rollup(user_id, date)
+
+
+class DailyStatsService:
+    """UserDailyStats 的按天汇总"""
+
+    @staticmethod
+    def session_day(session):
+        return timezone.localtime(session.start_time).date()
+
+    @staticmethod
+    def schedule(user_id, date):
+        """登记某用户某天需要重算，提交后执行 (可配置为投递到 Celery)"""
+        _DailyStatsBatch.collect(user_id, date)
+
+    @staticmethod
+    def rollup(user_id, date):
+        """一条聚合 SQL 算出当天所有完成会话的统计，时长由数据库计算"""
+        duration = ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())
+        totals = UserTrainingSession.objects.filter(
+            user_id=user_id, start_time__date=date, is_completed=True
+        ).aggregate(
+            sessions=Count('id'),
+            calories=Sum('calories_burned'),
+            form_score=Avg('performance_score'),
+            duration=Sum(duration, filter=Q(end_time__isnull=False)),
+        )
+        stats, _ = UserDailyStats.objects.update_or_create(
+            user_id=user_id,
+            date=date,
+            defaults={
+                'completed_sessions': totals['sessions'],
+                'total_calories_burned': totals['calories'] or 0,
+                'average_form_score': totals['form_score'] or 0,
+                'total_duration_minutes': int(totals['duration'].total_seconds() // 60) if totals['duration'] else 0,
+            },
+        )
+        return stats
+
+
+def week_start_of(day):
+    return day - timedelta(days=day.weekday())
+
+
+def month_start_of(day):
+    return day.replace(day=1)
+
+
+def next_month_start(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+class PeriodStatsService:
+    """UserPeriodStats (周/月汇总) 的维护与按区间查询"""
+
+    FIELDS = (
+        'total_duration_minutes', 'total_calories_burned', 'completed_sessions',
+        'completed_exercises', 'days_count', 'form_score_sum',
+    )
+
+    @staticmethod
+    def _totals(prefix, date_filter):
+        """对 UserDailyStats 的一组带条件聚合，prefix 区分同一查询里的多个周期"""
+        return {
+            f'{prefix}total_duration_minutes': Sum('total_duration_minutes', filter=date_filter),
+            f'{prefix}total_calories_burned': Sum('total_calories_burned', filter=date_filter),
+            f'{prefix}completed_sessions': Sum('completed_sessions', filter=date_filter),
+            f'{prefix}completed_exercises': Sum('completed_exercises', filter=date_filter),
+            f'{prefix}days_count': Count('id', filter=date_filter),
+            f'{prefix}form_score_sum': Sum('average_form_score', filter=date_filter),
+        }
+
+    @staticmethod
+    def refresh(user_id, day):
+        """
+        某天的日统计变化后，用一条条件聚合 SQL 重算它所在的周和月，
+        返回 {周期: 汇总值}，该周期已无数据时为 None
+        """
+        periods = {
+            'week': (week_start_of(day), week_start_of(day) + timedelta(days=6)),
+            'month': (month_start_of(day), next_month_start(day) - timedelta(days=1)),
+        }
+        aggregates = {}
+        for period, (start, end) in periods.items():
+            aggregates.update(PeriodStatsService._totals(f'{period}_', Q(date__range=(start, end))))
+        lower = min(start for start, _ in periods.values())
+        upper = max(end for _, end in periods.values())
+        totals = UserDailyStats.objects.filter(
+            user_id=user_id, date__range=(lower, upper)
+        ).aggregate(**aggregates)
+
+        results = {}
+        for period, (start, _) in periods.items():
+            values = {field: totals[f'{period}_{field}'] or 0 for field in PeriodStatsService.FIELDS}
+            if not values['days_count']:
+                UserPeriodStats.objects.filter(user_id=user_id, period=period, period_start=start).delete()
+                results[period] = None
+                continue
+            values['average_form_score'] = values['form_score_sum'] / values['days_count']
+            UserPeriodStats.objects.update_or_create(
+                user_id=user_id, period=period, period_start=start, defaults=values
+            )
+            results[period] = values
+        return results
+
+    @staticmethod
+    def rebuild(user_ids=None):
+        """按 TruncWeek / TruncMonth 分组全量重建，返回写入的行数"""
+        daily = UserDailyStats.objects.all()
+        existing = UserPeriodStats.objects.all()
+        if user_ids is not None:
+            daily = daily.filter(user_id__in=user_ids)
+            existing = existing.filter(user_id__in=user_ids)
+
+        rows = []
+        for period, trunc in (('week', TruncWeek), ('month', TruncMonth)):
+            grouped = daily.order_by().annotate(period_start=trunc('date')).values(
+                'user_id', 'period_start'
+            ).annotate(**PeriodStatsService._totals('', None))
+            for row in grouped.iterator(chunk_size=2000):
+                values = {field: row[field] or 0 for field in PeriodStatsService.FIELDS}
+                values['average_form_score'] = values['form_score_sum'] / values['days_count']
+                rows.append(UserPeriodStats(
+                    user_id=row['user_id'], period=period, period_start=row['period_start'], **values
+                ))
+
+        with transaction.atomic():
+            existing.delete()
+            UserPeriodStats.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    @staticmethod
+    def cover(start, end):
+        """
+        把闭区间 [start, end] 拆成尽量粗的片段：区间内完整的自然月用月汇总，
+        其余部分中完整的周用周汇总，剩下的零散日期用日统计。
+        返回 (月起始日列表, 周起始日列表, [(日期起, 日期止), ...])
+        """
+        months, weeks, days = [], [], []
+        if start > end:
+            return months, weeks, days
+
+        first_month = start if start.day == 1 else next_month_start(start)
+        segments = []
+        cursor = first_month
+        while next_month_start(cursor) - timedelta(days=1) <= end:
+            months.append(cursor)
+            cursor = next_month_start(cursor)
+        if months:
+            segments = [(start, months[0] - timedelta(days=1)), (cursor, end)]
+        else:
+            segments = [(start, end)]
+
+        for seg_start, seg_end in segments:
+            if seg_start > seg_end:
+                continue
+            first_week = seg_start if seg_start.weekday() == 0 else week_start_of(seg_start) + timedelta(days=7)
+            cursor = first_week
+            while cursor + timedelta(days=6) <= seg_end:
+                weeks.append(cursor)
+                cursor += timedelta(days=7)
+            if cursor == first_week:
+                days.append((seg_start, seg_end))
+                continue
+            if seg_start < first_week:
+                days.append((seg_start, first_week - timedelta(days=1)))
+            if cursor <= seg_end:
+                days.append((cursor, seg_end))
+        return months, weeks, days
+
+    @staticmethod
+    def range_totals(user_id, start, end):
+        """区间总计：日/周/月三张表各自聚合后 UNION ALL，一次查询取回"""
+        months, weeks, day_ranges = PeriodStatsService.cover(start, end)
+
+        def totals(queryset, days_count, form_score_sum):
+            return queryset.order_by().values('user_id').annotate(
+                total_duration_minutes=Sum('total_duration_minutes'),
+                total_calories_burned=Sum('total_calories_burned'),
+                completed_sessions=Sum('completed_sessions'),
+                days=days_count,
+                form_scores=form_score_sum,
+            )
+
+        parts = []
+        if day_ranges:
+            date_filter = Q()
+            for range_start, range_end in day_ranges:
+                date_filter |= Q(date__range=(range_start, range_end))
+            parts.append(totals(
+                UserDailyStats.objects.filter(date_filter, user_id=user_id),
+                Count('id'), Sum('average_form_score'),
+            ))
+        for period, starts in (('week', weeks), ('month', months)):
+            if starts:
+                parts.append(totals(
+                    UserPeriodStats.objects.filter(user_id=user_id, period=period, period_start__in=starts),
+                    Sum('days_count'), Sum('form_score_sum'),
+                ))
+
+        result = {'total_duration': 0, 'total_calories': 0.0, 'total_sessions': 0, 'days': 0, 'form_scores': 0.0}
+        if not parts:
+            return result
+        query = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+        for row in query:
+            result['total_duration'] += row['total_duration_minutes'] or 0
+            result['total_calories'] += row['total_calories_burned'] or 0
+            result['total_sessions'] += row['completed_sessions'] or 0
+            result['days'] += row['days'] or 0
+            result['form_scores'] += row['form_scores'] or 0
+        return result
@@ -1,106 +1,135 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
-from django.db import models
+from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
-from training.models import UserTrainingSession, UserTrainingExerciseRecord
-from .models import UserDailyStats, ExerciseProgress
+from training.models import UserTrainingSession, UserTrainingExerciseRecord, parse_set_rows
+from users.models import UserProfile, UserStats
+from .leaderboards import LeaderboardService
+from .models import UserDailyStats
+from .services import DailyStatsService, ExerciseProgressAggregator, PeriodStatsService, record_contribution, week_start_of
 
 @receiver(post_save, sender=UserTrainingSession)
 def update_daily_stats(sender, instance, **kwargs):
-    """当训练会话更新且标记为完成时，更新每日统计"""
+    """当训练会话更新且标记为完成时，登记当天的每日统计需要重算 (事务提交后合并执行)"""
     if instance.is_completed and instance.end_time:
-        today = instance.start_time.date()
-        stats, created = UserDailyStats.objects.get_or_create(
-            user=instance.user,
-            date=today
-        )
-        
-        # 计算当天所有完成会话的数据
-        sessions = UserTrainingSession.objects.filter(
-            user=instance.user, 
-            start_time__date=today,
-            is_completed=True
-        )
-        
-        stats.completed_sessions = sessions.count()
-        stats.total_calories_burned = sessions.aggregate(models.Sum('calories_burned'))['calories_burned__sum'] or 0
-        stats.average_form_score = sessions.aggregate(models.Avg('performance_score'))['performance_score__avg'] or 0
-        
-        # 计算总时长
-        total_minutes = 0
-        for s in sessions:
-            if s.end_time:
-                total_minutes += (s.end_time - s.start_time).total_seconds() / 60
-        
-        stats.total_duration_minutes = int(total_minutes)
-        stats.save()
-
-@receiver([post_save, post_delete], sender=UserTrainingExerciseRecord)
-def update_exercise_progress(sender, instance, **kwargs):
+        DailyStatsService.schedule(instance.user_id, DailyStatsService.session_day(instance))
+
+
+@receiver(post_delete, sender=UserTrainingSession)
+def rollback_daily_stats(sender, instance, **kwargs):
+    if instance.is_completed and instance.end_time:
+        DailyStatsService.schedule(instance.user_id, DailyStatsService.session_day(instance))
+
+@receiver([post_save, post_delete], sender=UserDailyStats)
+def update_period_stats(sender, instance, **kwargs):
+    """日统计变化时同步所在周、月的汇总行，并把新的周汇总写入周排行榜"""
+    totals = PeriodStatsService.refresh(instance.user_id, instance.date)
+    LeaderboardService.update_week(instance.user_id, week_start_of(instance.date), totals['week'])
+
+
+@receiver(post_save, sender=UserStats)
+def update_streak_leaderboard(sender, instance, **kwargs):
+    LeaderboardService.update_streak(
+        instance.user_id, instance.current_training_streak, instance.last_training_date
+    )
+
+
+@receiver(post_init, sender=UserProfile)
+def remember_leaderboard_cohort(sender, instance, **kwargs):
+    # 只取已加载的值：fitness_level 被延迟加载时读取它会多一次查询 (并再次触发 post_init)
+    instance._leaderboard_cohort = instance.__dict__.get('fitness_level')
+
+
+@receiver(post_save, sender=UserProfile)
+def move_leaderboard_cohort(sender, instance, created, **kwargs):
+    """运动基础变化后，排行榜分组随之迁移；加载时分组未知则跳过，由每晚的全量重建校正"""
+    old_cohort = instance._leaderboard_cohort
+    if not created and old_cohort is not None and instance.fitness_level != old_cohort:
+        LeaderboardService.move_cohort(instance.user_id, old_cohort, instance.fitness_level)
+    instance._leaderboard_cohort = instance.fitness_level
+
+
+# 计算一条记录的进步贡献需要的字段
+CONTRIBUTION_FIELDS = {'created_at', 'exercise_id', 'reps_completed', 'weights_used', 'form_score'}
+
+
+@receiver(post_init, sender=UserTrainingExerciseRecord)
+def remember_record_contribution(sender, instance, **kwargs):
     """
-    当动作记录发生任何变动（增、删、改）时，全量重新计算该动作的进步追踪。
+    记下加载时的 key 和原始数据，修改/删除时才解析出需要回退的增量。
+    only()/defer() 延迟了其中的字段时不做快照 (在这里读取会重新加载并再次触发
+    post_init，无限递归)，保存/删除时改为重新扫描涉及的那几天
     """
+    instance._progress_unknown = bool(instance.pk and CONTRIBUTION_FIELDS & instance.get_deferred_fields())
+    instance._progress_old_key = None
+    if instance.pk and not instance._progress_unknown and instance.created_at:
+        instance._progress_snapshot = (
+            instance.exercise_id,
+            timezone.localtime(instance.created_at).date(),
+            list(instance.reps_completed or []),
+            list(instance.weights_used or []),
+            instance.form_score,
+        )
+    else:
+        instance._progress_snapshot = None
+
+
+def _record_user_id(instance):
     # 获取关联信息（加个 try 是为了防止删除时找不到关联对象）
     try:
-        date = instance.created_at.date()
-        user = instance.session.user
-        exercise = instance.exercise
-    except AttributeError:
-        # 如果是删除操作且关联对象已丢失，无法统计，直接返回
+        return instance.session.user_id
+    except ObjectDoesNotExist:
+        return None
+
+
+@receiver([pre_save, pre_delete], sender=UserTrainingExerciseRecord)
+def locate_unknown_contribution(sender, instance, **kwargs):
+    """没有快照的记录在写入前查出原先所在的 (用户, 动作, 日期)，供提交后重新扫描"""
+    if instance._progress_unknown:
+        row = UserTrainingExerciseRecord.objects.filter(pk=instance.pk).values_list(
+            'session__user_id', 'exercise_id', 'created_at'
+        ).first()
+        instance._progress_old_key = row and (row[0], row[1], timezone.localtime(row[2]).date())
+
+
+@receiver(post_save, sender=UserTrainingExerciseRecord)
+def update_exercise_progress(sender, instance, **kwargs):
+    """动作记录新增或修改时，只把新旧贡献的差值计入进步追踪"""
+    user_id = _record_user_id(instance)
+    if user_id is None:
         return
 
-    # 1. 获取或创建当天的统计行
-    progress, created = ExerciseProgress.objects.get_or_create(
-        user=user,
-        exercise=exercise,
-        date=date
-    )
+    old_key = old_contribution = None
+    if instance._progress_snapshot:
+        exercise_id, date, reps, weights, form_score = instance._progress_snapshot
+        old_key = (user_id, exercise_id, date)
+        old_contribution = record_contribution(parse_set_rows(reps, weights), form_score)
 
-    # ✅ 优化点2：查出当天“所有”有效的记录（Source of Truth）
-    # 不管你是改了还是删了，我只信数据库里现在还存在的记录
-    all_records = UserTrainingExerciseRecord.objects.filter(
-        session__user=user,
-        exercise=exercise,
-        created_at__date=date
+    new_key = ExerciseProgressAggregator.record_key(user_id, instance)
+    new_contribution = record_contribution(instance.set_rows(), instance.form_score)
+    instance._progress_snapshot = (
+        new_key[1], new_key[2],
+        list(instance.reps_completed or []), list(instance.weights_used or []), instance.form_score,
     )
 
-    # 2. 初始化变量（准备从 0 开始算）
-    max_w = 0.0
-    max_r = 0
-    total_vol = 0.0
-    best_score = 0.0
-
-    # 3. 循环遍历每一条记录，重新累加
-    for record in all_records:
-        # 数据清洗：解析 JSON 里的重量和次数
-        # 假设 weights_used 是 [20, 20] 这种列表
-        w_list = [float(w) for w in record.weights_used if str(w).replace('.', '', 1).isdigit()]
-        r_list = [int(r) for r in record.reps_completed if str(r).isdigit()]
-        
-        # 找最大值
-        if w_list:
-            current_max_w = max(w_list)
-            if current_max_w > max_w: max_w = current_max_w
-            
-        if r_list:
-            current_max_r = max(r_list)
-            if current_max_r > max_r: max_r = current_max_r
-
-        # 算容量 (Volume)
-        if len(w_list) == len(r_list):
-            # 这里的计算逻辑和你原来一样，但是是在循环里
-            vol = sum(w * r for w, r in zip(w_list, r_list))
-            total_vol += vol
-        
-        # 找最佳分数
-        if record.form_score > best_score:
-            best_score = record.form_score
-
-    # ✅ 优化点3：直接覆盖赋值 (=)，而不是累加 (+=)
-    progress.max_weight = max_w
-    progress.max_reps = max_r
-    progress.total_volume = total_vol 
-    progress.best_form_score = best_score
-    
-    progress.save()
-    print(f"✅ 动作 {exercise.name} 统计已更新，当前总容量: {total_vol}")
\ No newline at end of file
+    if instance._progress_unknown:
+        ExerciseProgressAggregator.rescan(instance._progress_old_key, new_key)
+        instance._progress_unknown, instance._progress_old_key = False, None
+        return
+    if (old_key, old_contribution) == (new_key, new_contribution):
+        return
+    ExerciseProgressAggregator.replace(old_key, old_contribution, new_key, new_contribution)
+
+
+@receiver(post_delete, sender=UserTrainingExerciseRecord)
+def rollback_exercise_progress(sender, instance, **kwargs):
+    """动作记录删除时扣减其贡献 (若它持有最大值，提交后会重新扫描当天记录)"""
+    if instance._progress_unknown:
+        ExerciseProgressAggregator.rescan(instance._progress_old_key)
+        return
+    user_id = _record_user_id(instance)
+    if user_id is None or not instance._progress_snapshot:
+        return
+    exercise_id, date, reps, weights, form_score = instance._progress_snapshot
+    contribution = record_contribution(parse_set_rows(reps, weights), form_score)
+    ExerciseProgressAggregator.replace((user_id, exercise_id, date), contribution, None, None)
@@ -0,0 +1,18 @@
+from datetime import date
+
+from celery import shared_task
+
+from .services import DailyStatsService
+
+
+@shared_task
+def rollup_daily_stats(user_id, day):
+    """异步重算某用户某天的 UserDailyStats (settings.ANALYTICS_ROLLUP_ASYNC 开启时使用)"""
+    DailyStatsService.rollup(user_id, date.fromisoformat(day))
+
+
+@shared_task
+def rebuild_leaderboards():
+    """定时从数据库全量重建排行榜，修正增量写入遗漏 (如 Redis 短暂不可用、连续天数过期)"""
+    from .leaderboards import LeaderboardService
+    return LeaderboardService.rebuild()
@@ -1,3 +1,465 @@
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
+
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import transaction
 from django.test import TestCase
+from django.utils import timezone
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.test import APIClient
+
+from analytics.models import (
+    ExercisePersonalRecord, ExerciseProgress, UserBodyMetric, UserDailyStats, UserMuscleVolume, UserPeriodStats,
+)
+from analytics.leaderboards import LeaderboardService, board_key, current_week_start, effective_streak
+from analytics.services import PeriodStatsService, PersonalRecordService, estimate_1rm, estimate_1rm_array
+from exercises.models import Exercise
+from training.models import UserTrainingExerciseRecord, UserTrainingSession
+from users.models import UserProfile, UserStats
+
+
+class ExerciseProgressDeltaTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="progress_tester", password="pwd123456")
+        self.session = UserTrainingSession.objects.create(user=self.user, start_time=timezone.now())
+        self.exercise = Exercise.objects.create(
+            name="硬拉", description="描述", target_muscle="back", instructions="要领", level=2,
+        )
+
+    def _record(self, weights, reps, score=0.0):
+        with self.captureOnCommitCallbacks(execute=True):
+            return UserTrainingExerciseRecord.objects.create(
+                session=self.session, exercise=self.exercise,
+                weights_used=weights, reps_completed=reps, form_score=score,
+            )
+
+    def _progress(self):
+        return ExerciseProgress.objects.get(user=self.user, exercise=self.exercise)
+
+    def test_deltas_accumulate_and_update_replaces_contribution(self):
+        self._record([60, 80], [10, 5], score=70)
+        record = self._record([50], [12], score=90)
+        progress = self._progress()
+        self.assertEqual(progress.total_volume, 600 + 400 + 600)
+        self.assertEqual((progress.max_weight, progress.max_reps, progress.best_form_score), (80, 12, 90))
+
+        record = UserTrainingExerciseRecord.objects.get(pk=record.pk)
+        record.weights_used = [55]
+        with self.captureOnCommitCallbacks(execute=True):
+            record.save()
+        self.assertEqual(self._progress().total_volume, 600 + 400 + 660)
+
+    def test_deleting_max_holder_rescans(self):
+        self._record([60], [10])
+        heavy = self._record([100], [3])
+        self.assertEqual(self._progress().max_weight, 100)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserTrainingExerciseRecord.objects.get(pk=heavy.pk).delete()
+        progress = self._progress()
+        self.assertEqual(progress.max_weight, 60)
+        self.assertEqual(progress.total_volume, 600)
+
+    def test_writes_in_one_transaction_flush_once(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                for weight in (40, 50, 60):
+                    UserTrainingExerciseRecord.objects.create(
+                        session=self.session, exercise=self.exercise,
+                        weights_used=[weight], reps_completed=[10],
+                    )
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self._progress().total_volume, 1500)
+
+    def test_deferred_field_loads_rescan_instead_of_recursing(self):
+        light = self._record([60], [10])
+        heavy = self._record([100], [3])
+        self.assertEqual(len(UserTrainingExerciseRecord.objects.only("id")), 2)
+        self.assertEqual(len(UserTrainingExerciseRecord.objects.defer("weights_used", "created_at")), 2)
+
+        partial = UserTrainingExerciseRecord.objects.only("id").get(pk=light.pk)
+        partial.weights_used = [70]
+        with self.captureOnCommitCallbacks(execute=True):
+            partial.save()
+        progress = self._progress()
+        self.assertEqual((progress.total_volume, progress.max_weight), (700 + 300, 100))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserTrainingExerciseRecord.objects.defer("weights_used").get(pk=heavy.pk).delete()
+        progress = self._progress()
+        self.assertEqual((progress.total_volume, progress.max_weight), (700, 70))
+        volume = UserMuscleVolume.objects.get(user=self.user, muscle="back")
+        self.assertEqual((volume.volume, volume.sets_count), (700, 1))
+
+
+class DailyStatsRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="daily_tester", password="pwd123456")
+
+    def test_sessions_in_one_transaction_roll_up_once(self):
+        start = timezone.now().replace(hour=10, minute=0, second=0, microsecond=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for minutes, calories, score in ((30, 200.0, 4.0), (45, 300.0, 2.0)):
+                    UserTrainingSession.objects.create(
+                        user=self.user, start_time=start, end_time=start + timedelta(minutes=minutes),
+                        is_completed=True, calories_burned=calories, performance_score=score,
+                    )
+            with self.assertNumQueries(1):
+                pending = UserDailyStats.objects.filter(user=self.user).count()
+            self.assertEqual(pending, 0)
+
+        stats = UserDailyStats.objects.get(user=self.user, date=timezone.localtime(start).date())
+        self.assertEqual(stats.completed_sessions, 2)
+        self.assertEqual(stats.total_duration_minutes, 75)
+        self.assertEqual(stats.total_calories_burned, 500.0)
+        self.assertEqual(stats.average_form_score, 3.0)
+
+
+class PeriodStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="period_tester", password="pwd123456")
+        self.today = timezone.localdate()
+        for offset in range(0, 400, 3):
+            UserDailyStats.objects.create(
+                user=self.user, date=self.today - timedelta(days=offset),
+                total_duration_minutes=30 + offset % 7, total_calories_burned=100.0 + offset,
+                completed_sessions=1, average_form_score=60 + offset % 30,
+            )
+
+    def test_cover_uses_full_months_then_weeks(self):
+        months, weeks, days = PeriodStatsService.cover(date(2025, 1, 15), date(2025, 4, 9))
+        self.assertEqual(months, [date(2025, 2, 1), date(2025, 3, 1)])
+        self.assertEqual(weeks, [date(2025, 1, 20)])
+        self.assertEqual(days, [
+            (date(2025, 1, 15), date(2025, 1, 19)),
+            (date(2025, 1, 27), date(2025, 1, 31)),
+            (date(2025, 4, 1), date(2025, 4, 9)),
+        ])
+
+    def test_range_totals_match_daily_rows(self):
+        start = self.today - timedelta(days=365)
+        daily = UserDailyStats.objects.filter(user=self.user, date__gte=start)
+        with self.assertNumQueries(1):
+            totals = PeriodStatsService.range_totals(self.user.id, start, self.today)
+        self.assertEqual(totals['total_duration'], sum(d.total_duration_minutes for d in daily))
+        self.assertAlmostEqual(totals['total_calories'], sum(d.total_calories_burned for d in daily))
+        self.assertEqual(totals['days'], daily.count())
+
+    def test_rebuild_matches_incremental_rows(self):
+        incremental = {
+            (p.period, p.period_start): (p.total_duration_minutes, p.days_count)
+            for p in UserPeriodStats.objects.filter(user=self.user)
+        }
+        PeriodStatsService.rebuild(user_ids=[self.user.id])
+        rebuilt = {
+            (p.period, p.period_start): (p.total_duration_minutes, p.days_count)
+            for p in UserPeriodStats.objects.filter(user=self.user)
+        }
+        self.assertEqual(rebuilt, incremental)
+
+    def test_summary_endpoint_picks_monthly_breakdown(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get("/api/analytics/daily-stats/summary/?days=365")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["resolution"], "month")
+        self.assertNotIn("daily_breakdown", response.data)
+        self.assertLessEqual(len(response.data["breakdown"]), 13)
+
+
+class TrainingHistoryExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="export_tester", password="pwd123456")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        exercise = Exercise.objects.create(
+            name="卧推", description="描述", target_muscle="chest", instructions="要领", level=2,
+        )
+        self.session = UserTrainingSession.objects.create(user=self.user, start_time=timezone.now())
+        UserTrainingExerciseRecord.objects.create(
+            session=self.session, exercise=exercise, reps_completed=[10, 8], weights_used=[40, 45],
+        )
+        UserBodyMetric.objects.create(user=self.user, date=date(2025, 1, 1), weight=70, height=175)
+        other = User.objects.create_user(username="other_exporter", password="pwd123456")
+        UserTrainingSession.objects.create(user=other, start_time=timezone.now())
+
+    def _content(self, response):
+        return b"".join(response.streaming_content).decode("utf-8")
+
+    def test_jsonl_streams_all_datasets_of_user(self):
+        response = self.client.get("/api/analytics/export/")
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in self._content(response).splitlines()]
+        self.assertEqual([line["dataset"] for line in lines], ["sessions", "training_records", "body_metrics"])
+        self.assertEqual(lines[0]["id"], self.session.id)
+        self.assertEqual(lines[1]["reps_completed"], [10, 8])
+
+    def test_csv_exports_single_dataset(self):
+        response = self.client.get("/api/analytics/export/?output=csv&dataset=training_records")
+        self.assertEqual(response.status_code, 200)
+        rows = self._content(response).splitlines()
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(rows[0].startswith("id,session_id,exercise_id,exercise_name"))
+        self.assertIn('"[10, 8]"', rows[1])
+
+        bad = self.client.get("/api/analytics/export/?output=csv&dataset=all")
+        self.assertEqual(bad.status_code, 400)
+
+    def test_non_ascii_username_gets_encoded_filename(self):
+        user = User.objects.create_user(username="训练\"者", password="pwd123456")
+        self.client.force_authenticate(user=user)
+        response = self.client.get("/api/analytics/export/?output=csv")
+        self.assertEqual(response.status_code, 200)
+        disposition = response["Content-Disposition"]
+        disposition.encode("latin-1")
+        self.assertTrue(disposition.startswith("attachment; filename*=utf-8''fitvision_"))
+        self.assertIn("%E8%AE%AD%E7%BB%83%22%E8%80%85", disposition)
+
+    def test_command_writes_one_file_per_dataset(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            call_command(
+                "export_training_history", "--user", str(self.user.id), "--format", "csv",
+                "--dataset", "sessions", "--dataset", "body_metrics", "--output-dir", output_dir, stdout=open(os.devnull, "w"),
+            )
+            self.assertEqual(
+                sorted(os.listdir(output_dir)), ["export_tester_body_metrics.csv", "export_tester_sessions.csv"]
+            )
+
+
+class _FakeRedis:
+    """排行榜用到的有序集合命令的内存实现，成员与 Redis 一样以 bytes 返回"""
+
+    def __init__(self):
+        self.sets = {}
+        self.ttls = {}
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    def zadd(self, key, mapping):
+        board = self.sets.setdefault(key, {})
+        added = sum(1 for member in mapping if str(member) not in board)
+        board.update({str(member): float(score) for member, score in mapping.items()})
+        return added
+
+    def zrem(self, key, member):
+        return int(self.sets.get(key, {}).pop(str(member), None) is not None)
+
+    def zscore(self, key, member):
+        return self.sets.get(key, {}).get(str(member))
+
+    def zcard(self, key):
+        return len(self.sets.get(key, {}))
+
+    def _ordered(self, key):
+        return sorted(self.sets.get(key, {}).items(), key=lambda item: (item[1], item[0]), reverse=True)
+
+    def zrevrange(self, key, start, end, withscores=False):
+        rows = [(member.encode(), score) for member, score in self._ordered(key)[start:end + 1]]
+        return rows if withscores else [member for member, _ in rows]
+
+    def zrevrank(self, key, member):
+        members = [name for name, _ in self._ordered(key)]
+        return members.index(str(member)) if str(member) in members else None
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    def exists(self, key):
+        return int(bool(self.sets.get(key)))
+
+    def delete(self, *keys):
+        for key in keys:
+            self.sets.pop(key, None)
+
+    def rename(self, source, target):
+        self.sets[target] = self.sets.pop(source)
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.week = current_week_start(date(2025, 3, 12))
+        self.users = [User.objects.create_user(username=f"lb_{i}", password="pwd123456") for i in range(3)]
+        UserProfile.objects.filter(user=self.users[0]).update(fitness_level="advanced")
+        for user, calories in zip(self.users, (300.0, 800.0, 0.0)):
+            UserDailyStats.objects.create(user=user, date=self.week, total_calories_burned=calories)
+
+    def test_period_refresh_feeds_weekly_scores(self):
+        scores = sorted(LeaderboardService.scores_from_db("calories", self.week))
+        self.assertEqual(scores, [(self.users[0].id, "advanced", 300.0), (self.users[1].id, "beginner", 800.0)])
+
+    def test_broken_streaks_score_zero(self):
+        today = date(2025, 3, 12)
+        self.assertEqual(effective_streak(5, date(2025, 3, 11), today), 5)
+        self.assertEqual(effective_streak(5, date(2025, 3, 10), today), 0)
+
+        UserStats.objects.filter(user=self.users[0]).update(current_training_streak=4, last_training_date=today)
+        UserStats.objects.filter(user=self.users[1]).update(current_training_streak=9, last_training_date=date(2025, 3, 1))
+        self.assertEqual(
+            list(LeaderboardService.scores_from_db("streak", today=today)), [(self.users[0].id, "advanced", 4)]
+        )
+
+    def test_endpoint_requires_redis_backend(self):
+        client = APIClient()
+        client.force_authenticate(user=self.users[0])
+        self.assertEqual(client.get("/api/analytics/leaderboard/?metric=steps").status_code, 400)
+        # 测试环境使用本地内存缓存，没有可用的 Redis 连接
+        self.assertEqual(client.get("/api/analytics/leaderboard/?metric=streak").status_code, 503)
+
+    def test_endpoint_returns_503_when_redis_errors(self):
+        broken = mock.Mock()
+        broken.pipeline.return_value.execute.side_effect = RedisConnectionError("down")
+        client = APIClient()
+        client.force_authenticate(user=self.users[0])
+        with mock.patch("analytics.leaderboards._redis", return_value=broken):
+            self.assertEqual(client.get("/api/analytics/leaderboard/?metric=calories").status_code, 503)
+
+
+class LeaderboardRedisTests(TestCase):
+    """用内存中的假 Redis 覆盖 ZADD 增量写入、名次查询和全量重建"""
+
+    def setUp(self):
+        self.redis = _FakeRedis()
+        patcher = mock.patch("analytics.leaderboards._redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.week = current_week_start()
+        self.users = [User.objects.create_user(username=f"lbr_{i}", password="pwd123456") for i in range(5)]
+        UserProfile.objects.filter(user=self.users[0]).update(fitness_level="advanced")
+
+    def _set_week(self, user, calories):
+        with self.captureOnCommitCallbacks(execute=True):
+            LeaderboardService.update_week(
+                user.id, self.week, {"total_calories_burned": calories, "total_duration_minutes": calories / 10}
+            )
+
+    def test_zadd_updates_are_idempotent_and_cover_cohorts(self):
+        self._set_week(self.users[0], 300.0)
+        self._set_week(self.users[0], 300.0)
+        self._set_week(self.users[1], 500.0)
+        board = board_key("calories", "all", self.week)
+        self.assertEqual(self.redis.sets[board], {str(self.users[0].id): 300.0, str(self.users[1].id): 500.0})
+        self.assertEqual(self.redis.sets[board_key("calories", "advanced", self.week)], {str(self.users[0].id): 300.0})
+        self.assertIn(board, self.redis.ttls)
+
+        # 该周已无训练时移出榜单
+        with self.captureOnCommitCallbacks(execute=True):
+            LeaderboardService.update_week(self.users[1].id, self.week, None)
+        self.assertNotIn(str(self.users[1].id), self.redis.sets[board])
+
+    def test_standings_rank_and_neighbourhood(self):
+        for user, calories in zip(self.users, (100.0, 500.0, 400.0, 300.0, 200.0)):
+            self._set_week(user, calories)
+        data = LeaderboardService.standings("calories", user_id=self.users[3].id, limit=2, radius=1)
+        self.assertEqual(data["total"], 5)
+        self.assertEqual([entry["user_id"] for entry in data["top"]], [self.users[1].id, self.users[2].id])
+        self.assertEqual(data["me"], {"rank": 3, "score": 300.0})
+        self.assertEqual(
+            [(entry["rank"], entry["user_id"]) for entry in data["neighborhood"]],
+            [(2, self.users[2].id), (3, self.users[3].id), (4, self.users[4].id)],
+        )
+        self.assertIsNone(LeaderboardService.standings("calories", user_id=9999)["me"])
+
+    def test_cohort_move_skipped_when_fitness_level_not_loaded(self):
+        with mock.patch.object(LeaderboardService, "move_cohort") as move:
+            with self.assertNumQueries(1):
+                profile = UserProfile.objects.defer("fitness_level").get(user=self.users[0])
+            profile.fitness_level = "beginner"
+            profile.save()
+            move.assert_not_called()
+
+            profile = UserProfile.objects.get(user=self.users[0])
+            profile.fitness_level = "advanced"
+            profile.save()
+        move.assert_called_once_with(self.users[0].id, "beginner", "advanced")
+
+    def test_rebuild_replaces_boards_via_rename(self):
+        stale = board_key("calories", "all", self.week)
+        self.redis.zadd(stale, {9999: 1.0})
+        self.redis.zadd(board_key("minutes", "intermediate", self.week), {9999: 1.0})
+        UserDailyStats.objects.create(user=self.users[0], date=self.week, total_calories_burned=600.0,
+                                      total_duration_minutes=45)
+        UserStats.objects.filter(user=self.users[1]).update(
+            current_training_streak=3, last_training_date=timezone.localdate()
+        )
+
+        written = LeaderboardService.rebuild()
+        self.assertEqual(written, 3)
+        self.assertEqual(self.redis.sets[stale], {str(self.users[0].id): 600.0})
+        self.assertEqual(self.redis.sets[board_key("streak", "all")], {str(self.users[1].id): 3.0})
+        # 没有数据的分组榜被删除，临时 key 不残留
+        self.assertNotIn(board_key("minutes", "intermediate", self.week), self.redis.sets)
+        self.assertFalse([key for key in self.redis.sets if key.endswith(":rebuild")])
+
+
+class PersonalRecordTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="pr_tester", password="pwd123456")
+        self.session = UserTrainingSession.objects.create(user=self.user, start_time=timezone.now())
+        self.exercise = Exercise.objects.create(
+            name="杠铃卧推", description="描述", target_muscle="chest", instructions="要领", level=2,
+        )
+
+    def _record(self, weights, reps, score=0.0):
+        with self.captureOnCommitCallbacks(execute=True):
+            return UserTrainingExerciseRecord.objects.create(
+                session=self.session, exercise=self.exercise,
+                weights_used=weights, reps_completed=reps, form_score=score,
+            )
+
+    def _pr(self):
+        return ExercisePersonalRecord.objects.get(user=self.user, exercise=self.exercise)
+
+    def test_epley_estimate(self):
+        self.assertEqual(estimate_1rm(100, 1), 100)
+        self.assertAlmostEqual(estimate_1rm(90, 6), 108)
+        self.assertEqual(estimate_1rm(40, 20), 0.0)
+        np.testing.assert_allclose(
+            estimate_1rm_array(np.array([100.0, 90.0, 40.0]), np.array([1, 6, 20])), [100, 108, 0]
+        )
+
+    def test_records_raise_pr_and_deleting_holder_falls_back(self):
+        self._record([80, 80], [8, 8], score=75)
+        heavy = self._record([100], [2], score=60)
+        pr = self._pr()
+        self.assertEqual((pr.best_weight, pr.best_reps, pr.best_form_score), (100, 8, 75))
+        self.assertAlmostEqual(pr.estimated_1rm, 100 * (1 + 2 / 30))
+        self.assertEqual(pr.best_weight_date, timezone.localdate())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserTrainingExerciseRecord.objects.get(pk=heavy.pk).delete()
+        pr = self._pr()
+        self.assertEqual(pr.best_weight, 80)
+        self.assertAlmostEqual(pr.estimated_1rm, 80 * (1 + 8 / 30))
+
+    def test_backfill_matches_incremental(self):
+        for weights, reps in (([60, 70, 80], [10, 8, 5]), ([85], [3]), ([20], [15])):
+            self._record(weights, reps)
+        expected = self._pr()
 
-# Create your tests here.
+        ExerciseProgress.objects.update(estimated_1rm=0)
+        ExercisePersonalRecord.objects.all().delete()
+        self.assertEqual(PersonalRecordService.backfill_1rm(chunk_size=2), 1)
+        self.assertEqual(PersonalRecordService.rebuild(), 1)
+        pr = self._pr()
+        self.assertAlmostEqual(pr.estimated_1rm, expected.estimated_1rm)
+        self.assertEqual((pr.best_weight, pr.best_volume), (expected.best_weight, expected.best_volume))
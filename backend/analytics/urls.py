@@ -1,12 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserDailyStatsViewSet, UserBodyMetricViewSet, ExerciseProgressViewSet
+from .views import (
+    UserDailyStatsViewSet, UserBodyMetricViewSet, ExerciseProgressViewSet, ExercisePersonalRecordViewSet,
+    export_training_history, leaderboard,
+)
 
 router = DefaultRouter()
 router.register(r'daily-stats', UserDailyStatsViewSet)
 router.register(r'body-metrics', UserBodyMetricViewSet)
 router.register(r'exercise-progress', ExerciseProgressViewSet)
+router.register(r'personal-records', ExercisePersonalRecordViewSet)
 
 urlpatterns = [
+    path('export/', export_training_history, name='export-training-history'),
+    path('leaderboard/', leaderboard, name='leaderboard'),
     path('', include(router.urls)),
 ]
@@ -1,11 +1,17 @@
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from django.db.models import Sum, Avg, Max
-from .models import UserDailyStats, UserBodyMetric, ExerciseProgress
-from .serializers import UserDailyStatsSerializer, UserBodyMetricSerializer, ExerciseProgressSerializer
+from .models import UserDailyStats, UserPeriodStats, UserBodyMetric, ExerciseProgress, ExercisePersonalRecord
+from .serializers import UserDailyStatsSerializer, UserPeriodStatsSerializer, UserBodyMetricSerializer, ExerciseProgressSerializer, ExercisePersonalRecordSerializer
+from .services import PeriodStatsService, month_start_of, week_start_of
+from .export import EXPORT_DATASETS, EXPORT_FORMATS, available_formats, iter_csv, iter_jsonl, write_parquet
+from .leaderboards import ALL_COHORT, COHORTS, METRICS, LeaderboardService, current_week_start
+from django.contrib.auth.models import User
+from django.http import FileResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.http import content_disposition_header
 from datetime import timedelta
+import tempfile
 
 class UserDailyStatsViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = UserDailyStats.objects.all()
@@ -17,17 +23,36 @@ class UserDailyStatsViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=['get'])
     def summary(self, request):
+        """
+        区间汇总：总计由日/周/月预聚合表拼接后一次查询得到；
+        明细按区间长度自动选择粒度 (可用 resolution=day|week|month 指定)
+        """
         days = int(request.query_params.get('days', 7))
-        start_date = timezone.now().date() - timedelta(days=days)
-        
-        stats = self.get_queryset().filter(date__gte=start_date)
-        
+        today = timezone.localdate()
+        start_date = today - timedelta(days=days)
+
+        resolution = request.query_params.get('resolution', 'auto')
+        if resolution not in ('day', 'week', 'month'):
+            resolution = 'month' if days > 120 else 'week' if days > 31 else 'day'
+
+        totals = PeriodStatsService.range_totals(request.user.id, start_date, today)
         data = {
-            "total_calories": stats.aggregate(Sum('total_calories_burned'))['total_calories_burned__sum'] or 0,
-            "total_duration": stats.aggregate(Sum('total_duration_minutes'))['total_duration_minutes__sum'] or 0,
-            "avg_form_score": stats.aggregate(Avg('average_form_score'))['average_form_score__avg'] or 0,
-            "daily_breakdown": UserDailyStatsSerializer(stats, many=True).data
+            "total_calories": totals['total_calories'],
+            "total_duration": totals['total_duration'],
+            "total_sessions": totals['total_sessions'],
+            "avg_form_score": totals['form_scores'] / totals['days'] if totals['days'] else 0,
+            "resolution": resolution,
         }
+
+        if resolution == 'day':
+            stats = self.get_queryset().filter(date__gte=start_date)
+            data["daily_breakdown"] = data["breakdown"] = UserDailyStatsSerializer(stats, many=True).data
+        else:
+            first_period = week_start_of(start_date) if resolution == 'week' else month_start_of(start_date)
+            periods = UserPeriodStats.objects.filter(
+                user=request.user, period=resolution, period_start__gte=first_period
+            )
+            data["breakdown"] = UserPeriodStatsSerializer(periods, many=True).data
         return Response(data)
 
     @action(detail=False, methods=['get'])
@@ -61,3 +86,93 @@ class ExerciseProgressViewSet(viewsets.ReadOnlyModelViewSet):
         progress = self.get_queryset().filter(exercise_id=exercise_id).order_by('date')
         serializer = self.get_serializer(progress, many=True)
         return Response(serializer.data)
+
+class ExercisePersonalRecordViewSet(viewsets.ReadOnlyModelViewSet):
+    """个人最佳记录 (PR 徽章)，可用 ?exercise=<id> 过滤"""
+    queryset = ExercisePersonalRecord.objects.select_related('exercise')
+    serializer_class = ExercisePersonalRecordSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = self.queryset.filter(user=self.request.user).order_by('-estimated_1rm')
+        exercise_id = self.request.query_params.get('exercise')
+        if exercise_id and exercise_id.isdigit():
+            queryset = queryset.filter(exercise_id=exercise_id)
+        return queryset
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_training_history(request):
+    """
+    流式导出当前用户的训练历史
+
+    参数: output=jsonl|csv|parquet (默认 jsonl)；dataset=数据集名称，
+    jsonl 可用 all 一次导出全部数据集，csv / parquet 每次只导出一个。
+    """
+    output = request.query_params.get('output', 'jsonl')
+    if output not in available_formats():
+        return Response({'error': f'output 仅支持 {", ".join(available_formats())}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    dataset = request.query_params.get('dataset', 'all' if output == 'jsonl' else 'sessions')
+    names = list(EXPORT_DATASETS) if dataset == 'all' and output == 'jsonl' else [dataset]
+    if any(name not in EXPORT_DATASETS for name in names):
+        return Response({'error': f'dataset 仅支持 {", ".join(EXPORT_DATASETS)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    content_type, ext = EXPORT_FORMATS[output]
+    filename = f"fitvision_{request.user.username}_{dataset}_{timezone.localdate():%Y%m%d}.{ext}"
+    if output == 'parquet':
+        # Parquet 的元数据写在文件尾，先分批落到临时文件再按块回传
+        fileobj = tempfile.TemporaryFile()
+        write_parquet(dataset, request.user.id, fileobj)
+        fileobj.seek(0)
+        return FileResponse(fileobj, as_attachment=True, filename=filename, content_type=content_type)
+
+    if output == 'csv':
+        stream = iter_csv(dataset, request.user.id)
+    else:
+        stream = iter_jsonl(names, request.user.id)
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    # 用户名可能含中文或引号，按 RFC 6266 编码 (与 FileResponse 一致)
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def _bounded_int(value, default, min_value, max_value):
+    try:
+        return max(min(int(value), max_value), min_value)
+    except (TypeError, ValueError):
+        return default
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def leaderboard(request):
+    """
+    社区排行榜：metric=calories|minutes|streak，cohort=all 或运动基础
+    (beginner/intermediate/advanced)，返回前 limit 名和当前用户前后 radius 名
+    """
+    metric = request.query_params.get('metric', 'calories')
+    cohort = request.query_params.get('cohort', ALL_COHORT)
+    if metric not in METRICS:
+        return Response({'error': f'metric 仅支持 {", ".join(METRICS)}'}, status=status.HTTP_400_BAD_REQUEST)
+    if cohort != ALL_COHORT and cohort not in COHORTS:
+        return Response({'error': f'cohort 仅支持 {", ".join((ALL_COHORT,) + COHORTS)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    limit = _bounded_int(request.query_params.get('limit'), 10, 1, 100)
+    radius = _bounded_int(request.query_params.get('radius'), 2, 0, 10)
+    data = LeaderboardService.standings(metric, cohort, request.user.id, limit=limit, radius=radius)
+    if data is None:
+        return Response({'error': '排行榜服务不可用'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    # 一次查询补齐榜单上出现的用户名
+    entries = data['top'] + data['neighborhood']
+    names = {
+        row['id']: row['profile__nickname'] or row['username']
+        for row in User.objects.filter(id__in={e['user_id'] for e in entries}).values('id', 'username', 'profile__nickname')
+    }
+    for entry in entries:
+        entry['name'] = names.get(entry['user_id'], '')
+    data.update(metric=metric, cohort=cohort)
+    if metric != 'streak':
+        data['week_start'] = current_week_start()
+    return Response(data)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ExerciseCategory, Exercise, UserExerciseRecord
+from .models import ExerciseCategory, Exercise, UserExerciseRecord, UserMasteryChange
 
 @admin.register(ExerciseCategory)
 class ExerciseCategoryAdmin(admin.ModelAdmin):
@@ -45,4 +45,12 @@ class UserExerciseRecordAdmin(admin.ModelAdmin):
     list_display = ('user', 'exercise', 'count', 'accuracy_score', 'calories_burned', 'created_at')
     list_filter = ('exercise', 'created_at')
     search_fields = ('user__username', 'exercise__name')
-    readonly_fields = ('created_at',)
\ No newline at end of file
+    readonly_fields = ('created_at',)
+
+
+@admin.register(UserMasteryChange)
+class UserMasteryChangeAdmin(admin.ModelAdmin):
+    list_display = ('user', 'exercise', 'mastered', 'created_at')
+    list_filter = ('mastered', 'created_at')
+    search_fields = ('user__username', 'exercise__name')
+    readonly_fields = ('created_at',)
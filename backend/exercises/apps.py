@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class ExercisesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
-    name = "exercises"
\ No newline at end of file
+    name = "exercises"
+
+    def ready(self):
+        import exercises.signals
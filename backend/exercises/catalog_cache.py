@@ -0,0 +1,108 @@
+"""
+动作目录 (动作列表、详情、分类) 的版本化响应缓存
+
+目录数据读多写少：动作或分类变化时递增目录版本号，序列化好的静态响应按
+(版本, 视图, 请求地址) 缓存在 Redis 中；带个人进度的接口只在缓存结果上
+合并当前用户的进度。ETag 由目录版本和用户进度版本算出，客户端带
+If-None-Match 重新验证时直接返回 304，不会触及目录数据表。
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = "exercises:catalog_version"
+CATALOG_CACHE_PREFIX = "exercises:catalog"
+USER_PROGRESS_VERSION_KEY = "exercises:progress_version:{user_id}"
+
+# 版本号变化后旧 key 不再被读取，超时只用于回收空间
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # 用时间戳做初始值，缓存被清空后也不会与客户端持有的旧 ETag 撞车
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), timeout=None)
+
+
+def get_catalog_version():
+    return _get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """动作、分类或前置关系变化后调用，所有目录缓存与 ETag 随之失效"""
+    _bump_version(CATALOG_VERSION_KEY)
+
+
+def get_user_progress_version(user_id):
+    return _get_version(USER_PROGRESS_VERSION_KEY.format(user_id=user_id))
+
+
+def bump_user_progress_version(user_id):
+    """用户动作记录变化后调用，使带个人进度的 ETag 失效"""
+    _bump_version(USER_PROGRESS_VERSION_KEY.format(user_id=user_id))
+
+
+def _digest(*parts):
+    return hashlib.md5("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class CachedCatalogMixin:
+    """
+    目录视图的缓存与条件请求
+
+    子类实现 get_static_payload() 返回与用户无关的序列化结果；
+    user_overlay = True 时再由 apply_user_overlay() 合并当前用户的进度。
+    """
+    user_overlay = False
+
+    def get_static_payload(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def apply_user_overlay(self, request, payload):
+        return payload
+
+    def cached_catalog_response(self, request, *args, **kwargs):
+        version = get_catalog_version()
+        full_url = request.build_absolute_uri()
+        etag_parts = [version, full_url]
+        if self.user_overlay:
+            etag_parts.append(get_user_progress_version(request.user.id))
+        etag = f'"{_digest(*etag_parts)}"'
+
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = f"{CATALOG_CACHE_PREFIX}:{version}:{type(self).__name__}:{_digest(full_url)}"
+            payload = cache.get(key)
+            if payload is None:
+                payload = self.get_static_payload(request, *args, **kwargs)
+                cache.set(key, payload, CATALOG_CACHE_TIMEOUT)
+            if self.user_overlay:
+                payload = self.apply_user_overlay(request, payload)
+            response = Response(payload)
+
+        response["ETag"] = etag
+        # 允许客户端缓存，但每次使用前都要带 ETag 重新验证
+        response["Cache-Control"] = "private, no-cache"
+        return response
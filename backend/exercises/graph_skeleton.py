@@ -0,0 +1,491 @@
+"""
+动作知识图谱页面的静态骨架与个人状态叠加
+
+节点、连线、结构重要性只取决于动作和前置关系，按技能树版本缓存；每次请求
+只根据用户已掌握的动作集合计算 掌握/可解锁/未解锁 状态并合并到骨架上。
+节点坐标也在构建骨架时一次算好 (分层 DAG 布局)，前端直接按 x/y 绘制，
+不再在浏览器里跑力导向模拟，同一版本的图谱每次打开位置都不变。
+除完整图谱外还提供按部位、按动作邻域、按用户掌握前沿截取的子图，节点数有上限，
+前端可以先画一小块再逐步展开。已加载图谱的客户端凭 (图谱版本, 掌握版本) 增量同步，
+只取回状态变化的节点和结构变更。
+连线粗细来自用户行为统计 (ExerciseGraph)，训练过程中会不断更新，因此骨架
+另设较短的超时时间定期刷新。
+"""
+import hashlib
+import json
+import math
+from collections import deque
+
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Max
+
+from .models import Exercise, ExerciseGraph, UserMasteryChange
+from .skill_tree import get_mastered_ids, get_skill_tree
+
+GRAPH_SKELETON_CACHE_KEY = "exercises:graph_skeleton:{version}"
+GRAPH_SKELETON_TIMEOUT = 10 * 60
+# 每个版本的结构摘要保留得更久，供持有旧版本的客户端计算结构差异
+GRAPH_STRUCTURE_CACHE_KEY = "exercises:graph_structure:{version}"
+GRAPH_STRUCTURE_TIMEOUT = 7 * 24 * 60 * 60
+
+# 结构重要性的取值上限，节点大小与高亮阈值都按这个尺度设定
+MAX_IMPORTANCE = 3.0
+
+# 布局尺寸：相邻层的水平间距、同层节点的最小垂直间距、部位分带之间的留白
+LAYER_GAP = 220.0
+NODE_GAP = 70.0
+BAND_PADDING = 120.0
+LAYOUT_ITERATIONS = 60
+
+# 子图接口单次返回的节点数上限
+SUBGRAPH_DEFAULT_LIMIT = 60
+SUBGRAPH_MAX_LIMIT = 150
+MAX_HOPS = 3
+
+CATEGORY_COLORS = {
+    'chest': '#ff4d4f', 'back': '#40a9ff', 'legs': '#73d13d',
+    'shoulders': '#ffc53d', 'arms': '#ff7a45', 'abs': '#9254de',
+    'glutes': '#eb2f96', 'full_body': '#fa8c16'
+}
+GRAPH_CATEGORIES = ['胸部', '背部', '腿部', '肩部', '手臂', '腹部', '臀部', '全身']
+MASTERED_BORDER_COLOR = '#52c41a'
+LINK_COLORS = {
+    'done': '#52c41a',     # 已通关路径
+    'active': '#faad14',   # 正在攻略路径
+    'pending': '#91d5ff',
+}
+
+
+def structural_importance(skill_tree):
+    """
+    可达性中心度：一个动作直接或间接解锁的后续动作越多越重要。
+    后代数量取对数后归一化到 0 ~ MAX_IMPORTANCE，结果是确定的
+    """
+    reach = {ex_id: bits.bit_count() for ex_id, bits in skill_tree.descendant_bits.items()}
+    scale = math.log1p(max(reach.values(), default=0)) or 1.0
+    return {ex_id: MAX_IMPORTANCE * math.log1p(count) / scale for ex_id, count in reach.items()}
+
+
+def _layers(skill_tree):
+    """最长路径分层：没有前置的动作在第 0 层，其余排在所有前置的下一层"""
+    layer = {}
+    for ex_id in skill_tree.topo_order:
+        # 环上的动作可能有尚未分层的前置，按 0 处理即可
+        layer[ex_id] = max((layer.get(pre_id, 0) + 1 for pre_id in skill_tree.prerequisites[ex_id]), default=0)
+    return layer
+
+
+def compute_layout(skill_tree):
+    """
+    分层 DAG 布局，返回 {动作ID: (x, y)}
+
+    x 由前置层级决定，前置动作总在它解锁的动作左侧；y 先按目标部位分带、带内按
+    动作顺序排开作为初始位置，再做若干轮向量化松弛：节点向相连动作的平均高度靠拢
+    以减少连线交叉，同时受所在部位带中心的牵引，同层过近的节点再依次推开。
+    没有随机数，只依赖技能树本身，同一版本每次计算结果一致。
+    """
+    ids = list(skill_tree.exercises)
+    if not ids:
+        return {}
+    index = {ex_id: i for i, ex_id in enumerate(ids)}
+    layer_of = _layers(skill_tree)
+    layer = np.array([layer_of[ex_id] for ex_id in ids])
+    muscles = list(CATEGORY_COLORS)
+    band = np.array([
+        muscles.index(skill_tree.exercises[ex_id].target_muscle)
+        if skill_tree.exercises[ex_id].target_muscle in muscles else len(muscles)
+        for ex_id in ids
+    ])
+
+    # 初始位置：每个 (层, 部位) 格子里的节点按动作顺序纵向排开，格子在带内居中
+    cell = layer * (len(muscles) + 1) + band
+    order = np.lexsort((np.arange(len(ids)), cell))
+    slot = np.empty(len(ids))
+    starts = np.r_[0, np.flatnonzero(np.diff(cell[order])) + 1]
+    counts = np.diff(np.r_[starts, len(ids)])
+    slot[order] = np.arange(len(ids)) - np.repeat(starts, counts) - np.repeat((counts - 1) / 2, counts)
+    band_height = np.zeros(len(muscles) + 1)
+    np.maximum.at(band_height, band[order[starts]], counts * NODE_GAP)
+    band_center = np.cumsum(band_height + BAND_PADDING) - (band_height + BAND_PADDING) / 2
+    anchor = band_center[band]
+    y = anchor + slot * NODE_GAP
+
+    edges = np.array([
+        (index[pre_id], index[ex_id])
+        for ex_id in ids for pre_id in skill_tree.prerequisites[ex_id]
+    ], dtype=int).reshape(-1, 2)
+    degree = np.bincount(edges.ravel(), minlength=len(ids))
+    has_neighbors = degree > 0
+    layer_members = [np.flatnonzero(layer == value) for value in np.unique(layer)]
+
+    for _ in range(LAYOUT_ITERATIONS):
+        # 向相连动作的平均高度靠拢
+        neighbor_sum = np.bincount(edges[:, 0], weights=y[edges[:, 1]], minlength=len(ids))
+        neighbor_sum += np.bincount(edges[:, 1], weights=y[edges[:, 0]], minlength=len(ids))
+        target = np.where(has_neighbors, neighbor_sum / np.maximum(degree, 1), y)
+        y += 0.3 * (target - y) + 0.1 * (anchor - y)
+
+        # 同层节点按高度排序后保证相邻间距至少 NODE_GAP (高度相同时按动作顺序分先后)，
+        # 再整体平移回原来的平均高度
+        for members in layer_members:
+            if len(members) < 2:
+                continue
+            ranked = members[np.lexsort((members, y[members]))]
+            offsets = np.arange(len(ranked)) * NODE_GAP
+            spaced = np.maximum.accumulate(y[ranked] - offsets) + offsets
+            y[ranked] = spaced - (spaced - y[ranked]).mean()
+
+    x = layer * LAYER_GAP
+    y -= y.mean()
+    return {ex_id: (float(x[i]), round(float(y[i]), 1)) for i, ex_id in enumerate(ids)}
+
+
+def build_skeleton(skill_tree):
+    """与用户无关的节点和连线 (可直接序列化缓存)"""
+    importance = structural_importance(skill_tree)
+    layout = compute_layout(skill_tree)
+    transitions = {
+        (from_id, to_id): probability
+        for from_id, to_id, probability in ExerciseGraph.objects.values_list(
+            'from_exercise_id', 'to_exercise_id', 'probability'
+        )
+    }
+    muscle_labels = dict(Exercise._meta.get_field('target_muscle').choices)
+
+    nodes = []
+    links = []
+    for ex in skill_tree.exercises.values():
+        score = importance.get(ex.id, 0.0)
+        x, y = layout[ex.id]
+        nodes.append({
+            'name': ex.name,
+            'id': str(ex.id),
+            'category': muscle_labels.get(ex.target_muscle, ex.target_muscle),
+            'symbolSize': min(30 + score * 10 + ex.level * 5, 80),
+            'value': round(score, 2),
+            'gnn_insight': f"结构重要性: {round(score, 2)}",
+            'itemStyle': {
+                'color': CATEGORY_COLORS.get(ex.target_muscle, '#bfbfbf'),
+                'borderColor': '#fff',
+                'borderWidth': 2 if score > 1.5 else 0,
+            },
+            'level': ex.level,
+            'x': x,
+            'y': y,
+        })
+        for pre_id in skill_tree.prerequisites[ex.id]:
+            links.append({
+                'source': str(pre_id),
+                'target': str(ex.id),
+                'weight': transitions.get((pre_id, ex.id), 0.1),
+            })
+    return {'version': skill_tree.version, 'nodes': nodes, 'links': links}
+
+
+def get_graph_skeleton():
+    """返回 (技能树, 骨架)，骨架按技能树版本缓存"""
+    skill_tree = get_skill_tree()
+    key = GRAPH_SKELETON_CACHE_KEY.format(version=skill_tree.version)
+    skeleton = cache.get(key)
+    if skeleton is None:
+        skeleton = build_skeleton(skill_tree)
+        cache.set(key, skeleton, GRAPH_SKELETON_TIMEOUT)
+        cache.set(
+            GRAPH_STRUCTURE_CACHE_KEY.format(version=skill_tree.version),
+            structure_of(skeleton), GRAPH_STRUCTURE_TIMEOUT,
+        )
+    return skill_tree, skeleton
+
+
+def structure_of(skeleton):
+    """骨架的结构摘要：每个节点内容的哈希和全部 (前置, 动作) 连线"""
+    return {
+        'nodes': {
+            node['id']: hashlib.md5(json.dumps(node, sort_keys=True).encode('utf-8')).hexdigest()
+            for node in skeleton['nodes']
+        },
+        'links': [(link['source'], link['target']) for link in skeleton['links']],
+    }
+
+
+def get_mastery_version(user_id):
+    """用户的掌握版本号：最近一条掌握变更日志的 id，没有变更时为 0"""
+    return UserMasteryChange.objects.filter(user_id=user_id).aggregate(version=Max('id'))['version'] or 0
+
+
+def node_status(skill_tree, exercise_id, mastered_ids, mastered_bits):
+    if exercise_id in mastered_ids:
+        return 'mastered'
+    if skill_tree.is_unlocked(exercise_id, mastered_bits):
+        return 'ready'
+    return 'locked'
+
+
+def overlay_node(node, status):
+    """在骨架节点的副本上叠加用户状态"""
+    node = dict(node, status=status, is_mastered=status == 'mastered')
+    if status == 'mastered':
+        # 已掌握的节点给一个外发光
+        node['itemStyle'] = dict(
+            node['itemStyle'], borderColor=MASTERED_BORDER_COLOR, borderWidth=4,
+            shadowBlur=10, shadowColor=MASTERED_BORDER_COLOR,
+        )
+    return node
+
+
+def overlay_link(link, mastered_ids):
+    source, target = int(link['source']), int(link['target'])
+    if source in mastered_ids and target in mastered_ids:
+        color = LINK_COLORS['done']
+    elif source in mastered_ids:
+        color = LINK_COLORS['active']
+    else:
+        color = LINK_COLORS['pending']
+    return {
+        'source': link['source'],
+        'target': link['target'],
+        'relation_label': '前置基础',
+        'label': {'show': True, 'formatter': '前置基础', 'fontSize': 10},
+        'lineStyle': {
+            'width': 2 + (link['weight'] * 3),
+            'curveness': 0.2,
+            'color': color,
+            'type': 'solid' if source in mastered_ids else 'dashed',
+        },
+    }
+
+
+def _graph_stats(skill_tree, mastered_ids):
+    total = len(skill_tree.exercises)
+    return {
+        'total': total,
+        'mastered': len(mastered_ids),
+        'percent': round((len(mastered_ids) / total * 100), 1) if total > 0 else 0
+    }
+
+
+def user_graph(user):
+    """完整的图谱数据：缓存的骨架 + 该用户的掌握状态"""
+    # 先取版本号再取掌握集合，两者之间发生的变更在下次增量同步时会被重放，不会遗漏
+    mastery_version = get_mastery_version(user.id)
+    skill_tree, skeleton = get_graph_skeleton()
+    mastered_ids = get_mastered_ids(user)
+    mastered_bits = skill_tree.mask_of(mastered_ids)
+
+    nodes = [
+        overlay_node(node, node_status(skill_tree, int(node['id']), mastered_ids, mastered_bits))
+        for node in skeleton['nodes']
+    ]
+    links = [overlay_link(link, mastered_ids) for link in skeleton['links']]
+    return {
+        'version': skeleton['version'],
+        'mastery_version': mastery_version,
+        'nodes': nodes,
+        'links': links,
+        'categories': [{'name': v} for v in GRAPH_CATEGORIES],
+        'stats': _graph_stats(skill_tree, mastered_ids),
+    }
+
+
+def _neighbors(skill_tree, exercise_id):
+    return skill_tree.prerequisites[exercise_id] + skill_tree.unlocks[exercise_id]
+
+
+def _subgraph(skill_tree, skeleton, ex_ids, mastered_ids, truncated, mastery_version):
+    """
+    按 ex_ids 的顺序截取节点及它们之间的连线。每个节点附带 hidden_links：
+    相邻但未包含在本次结果中的动作数，前端据此决定能否继续展开
+    """
+    included = set(ex_ids)
+    wanted = {str(ex_id) for ex_id in included}
+    by_id = {node['id']: node for node in skeleton['nodes'] if node['id'] in wanted}
+    mastered_bits = skill_tree.mask_of(mastered_ids)
+    nodes = [
+        dict(
+            overlay_node(by_id[str(ex_id)], node_status(skill_tree, ex_id, mastered_ids, mastered_bits)),
+            hidden_links=sum(1 for n in _neighbors(skill_tree, ex_id) if n not in included),
+        )
+        for ex_id in ex_ids
+    ]
+    links = [
+        overlay_link(link, mastered_ids) for link in skeleton['links']
+        if link['source'] in wanted and link['target'] in wanted
+    ]
+    return {
+        'version': skeleton['version'],
+        'mastery_version': mastery_version,
+        'nodes': nodes,
+        'links': links,
+        'categories': [{'name': v} for v in GRAPH_CATEGORIES],
+        'stats': _graph_stats(skill_tree, mastered_ids),
+        'truncated': truncated,
+    }
+
+
+def _expand(skill_tree, seeds, hops, limit):
+    """
+    从 seeds 出发沿前置和解锁两个方向广度优先展开 hops 跳，
+    最多取 limit 个动作。返回 (动作 id 列表, 是否因数量上限被截断)
+    """
+    collected = []
+    seen = set()
+    queue = deque()
+    for ex_id in seeds:
+        if ex_id in skill_tree.exercises and ex_id not in seen:
+            seen.add(ex_id)
+            queue.append((ex_id, 0))
+    while queue:
+        ex_id, depth = queue.popleft()
+        if len(collected) >= limit:
+            return collected, True
+        collected.append(ex_id)
+        if depth == hops:
+            continue
+        for nxt in _neighbors(skill_tree, ex_id):
+            if nxt not in seen:
+                seen.add(nxt)
+                queue.append((nxt, depth + 1))
+    return collected, False
+
+
+def neighborhood_graph(user, exercise_id, hops=1, limit=SUBGRAPH_DEFAULT_LIMIT):
+    """某动作 hops 跳以内的邻域子图，动作不存在时返回 None"""
+    mastery_version = get_mastery_version(user.id)
+    skill_tree, skeleton = get_graph_skeleton()
+    if exercise_id not in skill_tree.exercises:
+        return None
+    ex_ids, truncated = _expand(skill_tree, [exercise_id], hops, limit)
+    return _subgraph(skill_tree, skeleton, ex_ids, get_mastered_ids(user), truncated, mastery_version)
+
+
+def muscle_graph(user, muscle, offset=0, limit=SUBGRAPH_DEFAULT_LIMIT):
+    """某个目标部位的动作子图，按拓扑序 (先基础后进阶) 分页"""
+    mastery_version = get_mastery_version(user.id)
+    skill_tree, skeleton = get_graph_skeleton()
+    ex_ids = [ex_id for ex_id in skill_tree.topo_order if skill_tree.exercises[ex_id].target_muscle == muscle]
+    page = ex_ids[offset:offset + limit]
+    data = _subgraph(
+        skill_tree, skeleton, page, get_mastered_ids(user), offset + limit < len(ex_ids), mastery_version
+    )
+    data.update(count=len(ex_ids), offset=offset)
+    return data
+
+
+def frontier_graph(user, limit=SUBGRAPH_DEFAULT_LIMIT):
+    """
+    掌握前沿：当前可以开始练的动作 (前置已全部掌握、自身尚未掌握)，以及作为上下文的
+    已掌握直接前置。有已掌握前置的进阶动作优先，其次按结构重要性；新用户即为入门动作
+    """
+    mastery_version = get_mastery_version(user.id)
+    skill_tree, skeleton = get_graph_skeleton()
+    mastered_ids = get_mastered_ids(user)
+    mastered_bits = skill_tree.mask_of(mastered_ids)
+    importance = structural_importance(skill_tree)
+
+    ready = [
+        ex_id for ex_id in skill_tree.topo_order
+        if ex_id not in mastered_ids and skill_tree.is_unlocked(ex_id, mastered_bits)
+    ]
+    ready.sort(key=lambda ex_id: (not skill_tree.prerequisites[ex_id], -importance.get(ex_id, 0.0)))
+    # 三分之一的名额留给已掌握的前置，让前沿节点在图上有来处
+    selected = ready[:max(limit - limit // 3, 1)]
+    context = []
+    chosen = set(selected)
+    for ex_id in selected:
+        for pre_id in skill_tree.prerequisites[ex_id]:
+            if pre_id not in chosen and len(selected) + len(context) < limit:
+                chosen.add(pre_id)
+                context.append(pre_id)
+    truncated = len(ready) > len(selected)
+    return _subgraph(skill_tree, skeleton, selected + context, mastered_ids, truncated, mastery_version)
+
+
+def _status(exercise_id, prerequisites, mastered_ids):
+    if exercise_id in mastered_ids:
+        return 'mastered'
+    if all(pre_id in mastered_ids for pre_id in prerequisites.get(exercise_id, ())):
+        return 'ready'
+    return 'locked'
+
+
+def graph_diff(user, graph_version, mastery_version):
+    """
+    客户端持有 (graph_version, mastery_version) 时的增量更新
+
+    掌握变更日志里 mastery_version 之后每个动作的第一条记录说明了它当时的状态
+    (变更前与记录相反)，据此从当前掌握集合倒推出客户端看到的掌握集合，只重算
+    受影响节点的状态。图谱版本不同时再与旧版本的结构摘要比对，给出新增/修改/删除
+    的节点和连线。旧版本摘要已过期或版本号不合法时返回 reset=True，客户端需全量重新加载。
+    """
+    current_mastery_version = get_mastery_version(user.id)
+    skill_tree, skeleton = get_graph_skeleton()
+    mastered_ids = get_mastered_ids(user)
+    data = {
+        'version': skeleton['version'],
+        'mastery_version': current_mastery_version,
+        'reset': False,
+        'nodes': [],
+        'removed_nodes': [],
+        'links': [],
+        'removed_links': [],
+        'stats': _graph_stats(skill_tree, mastered_ids),
+    }
+    old_structure = None
+    if graph_version != skeleton['version']:
+        old_structure = cache.get(GRAPH_STRUCTURE_CACHE_KEY.format(version=graph_version))
+    if mastery_version > current_mastery_version or (graph_version != skeleton['version'] and old_structure is None):
+        data['reset'] = True
+        return data
+
+    first_change = {}
+    for ex_id, mastered in UserMasteryChange.objects.filter(
+        user=user, id__gt=mastery_version
+    ).order_by('id').values_list('exercise_id', 'mastered'):
+        first_change.setdefault(ex_id, mastered)
+    old_mastered = set(mastered_ids)
+    for ex_id, mastered in first_change.items():
+        if mastered:
+            old_mastered.discard(ex_id)
+        else:
+            old_mastered.add(ex_id)
+    flipped = old_mastered ^ mastered_ids
+
+    if old_structure is None:
+        old_prerequisites = skill_tree.prerequisites
+        changed_nodes = set()
+        candidates = set(flipped)
+        for ex_id in flipped:
+            candidates.update(skill_tree.unlocks.get(ex_id, ()))
+        added_links = removed_links = set()
+    else:
+        new_structure = structure_of(skeleton)
+        old_links = {tuple(pair) for pair in old_structure['links']}
+        new_links = set(new_structure['links'])
+        old_prerequisites = {}
+        for source, target in old_links:
+            old_prerequisites.setdefault(int(target), []).append(int(source))
+        changed_nodes = {
+            int(node_id) for node_id, digest in new_structure['nodes'].items()
+            if old_structure['nodes'].get(node_id) != digest
+        }
+        candidates = set(skill_tree.exercises)
+        added_links, removed_links = new_links - old_links, old_links - new_links
+        data['removed_nodes'] = sorted(set(old_structure['nodes']) - set(new_structure['nodes']), key=int)
+        data['removed_links'] = [list(pair) for pair in sorted(removed_links)]
+
+    wanted = {
+        str(ex_id) for ex_id in candidates if ex_id in skill_tree.exercises and (
+            ex_id in changed_nodes
+            or _status(ex_id, old_prerequisites, old_mastered) != _status(ex_id, skill_tree.prerequisites, mastered_ids)
+        )
+    }
+    flipped_ids = {str(ex_id) for ex_id in flipped}
+    for node in skeleton['nodes']:
+        if node['id'] in wanted:
+            data['nodes'].append(overlay_node(node, _status(int(node['id']), skill_tree.prerequisites, mastered_ids)))
+    for link in skeleton['links']:
+        pair = (link['source'], link['target'])
+        if pair in added_links or link['source'] in flipped_ids or link['target'] in flipped_ids:
+            data['links'].append(overlay_link(link, mastered_ids))
+    return data
@@ -0,0 +1,243 @@
+"""
+动作混合检索：关键词索引 + 向量语义检索，倒数排名融合 (RRF)
+
+口语化的查询 (如“练胸不用器械”) 先解析出部位、器械、难度等结构化条件，与显式传入的
+过滤参数合并后在检索前生效：关键词检索限定在过滤后的动作范围内，向量检索通过
+Chroma 的 where 条件过滤 (索引缺少的元数据字段改为检索后按范围筛选)。两路检索
+并发执行 (向量检索在线程池中运行，超时或出错时只用关键词结果)，按 RRF 融合后
+结果按 (目录版本, 规范化查询, 过滤条件) 缓存。
+"""
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.core.cache import cache
+
+from .catalog_cache import get_catalog_version
+from .models import Exercise
+from .search import normalize, search_exercise_ids, segments
+
+logger = logging.getLogger(__name__)
+
+HYBRID_CACHE_KEY = "exercises:hybrid_search:{version}:{digest}"
+HYBRID_CACHE_TIMEOUT = 10 * 60
+# 只拿到一路结果时缓存时间缩短，尽快用完整结果替换
+DEGRADED_CACHE_TIMEOUT = 60
+
+# RRF 常数 k：排名靠后的结果贡献迅速衰减，但不会被单一路的头部结果完全压制
+RRF_K = 60
+# 每一路检索取的候选数
+CANDIDATES_PER_SOURCE = 50
+SEMANTIC_TIMEOUT = 3.0
+# 索引不支持部分过滤条件时，向量检索多取的候选倍数 (过滤在检索后进行)
+UNFILTERED_CANDIDATE_FACTOR = 4
+
+MUSCLE_KEYWORDS = {
+    'chest': ('胸肌', '胸部', '胸'),
+    'back': ('背阔', '背部', '背'),
+    'shoulders': ('肩膀', '肩部', '肩'),
+    'arms': ('手臂', '胳膊', '二头', '三头', '臂'),
+    'abs': ('马甲线', '核心', '腹肌', '腹部', '腹'),
+    'legs': ('大腿', '腿部', '腿'),
+    'glutes': ('翘臀', '臀部', '臀'),
+    'full_body': ('全身',),
+}
+# 先匹配“不用器械”这类否定说法，避免其中的“器械”被当成固定器械
+EQUIPMENT_KEYWORDS = {
+    'none': ('不用器械', '不要器械', '不需要器械', '无器械', '徒手', '自重'),
+    'dumbbell': ('哑铃',),
+    'barbell': ('杠铃',),
+    'resistance_band': ('弹力带', '阻力带'),
+    'kettlebell': ('壶铃',),
+    'machine': ('固定器械', '器械'),
+}
+BEGINNER_KEYWORDS = ('零基础', '新手', '入门', '初学')
+BEGINNER_MAX_LEVEL = 2
+# 剩余关键词里不参与关键词检索的口语虚词
+FILLER_WORDS = ('怎么练', '适合', '动作', '训练', '想要', '我想', '一下', '练', '用', '的', '我', '做')
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='hybrid-search')
+    return _executor
+
+
+def _take(text, keywords):
+    """text 中出现的第一个关键词，返回 (关键词, 去掉该关键词后的文本)"""
+    for keyword in keywords:
+        if keyword in text:
+            return keyword, text.replace(keyword, ' ')
+    return None, text
+
+
+def parse_query(query):
+    """
+    从口语化查询中解析结构化条件，返回 (条件, 剩余关键词)。
+    同时提到多个部位时不做部位过滤，交给检索排序
+    """
+    text = normalize(query)
+    filters = {}
+
+    for equipment, keywords in EQUIPMENT_KEYWORDS.items():
+        keyword, text = _take(text, keywords)
+        if keyword:
+            filters['equipment'] = equipment
+            break
+
+    muscles = []
+    for muscle, keywords in MUSCLE_KEYWORDS.items():
+        keyword, text = _take(text, keywords)
+        if keyword:
+            muscles.append(muscle)
+    if len(muscles) == 1:
+        filters['target_muscle'] = muscles[0]
+
+    keyword, text = _take(text, BEGINNER_KEYWORDS)
+    if keyword:
+        filters['max_level'] = BEGINNER_MAX_LEVEL
+
+    for word in FILLER_WORDS:
+        text = text.replace(word, ' ')
+    return filters, ' '.join(segments(text))
+
+
+def filtered_queryset(filters):
+    queryset = Exercise.objects.filter(is_active=True)
+    if 'target_muscle' in filters:
+        queryset = queryset.filter(target_muscle=filters['target_muscle'])
+    if 'equipment' in filters:
+        queryset = queryset.filter(equipment=filters['equipment'])
+    if 'level' in filters:
+        queryset = queryset.filter(level=filters['level'])
+    if 'max_level' in filters:
+        queryset = queryset.filter(level__lte=filters['max_level'])
+    return queryset
+
+
+def vector_where(filters):
+    """与 filtered_queryset 对应的 Chroma 元数据过滤条件"""
+    clauses = [{key: filters[key]} for key in ('target_muscle', 'equipment', 'level') if key in filters]
+    if 'max_level' in filters:
+        clauses.append({'level': {'$lte': filters['max_level']}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def _where_fields(where):
+    return {next(iter(clause)) for clause in where.get('$and', [where])} if where else set()
+
+
+def supported_where(where, fields):
+    """只保留索引元数据中存在的字段上的过滤条件，全部不支持时返回 None"""
+    if where is None:
+        return None
+    clauses = [clause for clause in where.get('$and', [where]) if next(iter(clause)) in fields]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def semantic_search(query, where, top_k=CANDIDATES_PER_SOURCE):
+    """
+    向量检索，返回按相似度排序的动作 id。旧索引缺少的元数据字段不参与 where 过滤
+    (否则什么都匹配不到)，改为多取候选、由调用方按过滤后的动作范围筛选
+    """
+    from utils.vector_db import VectorDB
+
+    db = VectorDB()
+    fields = db.metadata_fields()
+    missing = _where_fields(where) - fields
+    if missing:
+        logger.warning("向量索引缺少元数据字段 %s，相应条件改为检索后过滤 (请重新运行 build_vectors)", sorted(missing))
+        where = supported_where(where, fields)
+        top_k *= UNFILTERED_CANDIDATE_FACTOR
+    return [int(ex_id) for ex_id in db.search(query, top_k=top_k, where=where)]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    rankings: {来源: [动作 id, ...]}，返回按融合分数降序的
+    [(动作 id, 分数, {来源: 名次})]，名次从 1 开始
+    """
+    fused = {}
+    for source, ids in rankings.items():
+        for rank, ex_id in enumerate(ids, start=1):
+            score, ranks = fused.get(ex_id, (0.0, {}))
+            ranks[source] = rank
+            fused[ex_id] = (score + 1.0 / (k + rank), ranks)
+    return sorted(
+        ((ex_id, score, ranks) for ex_id, (score, ranks) in fused.items()),
+        key=lambda item: (-item[1], item[0]),
+    )
+
+
+def _cache_key(query, filters, limit):
+    payload = json.dumps({'q': normalize(query), 'filters': filters, 'limit': limit}, sort_keys=True)
+    digest = hashlib.md5(payload.encode('utf-8')).hexdigest()
+    return HYBRID_CACHE_KEY.format(version=get_catalog_version(), digest=digest)
+
+
+def hybrid_search(query, filters=None, limit=20):
+    """
+    混合检索。filters 为显式过滤条件 (target_muscle / equipment / level / max_level)，
+    优先于从查询中解析出的条件
+    """
+    parsed, keywords = parse_query(query)
+    filters = {**parsed, **(filters or {})}
+    key = _cache_key(query, filters, limit)
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    queryset = filtered_queryset(filters)
+    # 向量检索 (模型推理) 放到线程池，与当前线程的关键词检索并行
+    semantic_future = _get_executor().submit(semantic_search, normalize(query), vector_where(filters))
+    lexical_ids = [ex_id for ex_id, _ in search_exercise_ids(keywords, queryset, CANDIDATES_PER_SOURCE)] if keywords else []
+    allowed = set(queryset.values_list('id', flat=True))
+
+    sources = {'lexical': True, 'semantic': True}
+    try:
+        # 旧向量索引的元数据可能不全 (见 semantic_search)，结果再按过滤后的范围校验一次
+        semantic_ids = [ex_id for ex_id in semantic_future.result(timeout=SEMANTIC_TIMEOUT) if ex_id in allowed]
+    except TimeoutError:
+        logger.warning("向量检索超时 (%.1fs)，仅使用关键词结果", SEMANTIC_TIMEOUT)
+        semantic_ids, sources['semantic'] = [], False
+    except Exception as exc:
+        logger.warning("向量检索失败，仅使用关键词结果: %r", exc)
+        semantic_ids, sources['semantic'] = [], False
+
+    fused = reciprocal_rank_fusion({'lexical': lexical_ids, 'semantic': semantic_ids})[:limit]
+    if not fused:
+        # 查询只有结构化条件且语义检索不可用时，按难度列出符合条件的动作
+        fused = [
+            (ex_id, 0.0, {})
+            for ex_id in queryset.order_by('level', 'order', 'id').values_list('id', flat=True)[:limit]
+        ]
+
+    exercises = Exercise.objects.in_bulk([ex_id for ex_id, _, _ in fused])
+    data = {
+        'query': query,
+        'keywords': keywords,
+        'filters': filters,
+        'sources': sources,
+        'results': [{
+            'id': ex_id,
+            'name': exercises[ex_id].name,
+            'english_name': exercises[ex_id].english_name,
+            'target_muscle': exercises[ex_id].target_muscle,
+            'equipment': exercises[ex_id].equipment,
+            'level': exercises[ex_id].level,
+            'difficulty': exercises[ex_id].difficulty,
+            'score': round(score, 6),
+            'lexical_rank': ranks.get('lexical'),
+            'semantic_rank': ranks.get('semantic'),
+        } for ex_id, score, ranks in fused if ex_id in exercises],
+    }
+    cache.set(key, data, HYBRID_CACHE_TIMEOUT if sources['semantic'] else DEGRADED_CACHE_TIMEOUT)
+    return data
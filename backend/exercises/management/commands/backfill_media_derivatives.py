@@ -0,0 +1,36 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from utils.media_derivatives import MEDIA_FIELDS, generate_for, generate_media_derivatives
+
+
+class Command(BaseCommand):
+    help = '为已有的动作演示、头像和姿态快照补生成 WebP 派生图 (已是最新的记录会跳过)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', action='append', choices=sorted({model for _, model, _ in MEDIA_FIELDS}),
+            help='只处理指定模型，可重复传入；默认处理全部',
+        )
+        parser.add_argument('--force', action='store_true', help='忽略已有的派生记录，全部重新生成')
+        parser.add_argument('--async', dest='use_async', action='store_true', help='投递到 Celery 生成')
+
+    def handle(self, *args, **options):
+        total = 0
+        for (app_label, model_name, field_name), (variants_field, _) in MEDIA_FIELDS.items():
+            if options['model'] and model_name not in options['model']:
+                continue
+            model = apps.get_model(app_label, model_name)
+            rows = model.objects.exclude(**{f'{field_name}__isnull': True}).exclude(**{field_name: ''})
+            if options['force']:
+                rows.update(**{variants_field: {}})
+            pks = list(rows.values_list('pk', flat=True).order_by('pk'))
+            self.stdout.write(f"{model._meta.verbose_name}: {len(pks)} 条记录")
+
+            for pk in pks:
+                if options['use_async']:
+                    generate_media_derivatives.delay(app_label, model_name, pk, field_name)
+                else:
+                    generate_for(model, pk, field_name)
+            total += len(pks)
+
+        self.stdout.write(self.style.SUCCESS(f'完成：共处理 {total} 条记录'))
@@ -1,12 +1,41 @@
 import os
-import requests
-import json
 from django.core.management.base import BaseCommand
 from django.db.models import Q
 from exercises.models import Exercise
+from utils.llm_batch import add_batch_arguments, chunked, client_from_options
+
+SYSTEM_PROMPT = "你是一个专门生成健身动作标签的助手，只输出合法JSON。"
+MAX_TAGS = 5
+
+
+def build_prompt(exercises):
+    """一次请求为多个动作生成标签，用动作 id 对应结果"""
+    exercise_list_str = "\n\n".join(
+        f"动作ID：{ex.id}\n"
+        f"动作名称：{ex.name}\n"
+        f"英文名称：{ex.english_name}\n"
+        f"动作描述：{ex.description}\n"
+        f"目标肌群：{ex.get_target_muscle_display()}\n"
+        f"动作要领：{ex.instructions}"
+        for ex in exercises
+    )
+    return f"""
+    你是一个健身专家。请根据以下每个健身动作的信息，分别生成不超过{MAX_TAGS}个关键词标签（tags）。
+    标签应该是简短的关键词，如“增肌”、“减脂”、“核心训练”、“无需器械”、“胸肌”等。
+    请直接返回JSON格式，每个动作一项，格式如下：
+    {{"results": [{{"id": 动作ID, "tags": ["标签1", "标签2", ...]}}, ...]}}
+    不要有任何解释文字。
+
+    {exercise_list_str}
+    """
+
 
 class Command(BaseCommand):
-    help = '使用 DeepSeek API 为没有标签的动作生成标签'
+    help = '使用 DeepSeek API 为没有标签的动作生成标签 (多个动作合并为一个请求，并发发送，响应缓存到磁盘)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=8, help='每个请求包含的动作数')
+        add_batch_arguments(parser)
 
     def handle(self, *args, **options):
         api_key = os.getenv('DEEPSEEK_API_KEY')
@@ -15,58 +44,41 @@ class Command(BaseCommand):
             return
 
         # 找出标签为空列表或为 None 的动作
-        exercises = Exercise.objects.filter(Q(tags=[]) | Q(tags__isnull=True))
-        if not exercises.exists():
+        exercises = list(Exercise.objects.filter(Q(tags=[]) | Q(tags__isnull=True)).order_by('id'))
+        if not exercises:
             self.stdout.write(self.style.SUCCESS('所有动作已有标签。'))
             return
 
-        url = "https://api.deepseek.com/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
+        batches = list(chunked(exercises, max(1, options['batch_size'])))
+        by_id = {ex.id: ex for ex in exercises}
+        client = client_from_options(api_key, options)
+        self.stdout.write(f"共 {len(exercises)} 个动作，分 {len(batches)} 批生成标签...")
 
-        for exercise in exercises:
-            self.stdout.write(f"正在为 '{exercise.name}' 生成标签...")
-            
-            prompt = f"""
-            你是一个健身专家。请根据以下健身动作的信息，生成不超过5个关键词标签（tags）。
-            标签应该是简短的关键词，如“增肌”、“减脂”、“核心训练”、“无需器械”、“胸肌”等。
-            请直接返回JSON格式，格式如下：{{"tags": ["标签1", "标签2", ...]}}
-            不要有任何解释文字。
-            
-            动作名称：{exercise.name}
-            英文名称：{exercise.english_name}
-            动作描述：{exercise.description}
-            目标肌群：{exercise.get_target_muscle_display()}
-            动作要领：{exercise.instructions}
-            """
+        jobs = [(index, SYSTEM_PROMPT, build_prompt(batch)) for index, batch in enumerate(batches)]
+        saved = 0
+        for index, res_data, error in client.run(jobs):
+            names = '、'.join(ex.name for ex in batches[index])
+            if error is not None:
+                self.stdout.write(self.style.ERROR(f"生成失败 {names}: {error}"))
+                continue
 
-            data = {
-                "model": "deepseek-chat",
-                "messages": [
-                    {"role": "system", "content": "你是一个专门生成健身动作标签的助手，只输出合法JSON。"},
-                    {"role": "user", "content": prompt}
-                ],
-                "response_format": {"type": "json_object"}
-            }
+            results = res_data.get('results') if isinstance(res_data, dict) else None
+            if not isinstance(results, list):
+                self.stdout.write(self.style.WARNING(f"AI返回格式异常: {res_data}"))
+                continue
+            batch_ids = {ex.id for ex in batches[index]}
+            for item in results:
+                if not isinstance(item, dict):
+                    continue
+                exercise = by_id.get(item.get('id')) if item.get('id') in batch_ids else None
+                tags = item.get('tags')
+                if exercise is None or not isinstance(tags, list):
+                    continue
+                exercise.tags = [str(tag) for tag in tags[:MAX_TAGS]]
+                exercise.save(update_fields=['tags', 'updated_at'])
+                saved += 1
+                self.stdout.write(self.style.SUCCESS(f"已为 '{exercise.name}' 保存标签: {exercise.tags}"))
 
-            try:
-                # 实际调用时请确保网络畅通
-                response = requests.post(url, headers=headers, json=data, timeout=30)
-                response.raise_for_status()
-                result = response.json()
-                content = result['choices'][0]['message']['content']
-                
-                res_data = json.loads(content)
-                tags = res_data.get('tags', [])
-                
-                if isinstance(tags, list):
-                    exercise.tags = tags[:5]
-                    exercise.save()
-                    self.stdout.write(self.style.SUCCESS(f"已为 '{exercise.name}' 保存标签: {exercise.tags}"))
-                else:
-                    self.stdout.write(self.style.WARNING(f"AI返回格式异常: {content}"))
-                    
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"生成失败 {exercise.name}: {str(e)}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"完成：保存 {saved} 个动作的标签，请求 {client.request_count} 次，命中缓存 {client.cache_hits} 次"
+        ))
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exercises", "0006_exercise_tags"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="userexerciserecord",
+            index=models.Index(
+                fields=["user", "exercise", "-created_at"],
+                name="exercise_record_progress_idx",
+            ),
+        ),
+    ]
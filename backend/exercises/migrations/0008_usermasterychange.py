@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exercises", "0007_userexerciserecord_progress_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserMasteryChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("mastered", models.BooleanField(verbose_name="变更后是否掌握")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="变更时间"),
+                ),
+                (
+                    "exercise",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="exercises.exercise",
+                        verbose_name="动作",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="mastery_changes",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="用户",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "动作掌握变更",
+                "verbose_name_plural": "动作掌握变更",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(fields=["user", "id"], name="mastery_change_user_idx")
+                ],
+            },
+        ),
+    ]
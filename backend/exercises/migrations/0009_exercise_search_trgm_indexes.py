@@ -0,0 +1,37 @@
+from django.db import migrations
+
+TRIGRAM_INDEXES = {
+    "exercise_name_trgm_idx": "name",
+    "exercise_english_name_trgm_idx": "english_name",
+    "exercise_description_trgm_idx": "description",
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """仅 PostgreSQL：启用 pg_trgm 并为检索字段建 GIN 三元组索引，其他数据库用进程内索引"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    table = apps.get_model("exercises", "Exercise")._meta.db_table
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" USING gin ("{column}" gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exercises", "0008_usermasterychange"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
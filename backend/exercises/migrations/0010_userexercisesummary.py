@@ -0,0 +1,107 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exercises", "0009_exercise_search_trgm_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserExerciseSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "record_count",
+                    models.IntegerField(default=0, verbose_name="练习次数"),
+                ),
+                (
+                    "total_duration",
+                    models.IntegerField(default=0, verbose_name="总时长(秒)"),
+                ),
+                (
+                    "total_calories",
+                    models.FloatField(default=0.0, verbose_name="总消耗卡路里"),
+                ),
+                (
+                    "best_accuracy_score",
+                    models.FloatField(default=0.0, verbose_name="最佳评分"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "best_record",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="exercises.userexerciserecord",
+                        verbose_name="最佳记录",
+                    ),
+                ),
+                (
+                    "exercise",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="exercises.exercise",
+                        verbose_name="动作",
+                    ),
+                ),
+                (
+                    "latest_record",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="exercises.userexerciserecord",
+                        verbose_name="最近记录",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="exercise_summaries",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="用户",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "用户动作汇总",
+                "verbose_name_plural": "用户动作汇总",
+                "constraints": [
+                    models.UniqueConstraint(
+                        condition=models.Q(("exercise__isnull", False)),
+                        fields=("user", "exercise"),
+                        name="unique_user_exercise_summary",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("exercise__isnull", True)),
+                        fields=("user",),
+                        name="unique_user_total_summary",
+                    ),
+                ],
+            },
+        ),
+    ]
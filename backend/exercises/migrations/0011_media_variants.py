@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exercises", "0010_userexercisesummary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exercise",
+            name="demo_variants",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="动画 WebP 与封面帧，由 utils.media_derivatives 生成",
+                verbose_name="演示派生图",
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+# icontains 在 PostgreSQL 上编译为 UPPER("col"::text) LIKE UPPER('%…%')，
+# 裸列上的三元组索引用不上，改为对同一表达式建索引
+OLD_INDEXES = {
+    "exercise_name_trgm_idx": "name",
+    "exercise_english_name_trgm_idx": "english_name",
+    "exercise_description_trgm_idx": "description",
+}
+UPPER_INDEXES = {
+    "exercise_name_upper_trgm_idx": "name",
+    "exercise_english_name_upper_trgm_idx": "english_name",
+    "exercise_description_upper_trgm_idx": "description",
+}
+
+
+def _create(apps, schema_editor, indexes, expression):
+    table = apps.get_model("exercises", "Exercise")._meta.db_table
+    for name, column in indexes.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" '
+            f"USING gin (({expression.format(column)}) gin_trgm_ops)"
+        )
+
+
+def _drop(schema_editor, indexes):
+    for name in indexes:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def use_upper_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    _drop(schema_editor, OLD_INDEXES)
+    _create(apps, schema_editor, UPPER_INDEXES, 'UPPER("{}"::text)')
+
+
+def use_column_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    _drop(schema_editor, UPPER_INDEXES)
+    _create(apps, schema_editor, OLD_INDEXES, '"{}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("exercises", "0011_media_variants"),
+    ]
+
+    operations = [
+        migrations.RunPython(use_upper_indexes, use_column_indexes),
+    ]
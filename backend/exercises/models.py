@@ -106,6 +106,10 @@ class Exercise(models.Model):
         null=True, 
         help_text="上传标准动作的 GIF 动图或短视频"
     )
+    demo_variants = models.JSONField(
+        "演示派生图", default=dict, blank=True, editable=False,
+        help_text="动画 WebP 与封面帧，由 utils.media_derivatives 生成"
+    )
     
     # 状态和排序
     is_active = models.BooleanField("是否启用", default=True)
@@ -145,11 +149,74 @@ class UserExerciseRecord(models.Model):
         verbose_name = "用户动作记录"
         verbose_name_plural = "用户动作记录"
         ordering = ['-created_at']
+        indexes = [
+            # 动作列表按 (用户, 动作) 取最佳得分和最近一次记录
+            models.Index(fields=['user', 'exercise', '-created_at'], name='exercise_record_progress_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.exercise.name} ({self.created_at.strftime('%Y-%m-%d')})"
 
 
+class UserExerciseSummary(models.Model):
+    """
+    用户练习记录的汇总行，新增记录时增量维护 (见 exercises/summaries.py)。
+    exercise 为空的一行是该用户全部动作的汇总，其余每个 (用户, 动作) 一行
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exercise_summaries', verbose_name="用户")
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE, null=True, blank=True, verbose_name="动作")
+
+    record_count = models.IntegerField("练习次数", default=0)
+    total_duration = models.IntegerField("总时长(秒)", default=0)
+    total_calories = models.FloatField("总消耗卡路里", default=0.0)
+    best_accuracy_score = models.FloatField("最佳评分", default=0.0)
+    best_record = models.ForeignKey(
+        UserExerciseRecord, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="最佳记录"
+    )
+    latest_record = models.ForeignKey(
+        UserExerciseRecord, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="最近记录"
+    )
+    updated_at = models.DateTimeField("更新时间", auto_now=True)
+
+    class Meta:
+        verbose_name = "用户动作汇总"
+        verbose_name_plural = "用户动作汇总"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'exercise'], condition=models.Q(exercise__isnull=False),
+                name='unique_user_exercise_summary',
+            ),
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(exercise__isnull=True), name='unique_user_total_summary',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.exercise_id or '全部'} ({self.record_count})"
+
+
+class UserMasteryChange(models.Model):
+    """
+    用户动作掌握状态的变更日志 (达标/失去达标各记一条)。
+    自增 id 单调递增，某用户最新一条的 id 即其掌握版本号，供图谱增量同步使用
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='mastery_changes', verbose_name="用户")
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE, verbose_name="动作")
+    mastered = models.BooleanField("变更后是否掌握")
+    created_at = models.DateTimeField("变更时间", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "动作掌握变更"
+        verbose_name_plural = "动作掌握变更"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id'], name='mastery_change_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.exercise_id} ({'掌握' if self.mastered else '失去掌握'})"
+
+
 class ExerciseGraph(models.Model):
     """
     记录动作之间的关联强度：大家做完 A，通常接下来做 B 的概率
@@ -0,0 +1,258 @@
+"""
+动作全文检索
+
+PostgreSQL 下在 UPPER(名称/英文名/描述) 上建 pg_trgm 的 GIN 索引 (见迁移 0012，
+与 icontains 编译出的 UPPER(col::text) LIKE 表达式一致)，按关键词做 icontains 过滤
+(走索引) 后只对候选行计算三元组词相似度排序。pg_trgm 按字符切分，中文也能命中，
+但不足 3 个字的词没有三元组、用不上索引，含这类词的查询 (如“深蹲”) 与其他数据库
+(如本地 SQLite、测试) 一样使用进程内的 n-gram 倒排索引：
+中文切成单字和相邻二字，英文数字按整词加三元组，按 idf 加权打分。
+倒排索引按目录版本缓存，动作变化后首次检索时重建，检索耗时只与命中的倒排链长度有关。
+"""
+import math
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+from django.utils.html import escape
+from rest_framework.filters import BaseFilterBackend
+
+from .catalog_cache import get_catalog_version
+from .models import Exercise
+
+# 单次检索最多返回的候选数，列表接口在此范围内分页
+SEARCH_MAX_RESULTS = 500
+# 查询词的 idf 权重至少要命中这个比例，过滤掉只沾了一两个字的结果
+MIN_COVERAGE = 0.5
+# 名称完整包含查询词时的加成
+NAME_MATCH_BOOST = 1.5
+SNIPPET_LENGTH = 80
+
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'english_name': 2.0,
+    'tags': 2.0,
+    'description': 1.0,
+}
+TRIGRAM_FIELDS = ('name', 'english_name', 'description')
+# pg_trgm 能用索引过滤的最短关键词长度
+TRIGRAM_MIN_LENGTH = 3
+
+_SEGMENT_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]+|[a-z0-9]+')
+
+
+def normalize(text):
+    return unicodedata.normalize('NFKC', text or '').lower().strip()
+
+
+def segments(text):
+    """切成连续的中文片段和英文数字单词"""
+    return _SEGMENT_RE.findall(normalize(text))
+
+
+def _is_cjk(segment):
+    return not segment[0].isascii()
+
+
+def tokenize(text):
+    """中文取单字 + 二字组合，英文数字取整词 + 三元组 (以 ~ 前缀区分)"""
+    tokens = []
+    for seg in segments(text):
+        if _is_cjk(seg):
+            tokens.extend(seg)
+            tokens.extend(seg[i:i + 2] for i in range(len(seg) - 1))
+        else:
+            tokens.append(seg)
+            if len(seg) > 3:
+                tokens.extend('~' + seg[i:i + 3] for i in range(len(seg) - 2))
+    return tokens
+
+
+class NgramIndex:
+    """动作目录的 n-gram 倒排索引：token -> {动作 id: 字段加权词频}"""
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.names = {}
+        self.postings = defaultdict(dict)
+        for row in rows:
+            self.names[row['id']] = normalize(row['name'])
+            weights = defaultdict(float)
+            for field, weight in FIELD_WEIGHTS.items():
+                value = row[field]
+                if field == 'tags':
+                    value = ' '.join(str(tag) for tag in value or [])
+                counts = defaultdict(int)
+                for token in tokenize(value):
+                    counts[token] += 1
+                for token, count in counts.items():
+                    # 词频取对数，长描述里重复出现的字不会压过名称命中
+                    weights[token] += weight * (1 + math.log(count))
+            for token, weight in weights.items():
+                self.postings[token][row['id']] = weight
+
+    @classmethod
+    def from_db(cls, version=None):
+        rows = Exercise.objects.filter(is_active=True).values('id', *FIELD_WEIGHTS)
+        return cls(rows.iterator(), version=version)
+
+    def search(self, query, limit=SEARCH_MAX_RESULTS):
+        """返回按相关度降序的 [(动作 id, 分数)]"""
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+        total = len(self.names) or 1
+        idf = {token: math.log(1 + total / len(self.postings[token])) for token in tokens if token in self.postings}
+        # 未出现在索引中的查询词同样计入分母，按文档数为 1 估计其 idf
+        full_weight = sum(idf.values()) + math.log(1 + total) * (len(tokens) - len(idf))
+
+        scores = defaultdict(float)
+        matched = defaultdict(float)
+        for token, token_idf in idf.items():
+            for ex_id, weight in self.postings[token].items():
+                scores[ex_id] += token_idf * weight
+                matched[ex_id] += token_idf
+
+        phrase = normalize(query)
+        results = []
+        for ex_id, score in scores.items():
+            if matched[ex_id] < MIN_COVERAGE * full_weight:
+                continue
+            if phrase and phrase in self.names[ex_id]:
+                score *= NAME_MATCH_BOOST
+            results.append((ex_id, score))
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results[:limit]
+
+
+_ngram_index = None
+
+
+def get_ngram_index():
+    """当前目录版本的倒排索引，版本变化后重建"""
+    global _ngram_index
+    version = get_catalog_version()
+    if _ngram_index is None or _ngram_index.version != version:
+        _ngram_index = NgramIndex.from_db(version=version)
+    return _ngram_index
+
+
+def _trigram_search(query, queryset, limit):
+    from django.contrib.postgres.search import TrigramWordSimilarity
+    from django.db.models.functions import Greatest
+
+    words = normalize(query).split()
+    if not words:
+        return []
+    for word in words:
+        queryset = queryset.filter(
+            Q(name__icontains=word) | Q(english_name__icontains=word) | Q(description__icontains=word)
+        )
+    rank = Greatest(*(
+        TrigramWordSimilarity(query, field) * FIELD_WEIGHTS[field] for field in TRIGRAM_FIELDS
+    ))
+    return list(queryset.annotate(rank=rank).order_by('-rank', 'id').values_list('id', 'rank')[:limit])
+
+
+def use_trigram_index(query):
+    """每个关键词都至少有一个三元组时，icontains 过滤才能走 GIN 索引"""
+    words = normalize(query).split()
+    return bool(words) and all(len(word) >= TRIGRAM_MIN_LENGTH for word in words)
+
+
+def search_exercise_ids(query, queryset=None, limit=SEARCH_MAX_RESULTS):
+    """
+    在 queryset (默认全部启用的动作) 范围内检索，返回按相关度降序的 [(动作 id, 分数)]。
+    结构化过滤应先作用在 queryset 上，再交给这里排序
+    """
+    if queryset is None:
+        queryset = Exercise.objects.filter(is_active=True)
+    if connection.vendor == 'postgresql' and use_trigram_index(query):
+        return _trigram_search(query, queryset, limit)
+
+    results = get_ngram_index().search(query, limit=None)
+    if queryset.query.where:
+        allowed = set(queryset.values_list('id', flat=True))
+        results = [item for item in results if item[0] in allowed]
+    return results[:limit]
+
+
+def order_by_ids(queryset, ids):
+    """按 ids 的顺序返回 queryset 中的这些动作"""
+    if not ids:
+        return queryset.none()
+    ordering = Case(*(When(id=ex_id, then=pos) for pos, ex_id in enumerate(ids)), output_field=IntegerField())
+    return queryset.filter(id__in=ids).order_by(ordering)
+
+
+def _match_spans(text, query):
+    """text 中需要高亮的区间：优先整段命中，中文片段整段找不到时退而匹配其中的二字组合"""
+    lowered = normalize(text)
+    if len(lowered) != len(text):
+        lowered = text.lower()
+    needles = []
+    for seg in segments(query):
+        if seg in lowered or not _is_cjk(seg) or len(seg) < 3:
+            needles.append(seg)
+        else:
+            needles.extend(seg[i:i + 2] for i in range(len(seg) - 1))
+    spans = []
+    for needle in needles:
+        start = lowered.find(needle)
+        while start != -1:
+            spans.append((start, start + len(needle)))
+            start = lowered.find(needle, start + len(needle))
+    spans.sort()
+    merged = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def highlight(text, query, max_length=None):
+    """
+    用 <mark> 标出命中的片段 (其余内容已转义)。给定 max_length 时截取第一处命中
+    附近的一段作为摘要
+    """
+    text = text or ''
+    spans = _match_spans(text, query)
+    begin, end = 0, len(text)
+    if max_length and len(text) > max_length:
+        first = spans[0][0] if spans else 0
+        begin = max(min(first - max_length // 4, len(text) - max_length), 0)
+        end = begin + max_length
+
+    parts = ['…' if begin > 0 else '']
+    cursor = begin
+    for start, stop in spans:
+        if stop <= begin or start >= end:
+            continue
+        start, stop = max(start, begin), min(stop, end)
+        parts.append(escape(text[cursor:start]))
+        parts.append(f'<mark>{escape(text[start:stop])}</mark>')
+        cursor = stop
+    parts.append(escape(text[cursor:end]))
+    parts.append('…' if end < len(text) else '')
+    return ''.join(parts)
+
+
+class IndexedSearchFilter(BaseFilterBackend):
+    """
+    替代 DRF SearchFilter 的索引检索：?search= 的结果按相关度排序，
+    显式传入 ordering 参数时保留 OrderingFilter 的排序。需放在 OrderingFilter 之后
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not segments(query):
+            return queryset
+        ids = [ex_id for ex_id, _ in search_exercise_ids(query, queryset)]
+        if request.query_params.get('ordering'):
+            return queryset.filter(id__in=ids)
+        return order_by_ids(queryset, ids)
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import ExerciseCategory, Exercise, UserExerciseRecord
 from users.models import UserProfile
+from utils.media_derivatives import VariantURLsField
 
 class ExerciseCategorySerializer(serializers.ModelSerializer):
     """动作分类序列化器"""
@@ -11,12 +12,16 @@ class ExerciseCategorySerializer(serializers.ModelSerializer):
         fields = '__all__'
         
     def get_exercises_count(self, obj):
-        return obj.exercise_set.filter(is_active=True).count()
+        count = getattr(obj, 'active_exercises_count', None)
+        if count is None:
+            count = obj.exercise_set.filter(is_active=True).count()
+        return count
 
 
 class ExerciseSerializer(serializers.ModelSerializer):
     """动作序列化器"""
     category_name = serializers.CharField(source='category.name', read_only=True)
+    demo_variants = VariantURLsField()
     
     class Meta:
         model = Exercise
@@ -24,7 +29,33 @@ class ExerciseSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at', 'updated_at')
 
 
-class ExerciseDetailSerializer(serializers.ModelSerializer):
+class UserProgressFieldsMixin:
+    """
+    读取预取的前置/解锁关系；用户进度由视图在缓存的目录数据上合并
+    (views.user_progress_overlay)，这里只读取对象上已有的注解，序列化时不再逐条查询
+    """
+
+    def get_unlocks(self, obj):
+        return [{"id": e.id, "name": e.name} for e in obj.unlocks.all()]
+
+    def get_prerequisite_list(self, obj):
+        return [{"id": e.id, "name": e.name} for e in obj.prerequisites.all()]
+
+    def get_user_best_score(self, obj):
+        return getattr(obj, 'user_best_score', None)
+
+    def get_user_last_record(self, obj):
+        if getattr(obj, 'last_created_at', None) is None:
+            return None
+        return {
+            'accuracy_score': obj.last_accuracy_score,
+            'count': obj.last_count,
+            'duration': obj.last_duration,
+            'created_at': obj.last_created_at
+        }
+
+
+class ExerciseDetailSerializer(UserProgressFieldsMixin, serializers.ModelSerializer):
     """动作详情序列化器，包含用户进度和详细显示文本"""
     category_name = serializers.CharField(source='category.name', read_only=True)
     difficulty_display = serializers.CharField(source='get_difficulty_display', read_only=True)
@@ -34,44 +65,12 @@ class ExerciseDetailSerializer(serializers.ModelSerializer):
     user_last_record = serializers.SerializerMethodField()
     unlocks = serializers.SerializerMethodField()
     prerequisite_list = serializers.SerializerMethodField()
+    demo_variants = VariantURLsField()
     
     class Meta:
         model = Exercise
         exclude = ('created_at', 'updated_at')
 
-    def get_unlocks(self, obj):
-        return [{"id": e.id, "name": e.name} for e in obj.unlocks.all()]
-
-    def get_prerequisite_list(self, obj):
-        return [{"id": e.id, "name": e.name} for e in obj.prerequisites.all()]
-
-    def get_user_best_score(self, obj):
-        request = self.context.get('request')
-        if request and hasattr(request, 'user') and request.user.is_authenticated:
-            best_record = UserExerciseRecord.objects.filter(
-                user=request.user,
-                exercise=obj
-            ).order_by('-accuracy_score').first()
-            return best_record.accuracy_score if best_record else None
-        return None
-        
-    def get_user_last_record(self, obj):
-        request = self.context.get('request')
-        if request and hasattr(request, 'user') and request.user.is_authenticated:
-            last_record = UserExerciseRecord.objects.filter(
-                user=request.user,
-                exercise=obj
-            ).order_by('-created_at').first()
-            
-            if last_record:
-                return {
-                    'accuracy_score': last_record.accuracy_score,
-                    'count': last_record.count,
-                    'duration': last_record.duration,
-                    'created_at': last_record.created_at
-                }
-        return None
-
 
 class UserExerciseRecordSerializer(serializers.ModelSerializer):
     """用户动作记录序列化器"""
@@ -84,7 +83,7 @@ class UserExerciseRecordSerializer(serializers.ModelSerializer):
         read_only_fields = ('user', 'created_at',)
 
 
-class ExerciseWithUserProgressSerializer(serializers.ModelSerializer):
+class ExerciseWithUserProgressSerializer(UserProgressFieldsMixin, serializers.ModelSerializer):
     """包含用户进度的动作序列化器"""
     category_name = serializers.CharField(source='category.name', read_only=True)
     difficulty_display = serializers.CharField(source='get_difficulty_display', read_only=True)
@@ -94,40 +93,8 @@ class ExerciseWithUserProgressSerializer(serializers.ModelSerializer):
     user_last_record = serializers.SerializerMethodField()
     prerequisite_list = serializers.SerializerMethodField()
     unlocks = serializers.SerializerMethodField()
+    demo_variants = VariantURLsField()
     
     class Meta:
         model = Exercise
         fields = '__all__'
-        
-    def get_prerequisite_list(self, obj):
-        return [{"id": e.id, "name": e.name} for e in obj.prerequisites.all()]
-
-    def get_unlocks(self, obj):
-        return [{"id": e.id, "name": e.name} for e in obj.unlocks.all()]
-
-    def get_user_best_score(self, obj):
-        request = self.context.get('request')
-        if request and hasattr(request, 'user'):
-            best_record = UserExerciseRecord.objects.filter(
-                user=request.user,
-                exercise=obj
-            ).order_by('-accuracy_score').first()
-            return best_record.accuracy_score if best_record else None
-        return None
-        
-    def get_user_last_record(self, obj):
-        request = self.context.get('request')
-        if request and hasattr(request, 'user'):
-            last_record = UserExerciseRecord.objects.filter(
-                user=request.user,
-                exercise=obj
-            ).order_by('-created_at').first()
-            
-            if last_record:
-                return {
-                    'accuracy_score': last_record.accuracy_score,
-                    'count': last_record.count,
-                    'duration': last_record.duration,
-                    'created_at': last_record.created_at
-                }
-        return None
\ No newline at end of file
@@ -0,0 +1,145 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_init, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from utils.media_derivatives import derivatives_ready, schedule_derivatives
+from .catalog_cache import bump_catalog_version, bump_user_progress_version
+from .models import Exercise, ExerciseCategory, UserExerciseRecord, UserExerciseSummary, UserMasteryChange
+from .skill_tree import MASTERY_PASS_SCORE, bump_skill_tree_version
+from .summaries import record_added, recompute_summaries
+
+
+@receiver([post_save, post_delete], sender=Exercise)
+def invalidate_skill_tree_on_exercise_change(sender, instance, **kwargs):
+    """动作增删或等级调整后，技能树索引和目录缓存需要重建"""
+    bump_skill_tree_version()
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Exercise)
+def generate_demo_derivatives(sender, instance, **kwargs):
+    """演示文件变化后生成动画 WebP 与封面帧"""
+    schedule_derivatives(instance, 'demo_gif')
+
+
+@receiver(derivatives_ready, sender=Exercise)
+def invalidate_catalog_on_demo_derivatives(sender, **kwargs):
+    """派生图用 update 写回，目录缓存需要单独失效才能带上新地址"""
+    bump_catalog_version()
+
+
+@receiver(m2m_changed, sender=Exercise.prerequisites.through)
+def invalidate_skill_tree_on_prerequisites_change(sender, action, **kwargs):
+    """前置关系变化后，技能树索引需要重建 (目录中的前置/解锁列表也随之变化)"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_skill_tree_version()
+        bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=ExerciseCategory)
+def invalidate_catalog_on_category_change(sender, instance, **kwargs):
+    bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=UserExerciseRecord)
+def invalidate_user_progress_etag(sender, instance, **kwargs):
+    """用户动作记录变化后，带个人进度的目录响应 ETag 失效"""
+    bump_user_progress_version(instance.user_id)
+
+
+@receiver(post_init, sender=UserExerciseRecord)
+def remember_record_state(sender, instance, **kwargs):
+    """
+    记下加载时是否达标及所属动作，保存时据此判断掌握状态和哪些汇总行需要更新。
+    only()/defer() 延迟加载的字段不能在这里读取 (取值会重新加载、再次触发 post_init，
+    无限递归)，只用已加载的值；未加载时记为 None，即"未知"，保存时改为重算
+    """
+    if instance.pk is None:
+        instance._was_passing, instance._loaded_exercise_id = False, None
+        return
+    values = instance.__dict__
+    score = values.get('accuracy_score')
+    instance._was_passing = None if score is None else score >= MASTERY_PASS_SCORE
+    instance._loaded_exercise_id = values.get('exercise_id')
+
+
+def _deleted_with_owner(origin):
+    """用户或动作被删除时记录随之级联删除，依附于它们的日志和汇总也会一并删掉，无需维护"""
+    if origin is None:
+        return False
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin_model is not UserExerciseRecord
+
+
+def _has_other_passing_record(instance):
+    return UserExerciseRecord.objects.filter(
+        user_id=instance.user_id, exercise_id=instance.exercise_id, accuracy_score__gte=MASTERY_PASS_SCORE
+    ).exclude(pk=instance.pk).exists()
+
+
+def _log_if_mastery_differs(instance, mastered):
+    """加载时达标状态未知：与该动作最近一条掌握日志比较，不一致时补记一条"""
+    last = UserMasteryChange.objects.filter(
+        user_id=instance.user_id, exercise_id=instance.exercise_id
+    ).order_by('-id').values_list('mastered', flat=True).first()
+    if bool(last) != mastered:
+        UserMasteryChange.objects.create(
+            user_id=instance.user_id, exercise_id=instance.exercise_id, mastered=mastered
+        )
+
+
+@receiver(post_save, sender=UserExerciseRecord)
+def log_mastery_change_on_save(sender, instance, created, **kwargs):
+    """
+    首条达标记录出现时记一条"掌握"，唯一的达标记录被改成不达标时记一条"失去掌握"；
+    其余情况掌握状态不变，不写日志
+    """
+    passing = instance.accuracy_score >= MASTERY_PASS_SCORE
+    if instance._was_passing is None and not created:
+        _log_if_mastery_differs(instance, passing or _has_other_passing_record(instance))
+        instance._was_passing = passing
+        return
+    was_passing = instance._was_passing and not created
+    if passing != was_passing and not _has_other_passing_record(instance):
+        UserMasteryChange.objects.create(
+            user_id=instance.user_id, exercise_id=instance.exercise_id, mastered=passing
+        )
+    instance._was_passing = passing
+
+
+@receiver(post_delete, sender=UserExerciseRecord)
+def log_mastery_change_on_delete(sender, instance, origin=None, **kwargs):
+    if _deleted_with_owner(origin):
+        return
+    if instance._was_passing is None:
+        _log_if_mastery_differs(instance, _has_other_passing_record(instance))
+    elif instance._was_passing and not _has_other_passing_record(instance):
+        UserMasteryChange.objects.create(
+            user_id=instance.user_id, exercise_id=instance.exercise_id, mastered=False
+        )
+
+
+@receiver(post_save, sender=UserExerciseRecord)
+def update_exercise_summary(sender, instance, created, **kwargs):
+    """
+    新增记录增量累加汇总；修改记录 (可能改了评分或所属动作) 时重算涉及的汇总行。
+    不知道加载时所属的动作 (该字段被延迟加载) 时，重算该用户已有的全部动作汇总行
+    """
+    if created:
+        record_added(instance)
+    else:
+        recompute_summaries(instance.user_id, instance.exercise_id)
+        if instance._loaded_exercise_id is None:
+            stale = UserExerciseSummary.objects.filter(
+                user_id=instance.user_id, exercise__isnull=False
+            ).exclude(exercise_id=instance.exercise_id).values_list('exercise_id', flat=True)
+            for exercise_id in list(stale):
+                recompute_summaries(instance.user_id, exercise_id)
+        elif instance._loaded_exercise_id != instance.exercise_id:
+            recompute_summaries(instance.user_id, instance._loaded_exercise_id)
+    instance._loaded_exercise_id = instance.exercise_id
+
+
+@receiver(post_delete, sender=UserExerciseRecord)
+def update_exercise_summary_on_delete(sender, instance, origin=None, **kwargs):
+    if not _deleted_with_owner(origin):
+        recompute_summaries(instance.user_id, instance.exercise_id)
@@ -0,0 +1,259 @@
+"""
+动作技能树 (前置关系 DAG) 的进程内索引
+
+前置关系在运行期几乎只读，但训练计划生成、解锁校验等逻辑会反复沿着
+prerequisites 逐跳查询数据库。这里把整张 DAG 一次性载入内存，按拓扑序
+预计算好各类查询结果，并通过缓存中的版本号在前置关系变化后自动重建。
+"""
+import time
+from collections import deque
+
+from django.core.cache import cache
+
+from .models import Exercise, UserExerciseRecord
+
+SKILL_TREE_VERSION_KEY = "exercises:skill_tree_version"
+
+# 用户等级范围 (与 Exercise.level 的 1:入门 ~ 5:大神 对齐)
+MIN_LEVEL = 1
+MAX_LEVEL = 5
+
+# 动作评分达到该分数即视为掌握
+MASTERY_PASS_SCORE = 80.0
+
+
+class SkillTree:
+    """前置关系 DAG 的只读快照"""
+
+    def __init__(self, exercises, edges, version=None):
+        # exercises 需按 Exercise.Meta.ordering 排好序，
+        # 这样同一动作的多个前置会保持与 prerequisites.first() 一致的优先级
+        self.version = version
+        self.exercises = {ex.id: ex for ex in exercises}
+        self._rank = {ex.id: i for i, ex in enumerate(exercises)}
+
+        self.prerequisites = {ex_id: [] for ex_id in self.exercises}
+        self.unlocks = {ex_id: [] for ex_id in self.exercises}
+        for ex_id, pre_id in edges:
+            if ex_id in self.exercises and pre_id in self.exercises and ex_id != pre_id:
+                self.prerequisites[ex_id].append(pre_id)
+                self.unlocks[pre_id].append(ex_id)
+        for ids in self.prerequisites.values():
+            ids.sort(key=self._rank.__getitem__)
+        for ids in self.unlocks.values():
+            ids.sort(key=self._rank.__getitem__)
+
+        self.topo_order, self.cyclic_ids = self._topological_sort()
+        self._safe_table = self._build_safe_table()
+
+        # 以拓扑序位置作为位下标，祖先/后代集合用 Python 大整数做位集
+        self._position = {ex_id: i for i, ex_id in enumerate(self.topo_order)}
+        self._bit = {ex_id: 1 << i for i, ex_id in enumerate(self.topo_order)}
+        self.prerequisite_bits = {
+            ex_id: self.mask_of(pres) for ex_id, pres in self.prerequisites.items()
+        }
+        self.ancestor_bits, self.descendant_bits = self._build_closure()
+
+    @classmethod
+    def from_db(cls, version=None):
+        exercises = list(Exercise.objects.all())
+        through = Exercise.prerequisites.through
+        edges = through.objects.values_list("from_exercise_id", "to_exercise_id")
+        return cls(exercises, edges, version=version)
+
+    def _topological_sort(self):
+        """Kahn 算法：前置动作总是排在它解锁的动作之前"""
+        indegree = {ex_id: len(pres) for ex_id, pres in self.prerequisites.items()}
+        queue = deque(ex_id for ex_id in self.exercises if indegree[ex_id] == 0)
+        order = []
+        while queue:
+            ex_id = queue.popleft()
+            order.append(ex_id)
+            for nxt in self.unlocks[ex_id]:
+                indegree[nxt] -= 1
+                if indegree[nxt] == 0:
+                    queue.append(nxt)
+
+        # 数据里若存在环 (例如 AI 生成的前置关系互相指向)，环上及其下游的动作
+        # 无法排序，单独记下来并追加到末尾，避免后续查询陷入死循环
+        cyclic_ids = [ex_id for ex_id in self.exercises if indegree[ex_id] > 0]
+        return order + cyclic_ids, set(cyclic_ids)
+
+    def _build_safe_table(self):
+        """
+        一次拓扑遍历算出 (动作, 用户等级) -> 最近的安全替代动作
+
+        每个单元记录 (替代动作 id, 跳数, 是否真正达标)。优先选择等级达标且
+        跳数最少的前置路径；若所有前置路径都找不到达标动作，则沿第一个前置
+        走到底，与原先递归降级的结果保持一致。
+        """
+        table = {}
+        levels = range(MIN_LEVEL, MAX_LEVEL + 1)
+        for ex_id in self.topo_order:
+            ex = self.exercises[ex_id]
+            pres = [] if ex_id in self.cyclic_ids else self.prerequisites[ex_id]
+            row = []
+            for level in levels:
+                if ex.level <= level or not pres:
+                    row.append((ex_id, 0, ex.level <= level))
+                    continue
+
+                best = None
+                for pre_id in pres:
+                    safe_id, hops, ok = table[pre_id][level - MIN_LEVEL]
+                    if ok and (best is None or hops + 1 < best[1]):
+                        best = (safe_id, hops + 1, True)
+                if best is None:
+                    safe_id, hops, _ = table[pres[0]][level - MIN_LEVEL]
+                    best = (safe_id, hops + 1, False)
+                row.append(best)
+            table[ex_id] = row
+        return table
+
+    def _build_closure(self):
+        """传递闭包：按拓扑序传播祖先位集，按逆拓扑序传播后代位集"""
+        ancestors, descendants = {}, {}
+        # 环上的动作无法按序传播，直接 BFS 求闭包
+        for ex_id in self.cyclic_ids:
+            ancestors[ex_id] = self._reachable_bits(ex_id, self.prerequisites)
+            descendants[ex_id] = self._reachable_bits(ex_id, self.unlocks)
+
+        for ex_id in self.topo_order:
+            if ex_id in self.cyclic_ids:
+                continue
+            bits = 0
+            for pre_id in self.prerequisites[ex_id]:
+                bits |= ancestors[pre_id] | self._bit[pre_id]
+            ancestors[ex_id] = bits
+
+        for ex_id in reversed(self.topo_order):
+            if ex_id in self.cyclic_ids:
+                continue
+            bits = 0
+            for nxt in self.unlocks[ex_id]:
+                bits |= descendants[nxt] | self._bit[nxt]
+            descendants[ex_id] = bits
+        return ancestors, descendants
+
+    def _reachable_bits(self, start_id, adjacency):
+        bits = 0
+        queue = deque(adjacency[start_id])
+        while queue:
+            ex_id = queue.popleft()
+            if bits & self._bit[ex_id]:
+                continue
+            bits |= self._bit[ex_id]
+            queue.extend(adjacency[ex_id])
+        return bits & ~self._bit[start_id]
+
+    def mask_of(self, exercise_ids):
+        """把动作 id 集合转换成位集，索引中不存在的 id 会被忽略"""
+        bits = 0
+        for ex_id in exercise_ids:
+            bits |= self._bit.get(ex_id, 0)
+        return bits
+
+    def ids_of(self, bits):
+        """把位集还原成按拓扑序排列的动作 id 列表"""
+        ids = []
+        while bits:
+            low = bits & -bits
+            ids.append(self.topo_order[low.bit_length() - 1])
+            bits ^= low
+        return ids
+
+    def is_ancestor(self, ancestor_id, exercise_id):
+        return bool(self.ancestor_bits.get(exercise_id, 0) & self._bit.get(ancestor_id, 0))
+
+    def is_unlocked(self, exercise_id, mastered_bits):
+        """直接前置是否已全部掌握 (与原先逐个 exists() 校验的语义一致)"""
+        return not (self.prerequisite_bits.get(exercise_id, 0) & ~mastered_bits)
+
+    def missing_direct_prerequisites(self, exercise_id, mastered_bits):
+        return self.ids_of(self.prerequisite_bits.get(exercise_id, 0) & ~mastered_bits)
+
+    def missing_prerequisites(self, exercise_id, mastered_bits):
+        """所有尚未掌握的 (多跳) 前置动作，按拓扑序返回"""
+        return self.ids_of(self.ancestor_bits.get(exercise_id, 0) & ~mastered_bits)
+
+    def unlock_path(self, exercise_id, mastered_bits):
+        """
+        从已掌握集合出发解锁目标动作的最短学习路径
+
+        解锁要求直接前置全部掌握，因此必须补练的动作是：从目标出发沿未掌握的
+        前置逆向展开、遇到已掌握动作即停止的那部分祖先。返回按阶段分层的结果，
+        同一阶段内的动作互不依赖，阶段数即最少需要经历的进阶轮次。
+        """
+        if exercise_id not in self._bit:
+            return []
+        if not (self.ancestor_bits[exercise_id] & ~mastered_bits):
+            return []
+
+        required = 0
+        queue = deque([exercise_id])
+        while queue:
+            ex_id = queue.popleft()
+            for pre_id in self.prerequisites[ex_id]:
+                bit = self._bit[pre_id]
+                if pre_id == exercise_id or bit & mastered_bits or bit & required:
+                    continue
+                required |= bit
+                queue.append(pre_id)
+        if not required:
+            return []
+
+        # 按依赖深度分层：某动作的阶段 = 其必需前置中的最大阶段 + 1
+        stage_of = {}
+        for ex_id in self.ids_of(required):
+            stage_of[ex_id] = 1 + max(
+                (stage_of[p] for p in self.prerequisites[ex_id] if p in stage_of),
+                default=-1,
+            )
+        stages = [[] for _ in range(max(stage_of.values()) + 1)]
+        for ex_id, stage in stage_of.items():
+            stages[stage].append(ex_id)
+        return stages
+
+    def safe_substitute(self, exercise_id, user_level):
+        """O(1) 查表：返回适合该等级的替代动作实例，未知动作返回 None"""
+        row = self._safe_table.get(exercise_id)
+        if row is None:
+            return None
+        level = min(max(int(user_level), MIN_LEVEL), MAX_LEVEL)
+        return self.exercises[row[level - MIN_LEVEL][0]]
+
+
+def get_mastered_ids(user, pass_score=MASTERY_PASS_SCORE):
+    """用户已达标 (掌握) 的动作 id 集合，一次查询"""
+    return set(UserExerciseRecord.objects.filter(
+        user=user, accuracy_score__gte=pass_score
+    ).values_list('exercise_id', flat=True).distinct())
+
+
+_skill_tree = None
+
+
+def get_skill_tree_version():
+    version = cache.get(SKILL_TREE_VERSION_KEY)
+    if version is None:
+        # 用时间戳做初始值，缓存被清空后也不会与旧进程持有的版本号撞车
+        cache.add(SKILL_TREE_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(SKILL_TREE_VERSION_KEY)
+    return version
+
+
+def bump_skill_tree_version():
+    """前置关系或动作等级变化后调用，令所有进程在下次访问时重建索引"""
+    try:
+        cache.incr(SKILL_TREE_VERSION_KEY)
+    except ValueError:
+        cache.set(SKILL_TREE_VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def get_skill_tree():
+    """获取当前版本的技能树索引，版本过期时从数据库重建"""
+    global _skill_tree
+    version = get_skill_tree_version()
+    if _skill_tree is None or _skill_tree.version != version:
+        _skill_tree = SkillTree.from_db(version=version)
+    return _skill_tree
@@ -0,0 +1,108 @@
+"""
+用户练习记录汇总 (UserExerciseSummary) 的维护
+
+新增记录时用一条条件 UPDATE 原地累加计数、时长、卡路里，并比较更新最佳/最近记录；
+汇总行不存在 (历史数据、首次练习) 或记录被修改、删除时，用一条聚合查询同时算出
+用户总汇总和该动作的汇总后写回。动作卡片的进度接口只需按 (用户, 动作) 读两行。
+"""
+from django.contrib.auth.models import User
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Exercise, UserExerciseRecord, UserExerciseSummary
+
+
+def _first_id(records, *ordering):
+    return Subquery(records.order_by(*ordering).values('id')[:1])
+
+
+def aggregate_summaries(user_id, exercise_id):
+    """
+    一条查询算出用户总汇总和该动作的汇总，返回 {None: {...}, exercise_id: {...}}。
+    最佳记录取评分最高者，同分取较新的一条
+    """
+    records = UserExerciseRecord.objects.filter(user=OuterRef('pk'))
+    in_exercise = Q(userexerciserecord__exercise_id=exercise_id)
+    row = User.objects.filter(pk=user_id).annotate(
+        all_count=Count('userexerciserecord'),
+        all_duration=Sum('userexerciserecord__duration'),
+        all_calories=Sum('userexerciserecord__calories_burned'),
+        all_best_id=_first_id(records, '-accuracy_score', '-created_at', '-id'),
+        all_latest_id=_first_id(records, '-created_at', '-id'),
+        one_count=Count('userexerciserecord', filter=in_exercise),
+        one_duration=Sum('userexerciserecord__duration', filter=in_exercise),
+        one_calories=Sum('userexerciserecord__calories_burned', filter=in_exercise),
+        one_best_id=_first_id(records.filter(exercise_id=exercise_id), '-accuracy_score', '-created_at', '-id'),
+        one_latest_id=_first_id(records.filter(exercise_id=exercise_id), '-created_at', '-id'),
+        all_best_score=Subquery(records.order_by('-accuracy_score').values('accuracy_score')[:1]),
+        one_best_score=Subquery(
+            records.filter(exercise_id=exercise_id).order_by('-accuracy_score').values('accuracy_score')[:1]
+        ),
+    ).values(
+        'all_count', 'all_duration', 'all_calories', 'all_best_id', 'all_latest_id', 'all_best_score',
+        'one_count', 'one_duration', 'one_calories', 'one_best_id', 'one_latest_id', 'one_best_score',
+    ).first() or {}
+
+    def scope(prefix):
+        return {
+            'record_count': row.get(f'{prefix}_count') or 0,
+            'total_duration': row.get(f'{prefix}_duration') or 0,
+            'total_calories': row.get(f'{prefix}_calories') or 0.0,
+            'best_accuracy_score': row.get(f'{prefix}_best_score') or 0.0,
+            'best_record_id': row.get(f'{prefix}_best_id'),
+            'latest_record_id': row.get(f'{prefix}_latest_id'),
+        }
+    return {None: scope('all'), exercise_id: scope('one')}
+
+
+def recompute_summaries(user_id, exercise_id):
+    """用聚合结果覆盖写入两行汇总，动作不存在时不写该动作的汇总行"""
+    for key, values in aggregate_summaries(user_id, exercise_id).items():
+        if key is not None and not values['record_count'] and not Exercise.objects.filter(pk=key).exists():
+            continue
+        UserExerciseSummary.objects.update_or_create(user_id=user_id, exercise_id=key, defaults=values)
+
+
+def record_added(record):
+    """新增一条练习记录后原地更新两行汇总，缺行时退回聚合重算"""
+    score = record.accuracy_score
+    missing = False
+    for exercise_id in (None, record.exercise_id):
+        updated = UserExerciseSummary.objects.filter(user_id=record.user_id, exercise_id=exercise_id).update(
+            record_count=F('record_count') + 1,
+            total_duration=F('total_duration') + record.duration,
+            total_calories=F('total_calories') + record.calories_burned,
+            # 同分时新记录胜出，与聚合时“同分取较新”一致
+            best_record=Case(
+                When(Q(best_accuracy_score__lte=score) | Q(best_record__isnull=True), then=Value(record.id)),
+                default=F('best_record'),
+                output_field=IntegerField(),
+            ),
+            best_accuracy_score=Greatest(F('best_accuracy_score'), Value(score), output_field=FloatField()),
+            latest_record=record,
+        )
+        missing = missing or not updated
+    if missing:
+        recompute_summaries(record.user_id, record.exercise_id)
+
+
+def _load(user_id, exercise_id):
+    return {
+        row.exercise_id: row
+        for row in UserExerciseSummary.objects.filter(user_id=user_id).filter(
+            Q(exercise__isnull=True) | Q(exercise_id=exercise_id)
+        ).select_related('best_record__exercise', 'latest_record')
+    }
+
+
+def get_summaries(user_id, exercise_id):
+    """
+    读取用户总汇总与该动作的汇总 (一次查询，带上最佳/最近记录)，缺行时聚合重算。
+    返回 (总汇总, 动作汇总)，动作不存在时动作汇总为空的未保存实例
+    """
+    rows = _load(user_id, exercise_id)
+    if None not in rows or exercise_id not in rows:
+        recompute_summaries(user_id, exercise_id)
+        rows = _load(user_id, exercise_id)
+    empty = UserExerciseSummary(user_id=user_id, exercise_id=exercise_id)
+    return rows[None], rows.get(exercise_id, empty)
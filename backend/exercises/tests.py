@@ -1,3 +1,760 @@
-from django.test import TestCase
+import io
+import json
+import re
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from exercises.graph_skeleton import NODE_GAP
+from exercises.models import Exercise, UserExerciseRecord, UserExerciseSummary, UserMasteryChange
+from exercises.hybrid_search import parse_query, reciprocal_rank_fusion, supported_where
+from exercises.search import _trigram_search, search_exercise_ids, use_trigram_index
+from exercises.summaries import aggregate_summaries
+from exercises.skill_tree import SkillTree, get_skill_tree
+from training.services import SmartRecommendationService
+
+
+class _DummyExercise:
+    def __init__(self, ex_id, level=1):
+        self.id = ex_id
+        self.level = level
+
+
+def _build_tree(levels, edges):
+    exercises = [_DummyExercise(ex_id, level) for ex_id, level in levels]
+    return SkillTree(exercises, edges)
+
+
+class SkillTreeSafeSubstituteTests(TestCase):
+    def test_returns_self_when_level_is_enough(self):
+        tree = _build_tree([(1, 1), (2, 3)], [(2, 1)])
+        self.assertEqual(tree.safe_substitute(2, 3).id, 2)
+
+    def test_walks_down_chain_to_first_safe_prerequisite(self):
+        # 1(Lv1) -> 2(Lv3) -> 3(Lv5)
+        tree = _build_tree([(1, 1), (2, 3), (3, 5)], [(2, 1), (3, 2)])
+        self.assertEqual(tree.safe_substitute(3, 1).id, 1)
+        self.assertEqual(tree.safe_substitute(3, 3).id, 2)
+        self.assertEqual(tree.safe_substitute(3, 4).id, 2)
+
+    def test_prefers_nearest_safe_prerequisite(self):
+        # 4(Lv5) 的第一个前置 2 需要再降一级，第二个前置 3 直接达标
+        tree = _build_tree(
+            [(1, 1), (2, 4), (3, 2), (4, 5)],
+            [(2, 1), (4, 2), (4, 3)],
+        )
+        self.assertEqual(tree.safe_substitute(4, 2).id, 3)
+
+    def test_root_without_prerequisites_is_kept(self):
+        tree = _build_tree([(1, 4)], [])
+        self.assertEqual(tree.safe_substitute(1, 1).id, 1)
+
+    def test_cycle_does_not_loop_forever(self):
+        tree = _build_tree([(1, 5), (2, 5)], [(1, 2), (2, 1)])
+        self.assertEqual(tree.safe_substitute(1, 1).id, 1)
+
+
+class SkillTreeClosureTests(TestCase):
+    def setUp(self):
+        # 1 -> 2 -> 4, 3 -> 4, 4 -> 5
+        self.tree = _build_tree(
+            [(1, 1), (2, 2), (3, 1), (4, 3), (5, 4)],
+            [(2, 1), (4, 2), (4, 3), (5, 4)],
+        )
+
+    def test_ancestors_are_transitive(self):
+        self.assertTrue(self.tree.is_ancestor(1, 5))
+        self.assertFalse(self.tree.is_ancestor(5, 1))
+        self.assertEqual(self.tree.ids_of(self.tree.descendant_bits[1]), [2, 4, 5])
+
+    def test_missing_prerequisites_skips_mastered(self):
+        mastered = self.tree.mask_of([1, 3])
+        self.assertEqual(self.tree.missing_prerequisites(5, mastered), [2, 4])
+        self.assertFalse(self.tree.is_unlocked(5, mastered))
+        self.assertTrue(self.tree.is_unlocked(2, mastered))
+
+    def test_unlock_path_is_staged_by_dependency_depth(self):
+        stages = self.tree.unlock_path(5, self.tree.mask_of([]))
+        self.assertEqual(stages, [[1, 3], [2], [4]])
+
+    def test_unlock_path_stops_at_mastered_exercise(self):
+        # 已掌握 2，则无需再回头练 1
+        stages = self.tree.unlock_path(5, self.tree.mask_of([2, 3]))
+        self.assertEqual(stages, [[4]])
+
+
+class SafeExerciseServiceTests(TestCase):
+    def setUp(self):
+        self.basic = Exercise.objects.create(
+            name="跪姿俯卧撑", description="描述", target_muscle="chest",
+            instructions="要领", level=1,
+        )
+        self.advanced = Exercise.objects.create(
+            name="单臂俯卧撑", description="描述", target_muscle="chest",
+            instructions="要领", level=5,
+        )
+        self.advanced.prerequisites.add(self.basic)
+
+    def test_prerequisite_change_rebuilds_index(self):
+        tree = get_skill_tree()
+        self.assertEqual(tree.safe_substitute(self.advanced.id, 1).id, self.basic.id)
+
+        self.advanced.prerequisites.clear()
+        self.assertIsNot(get_skill_tree(), tree)
+        self.assertEqual(get_skill_tree().safe_substitute(self.advanced.id, 1).id, self.advanced.id)
+
+    def test_downgrade_uses_no_queries_once_index_is_built(self):
+        skill_tree = get_skill_tree()
+        with self.assertNumQueries(0):
+            safe = SmartRecommendationService.get_safe_exercise(self.advanced, 1, skill_tree)
+        self.assertEqual(safe.id, self.basic.id)
+
+
+class UnlockPathAPITests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="path_tester", password="pwd123456")
+        self.client.force_authenticate(user=self.user)
+
+        def make(name, level):
+            return Exercise.objects.create(
+                name=name, description="描述", target_muscle="legs",
+                instructions="要领", level=level,
+            )
+
+        self.squat = make("徒手深蹲", 1)
+        self.split = make("分腿蹲", 2)
+        self.pistol = make("单腿深蹲", 5)
+        self.split.prerequisites.add(self.squat)
+        self.pistol.prerequisites.add(self.split)
+
+    def test_returns_missing_chain_for_new_user(self):
+        response = self.client.get(f"/api/exercises/{self.pistol.id}/unlock-path/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data["is_unlocked"])
+        self.assertEqual([e["id"] for e in response.data["path"]], [self.squat.id, self.split.id])
+        self.assertEqual(response.data["steps"], 2)
+
+    def test_mastered_prerequisites_shorten_path(self):
+        UserExerciseRecord.objects.create(user=self.user, exercise=self.squat, accuracy_score=90)
+        response = self.client.get(f"/api/exercises/{self.pistol.id}/unlock-path/")
+        self.assertEqual([e["id"] for e in response.data["path"]], [self.split.id])
+
+    def test_unknown_exercise_returns_404(self):
+        response = self.client.get("/api/exercises/999999/unlock-path/")
+        self.assertEqual(response.status_code, 404)
+
+
+class ExerciseListProgressOverlayTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="overlay_tester", password="pwd123456")
+        self.client.force_authenticate(user=self.user)
+        self.exercises = [
+            Exercise.objects.create(
+                name=f"动作{i}", description="描述", target_muscle="legs", instructions="要领", level=1,
+            )
+            for i in range(6)
+        ]
+        for prev, ex in zip(self.exercises, self.exercises[1:]):
+            ex.prerequisites.add(prev)
+        first = self.exercises[0]
+        UserExerciseRecord.objects.create(user=self.user, exercise=first, accuracy_score=92, count=10)
+        UserExerciseRecord.objects.create(user=self.user, exercise=first, accuracy_score=75, count=12)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        # 目录缓存未命中时的查询数
+        self.client.get("/api/exercises/?page_size=2")
+        cache.clear()
+        with CaptureQueriesContext(connection) as small:
+            self.client.get("/api/exercises/?page_size=2")
+        cache.clear()
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get("/api/exercises/?page_size=6")
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(response.data["results"]), 6)
+
+    def test_overlay_matches_user_records(self):
+        first, second = self.exercises[0], self.exercises[1]
+        response = self.client.get(f"/api/exercises/{first.id}/")
+        self.assertEqual(response.data["user_best_score"], 92)
+        self.assertEqual(response.data["user_last_record"]["count"], 12)
+        self.assertEqual(response.data["unlocks"], [{"id": second.id, "name": second.name}])
+
+        results = {row["id"]: row for row in self.client.get("/api/exercises/?page_size=6").data["results"]}
+        self.assertIsNone(results[second.id]["user_last_record"])
+        self.assertEqual(results[second.id]["prerequisite_list"], [{"id": first.id, "name": first.name}])
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="catalog_tester", password="pwd123456")
+        self.client.force_authenticate(user=self.user)
+        self.exercise = Exercise.objects.create(
+            name="平板支撑", description="描述", target_muscle="abs", instructions="要领", level=1,
+        )
+
+    def test_conditional_get_returns_304_until_catalog_changes(self):
+        first = self.client.get("/api/exercises/")
+        etag = first["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get("/api/exercises/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertFalse(any("exercises_exercise" in q["sql"] for q in queries.captured_queries))
+
+        self.exercise.description = "新的描述"
+        self.exercise.save()
+        changed = self.client.get("/api/exercises/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertEqual(changed.data["results"][0]["description"], "新的描述")
+
+    def test_cached_static_payload_gets_fresh_user_overlay(self):
+        self.client.get(f"/api/exercises/{self.exercise.id}/")
+        UserExerciseRecord.objects.create(user=self.user, exercise=self.exercise, accuracy_score=88)
+        response = self.client.get(f"/api/exercises/{self.exercise.id}/")
+        self.assertEqual(response.data["user_best_score"], 88)
+
+        other = User.objects.create_user(username="catalog_other", password="pwd123456")
+        self.client.force_authenticate(user=other)
+        self.assertIsNone(self.client.get(f"/api/exercises/{self.exercise.id}/").data["user_best_score"])
+
+
+class GraphSkeletonTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="graph_tester", password="pwd123456")
+        self.client.force_authenticate(user=self.user)
+
+        def make(name, level):
+            return Exercise.objects.create(
+                name=name, description="描述", target_muscle="legs", instructions="要领", level=level,
+            )
+
+        self.base = make("臀桥", 1)
+        self.mid = make("箭步蹲", 2)
+        self.top = make("跳跃箭步蹲", 3)
+        self.mid.prerequisites.add(self.base)
+        self.top.prerequisites.add(self.mid)
+
+    def _nodes(self, response):
+        return {int(node["id"]): node for node in response.data["nodes"]}
+
+    def test_importance_is_deterministic_reach_centrality(self):
+        first = self._nodes(self.client.get("/api/exercises/graph/"))
+        cache.clear()
+        second = self._nodes(self.client.get("/api/exercises/graph/"))
+        self.assertEqual(first, second)
+        self.assertEqual(first[self.base.id]["value"], 3.0)
+        self.assertEqual(first[self.top.id]["value"], 0.0)
+
+    def test_user_status_is_merged_per_request(self):
+        self.client.get("/api/exercises/graph/")
+        UserExerciseRecord.objects.create(user=self.user, exercise=self.base, accuracy_score=90)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/exercises/graph/")
+        # 骨架命中缓存，只查询用户已掌握的动作
+        self.assertFalse(any("exercises_exercisegraph" in q["sql"] for q in queries.captured_queries))
+        nodes = self._nodes(response)
+        self.assertEqual(
+            [nodes[ex.id]["status"] for ex in (self.base, self.mid, self.top)], ["mastered", "ready", "locked"]
+        )
+        self.assertEqual(response.data["stats"]["mastered"], 1)
+
+    def test_layout_is_layered_and_stable(self):
+        chest = Exercise.objects.create(
+            name="俯卧撑", description="描述", target_muscle="chest", instructions="要领", level=1,
+        )
+        first = self._nodes(self.client.get("/api/exercises/graph/"))
+        cache.clear()
+        second = self._nodes(self.client.get("/api/exercises/graph/"))
+        positions = {ex_id: (node["x"], node["y"]) for ex_id, node in first.items()}
+        self.assertEqual(positions, {ex_id: (node["x"], node["y"]) for ex_id, node in second.items()})
+        # 前置动作在左，同层的不同部位动作不重叠
+        self.assertLess(positions[self.base.id][0], positions[self.mid.id][0])
+        self.assertLess(positions[self.mid.id][0], positions[self.top.id][0])
+        self.assertEqual(positions[chest.id][0], positions[self.base.id][0])
+        self.assertGreaterEqual(abs(positions[chest.id][1] - positions[self.base.id][1]), NODE_GAP)
+
+    def test_subgraphs_are_bounded(self):
+        UserExerciseRecord.objects.create(user=self.user, exercise=self.base, accuracy_score=90)
+        frontier = self.client.get("/api/exercises/graph/frontier/")
+        nodes = self._nodes(frontier)
+        # 前沿是可开始的箭步蹲，加上作为上下文的已掌握前置
+        self.assertEqual(set(nodes), {self.base.id, self.mid.id})
+        self.assertEqual(nodes[self.mid.id]["status"], "ready")
+        self.assertEqual(nodes[self.mid.id]["hidden_links"], 1)
+        self.assertEqual(len(frontier.data["links"]), 1)
+        self.assertEqual(frontier.data["stats"]["total"], 3)
+
+        around = self.client.get(f"/api/exercises/graph/{self.base.id}/neighborhood/", {"hops": 1})
+        self.assertEqual(set(self._nodes(around)), {self.base.id, self.mid.id})
+        limited = self.client.get(f"/api/exercises/graph/{self.base.id}/neighborhood/", {"hops": 3, "limit": 2})
+        self.assertEqual(len(limited.data["nodes"]), 2)
+        self.assertTrue(limited.data["truncated"])
+
+        page = self.client.get("/api/exercises/graph/muscle/legs/", {"limit": 2})
+        self.assertEqual([int(n["id"]) for n in page.data["nodes"]], [self.base.id, self.mid.id])
+        self.assertEqual(page.data["count"], 3)
+        self.assertTrue(page.data["truncated"])
+        self.assertEqual(self.client.get("/api/exercises/graph/muscle/tail/").status_code, 404)
+        self.assertEqual(self.client.get("/api/exercises/graph/99999/neighborhood/").status_code, 404)
+
+
+class GraphDiffTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="diff_tester", password="pwd123456")
+        self.client.force_authenticate(user=self.user)
+
+        def make(name, level):
+            return Exercise.objects.create(
+                name=name, description="描述", target_muscle="back", instructions="要领", level=level,
+            )
+
+        self.base = make("弹力带划船", 1)
+        self.mid = make("反手引体", 2)
+        self.top = make("引体向上", 3)
+        self.mid.prerequisites.add(self.base)
+        self.top.prerequisites.add(self.mid)
+
+    def _diff(self, graph):
+        return self.client.get(
+            "/api/exercises/graph/diff/", {"version": graph["version"], "mastery_version": graph["mastery_version"]}
+        ).data
+
+    def test_mastery_log_records_transitions_only(self):
+        first = UserExerciseRecord.objects.create(user=self.user, exercise=self.base, accuracy_score=85)
+        UserExerciseRecord.objects.create(user=self.user, exercise=self.base, accuracy_score=95)
+        UserExerciseRecord.objects.create(user=self.user, exercise=self.base, accuracy_score=40)
+        self.assertEqual(list(UserMasteryChange.objects.values_list("mastered", flat=True)), [True])
+        first.delete()
+        self.assertEqual(UserMasteryChange.objects.count(), 1)
+        UserExerciseRecord.objects.filter(accuracy_score=95).get().delete()
+        self.assertEqual(list(UserMasteryChange.objects.values_list("mastered", flat=True)), [True, False])
+
+    def test_diff_returns_only_changed_statuses(self):
+        graph = self.client.get("/api/exercises/graph/").data
+        unchanged = self._diff(graph)
+        self.assertFalse(unchanged["reset"])
+        self.assertEqual(unchanged["nodes"], [])
+
+        UserExerciseRecord.objects.create(user=self.user, exercise=self.base, accuracy_score=90)
+        diff = self._diff(graph)
+        statuses = {int(node["id"]): node["status"] for node in diff["nodes"]}
+        self.assertEqual(statuses, {self.base.id: "mastered", self.mid.id: "ready"})
+        self.assertEqual(len(diff["links"]), 1)
+        self.assertGreater(diff["mastery_version"], graph["mastery_version"])
+
+    def test_structural_edit_is_reported(self):
+        graph = self.client.get("/api/exercises/graph/").data
+        self.top.prerequisites.remove(self.mid)
+        diff = self._diff(graph)
+        self.assertFalse(diff["reset"])
+        self.assertEqual(diff["removed_links"], [[str(self.mid.id), str(self.top.id)]])
+        self.assertIn(self.top.id, {int(node["id"]) for node in diff["nodes"]})
+
+        # 旧版本的结构摘要不存在时要求客户端全量重新加载
+        response = self.client.get("/api/exercises/graph/diff/", {"version": 1, "mastery_version": 0})
+        self.assertTrue(response.data["reset"])
+
+
+class ExerciseSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="search_tester", password="pwd123456")
+        self.client.force_authenticate(user=self.user)
+
+        def make(name, english_name, description, muscle="chest"):
+            return Exercise.objects.create(
+                name=name, english_name=english_name, description=description,
+                target_muscle=muscle, instructions="要领", level=1,
+            )
+
+        self.pushup = make("标准俯卧撑", "Push-up", "经典的自重胸部训练，俯卧撑过程中保持核心收紧")
+        self.knee = make("跪姿俯卧撑", "Knee Push-up", "俯卧撑的简化版本，适合入门")
+        self.plank = make("平板支撑", "Plank", "核心训练，双肘支撑身体", muscle="abs")
+
+    def test_ngram_index_ranks_name_matches(self):
+        self.assertEqual([ex_id for ex_id, _ in search_exercise_ids("标准俯卧撑")], [self.pushup.id])
+        ranked = [ex_id for ex_id, _ in search_exercise_ids("俯卧撑")]
+        self.assertEqual(ranked[:2], [self.pushup.id, self.knee.id])
+        # 只沾到一个“撑”字的平板支撑达不到命中比例
+        self.assertNotIn(self.plank.id, ranked)
+        self.assertEqual([ex_id for ex_id, _ in search_exercise_ids("plank")], [self.plank.id])
+        self.assertEqual(search_exercise_ids("push")[0][0], self.pushup.id)
+        # 不足 3 个字的词没有三元组，PostgreSQL 下也走 n-gram 索引
+        self.assertTrue(use_trigram_index("俯卧撑 plank"))
+        self.assertFalse(use_trigram_index("深蹲"))
+        self.assertFalse(use_trigram_index("push 胸"))
+
+    @skipUnless(connection.vendor == "postgresql", "pg_trgm 索引只在 PostgreSQL 上存在")
+    def test_trigram_search_uses_upper_expression_index(self):
+        ranked = [ex_id for ex_id, _ in _trigram_search("俯卧撑", Exercise.objects.filter(is_active=True), 10)]
+        self.assertEqual(set(ranked), {self.pushup.id, self.knee.id})
+        self.assertEqual([ex_id for ex_id, _ in search_exercise_ids("plank")], [self.plank.id])
+
+        queryset = Exercise.objects.filter(name__icontains="俯卧撑")
+        with connection.cursor() as cursor:
+            # 测试库数据量很小，关掉顺序扫描确认 icontains 能命中表达式索引
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(f"EXPLAIN {sql}", params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+        self.assertIn("exercise_name_upper_trgm_idx", plan)
+
+    def test_index_follows_catalog_changes(self):
+        self.assertEqual(search_exercise_ids("钻石俯卧撑"), [])
+        self.knee.name = "钻石俯卧撑"
+        self.knee.save()
+        self.assertEqual(search_exercise_ids("钻石俯卧撑")[0][0], self.knee.id)
+
+    def test_search_endpoint_highlights_matches(self):
+        response = self.client.get("/api/exercises/search/", {"q": "俯卧撑"})
+        first = response.data["results"][0]
+        self.assertEqual(first["id"], self.pushup.id)
+        self.assertEqual(first["highlight"]["name"], "标准<mark>俯卧撑</mark>")
+        self.assertIn("<mark>俯卧撑</mark>", first["highlight"]["description"])
+        self.assertEqual(self.client.get("/api/exercises/search/").status_code, 400)
+
+    def test_list_search_uses_index_and_filters(self):
+        response = self.client.get("/api/exercises/", {"search": "俯卧撑 入门"})
+        self.assertEqual([row["id"] for row in response.data["results"]], [self.knee.id, self.pushup.id])
+        response = self.client.get("/api/exercises/", {"search": "核心", "target_muscle": "abs"})
+        self.assertEqual([row["id"] for row in response.data["results"]], [self.plank.id])
+
+
+class HybridSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="hybrid_tester", password="pwd123456")
+        self.client.force_authenticate(user=self.user)
+
+        def make(name, muscle, equipment, level, description="描述"):
+            return Exercise.objects.create(
+                name=name, description=description, target_muscle=muscle, equipment=equipment,
+                instructions="要领", level=level,
+            )
+
+        self.pushup = make("俯卧撑", "chest", "none", 1, "自重胸部训练")
+        self.dips = make("双杠臂屈伸", "chest", "none", 3)
+        self.press = make("哑铃卧推", "chest", "dumbbell", 2, "胸部训练")
+        self.squat = make("徒手深蹲", "legs", "none", 1)
+
+    def test_parse_colloquial_query(self):
+        self.assertEqual(parse_query("练胸不用器械"), ({"equipment": "none", "target_muscle": "chest"}, ""))
+        self.assertEqual(parse_query("新手哑铃卧推"), ({"equipment": "dumbbell", "max_level": 2}, "卧推"))
+
+    def test_rrf_rewards_agreement(self):
+        fused = reciprocal_rank_fusion({"lexical": [1, 2, 3], "semantic": [2, 4]})
+        self.assertEqual([ex_id for ex_id, _, _ in fused], [2, 1, 4, 3])
+        self.assertEqual(fused[0][2], {"lexical": 2, "semantic": 1})
+
+    def test_filters_apply_before_fusion_and_results_are_cached(self):
+        with patch("exercises.hybrid_search.semantic_search", return_value=[self.press.id, self.dips.id]) as semantic:
+            data = self.client.get("/api/exercises/search/hybrid/", {"q": "练胸不用器械"}).data
+            self.client.get("/api/exercises/search/hybrid/", {"q": " 练胸不用器械 "})
+        # 哑铃卧推不满足“无器械”，即使语义检索返回了也会被过滤
+        self.assertEqual([row["id"] for row in data["results"]], [self.dips.id])
+        self.assertEqual(semantic.call_args.args[1], {"$and": [{"target_muscle": "chest"}, {"equipment": "none"}]})
+        self.assertEqual(semantic.call_count, 1)
+
+    def test_lexical_only_when_semantic_fails(self):
+        with patch("exercises.hybrid_search.semantic_search", side_effect=RuntimeError("no model")), \
+                self.assertLogs("exercises.hybrid_search", level="WARNING"):
+            data = self.client.get("/api/exercises/search/hybrid/", {"q": "卧推", "equipment": "dumbbell"}).data
+        self.assertFalse(data["sources"]["semantic"])
+        self.assertEqual([row["id"] for row in data["results"]], [self.press.id])
+        self.assertEqual(data["results"][0]["lexical_rank"], 1)
+
+    def test_old_index_without_equipment_metadata_filters_after_search(self):
+        where = {"$and": [{"target_muscle": "chest"}, {"equipment": "none"}, {"level": {"$lte": 2}}]}
+        self.assertEqual(supported_where(where, {"target_muscle", "level"}),
+                         {"$and": [{"target_muscle": "chest"}, {"level": {"$lte": 2}}]})
+        self.assertEqual(supported_where(where, {"target_muscle"}), {"target_muscle": "chest"})
+        self.assertIsNone(supported_where(where, set()))
+
+        # 早期建立的索引只有 name / target_muscle / muscle_cn 元数据
+        with patch("utils.vector_db.VectorDB") as db:
+            db.return_value.metadata_fields.return_value = frozenset({"name", "target_muscle", "muscle_cn"})
+            db.return_value.search.return_value = [str(self.press.id), str(self.dips.id), str(self.pushup.id)]
+            with self.assertLogs("exercises.hybrid_search", level="WARNING") as logs:
+                data = self.client.get("/api/exercises/search/hybrid/", {"q": "练胸不用器械"}).data
+        self.assertIn("['equipment']", logs.output[0])
+        self.assertNotIn("练胸", logs.output[0])
+        _, kwargs = db.return_value.search.call_args
+        self.assertEqual(kwargs["where"], {"target_muscle": "chest"})
+        self.assertGreater(kwargs["top_k"], 50)
+        self.assertTrue(data["sources"]["semantic"])
+        self.assertEqual([row["id"] for row in data["results"]], [self.dips.id, self.pushup.id])
+
+    def test_vector_db_singleton_is_created_once_across_threads(self):
+        from utils.vector_db import VectorDB
+
+        created = []
+
+        def slow_create(cls):
+            created.append(threading.current_thread().name)
+            threading.Event().wait(0.05)
+            return object.__new__(cls)
+
+        previous = VectorDB._instance
+        VectorDB._instance = None
+        self.addCleanup(setattr, VectorDB, "_instance", previous)
+        instances = []
+        with patch.object(VectorDB, "_create", classmethod(slow_create)):
+            threads = [threading.Thread(target=lambda: instances.append(VectorDB())) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(created), 1)
+        self.assertEqual(len({id(instance) for instance in instances}), 1)
+
+
+class ExerciseSummaryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="summary_tester", password="pwd123456")
+        self.client.force_authenticate(user=self.user)
+
+        def make(name):
+            return Exercise.objects.create(
+                name=name, description="描述", target_muscle="legs", instructions="要领", level=1,
+            )
+
+        self.squat = make("深蹲")
+        self.lunge = make("弓步蹲")
+
+    def _record(self, exercise, score, duration=60, calories=5.0):
+        return UserExerciseRecord.objects.create(
+            user=self.user, exercise=exercise, accuracy_score=score, duration=duration, calories_burned=calories,
+        )
+
+    def _summary(self, exercise=None):
+        return UserExerciseSummary.objects.get(user=self.user, exercise=exercise)
+
+    def test_summaries_follow_inserts_updates_and_deletes(self):
+        first = self._record(self.squat, 70)
+        self._record(self.squat, 90, duration=30)
+        best = self._record(self.lunge, 95, calories=2.5)
+        totals = self._summary()
+        self.assertEqual((totals.record_count, totals.total_duration, totals.total_calories), (3, 150, 12.5))
+        self.assertEqual(totals.best_record_id, best.id)
+        self.assertEqual(self._summary(self.squat).best_accuracy_score, 90)
+
+        best.delete()
+        self.assertEqual(self._summary().best_accuracy_score, 90)
+        first.accuracy_score = 99
+        first.save()
+        self.assertEqual(self._summary(self.squat).best_record_id, first.id)
+        # 增量结果与聚合重算一致
+        self.assertEqual(aggregate_summaries(self.user.id, self.squat.id)[self.squat.id]["record_count"], 2)
+
+    def test_progress_endpoint_reads_summary_rows(self):
+        self._record(self.squat, 80)
+        latest = self._record(self.squat, 60)
+        self._record(self.lunge, 88)
+        UserExerciseSummary.objects.all().delete()
+        # 缺行时聚合重算一次，之后只读汇总行
+        self.client.get(f"/api/exercises/progress/{self.squat.id}/")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/api/exercises/progress/{self.squat.id}/")
+        # 用户资料 + 两行汇总 (连同最佳/最近记录)
+        self.assertEqual(len(queries.captured_queries), 2)
+        self.assertEqual(response.data["total_exercises"], 3)
+        self.assertEqual(response.data["best_accuracy_score"], 88)
+        self.assertEqual(response.data["best_exercise"], "弓步蹲")
+        self.assertEqual(response.data["latest_record"]["accuracy_score"], latest.accuracy_score)
+        self.assertEqual(response.data["exercise_stats"]["total_exercises"], 2)
+        self.assertIsNone(self.client.get("/api/exercises/progress/99999/").data["latest_record"])
+
+    def test_deferred_field_loads_do_not_recurse_and_recompute_on_save(self):
+        record = self._record(self.squat, 70)
+        self.assertEqual([r.id for r in UserExerciseRecord.objects.only("id")], [record.id])
+        self.assertEqual([r.id for r in UserExerciseRecord.objects.defer("accuracy_score")], [record.id])
+        record.refresh_from_db(fields=["accuracy_score"])
+
+        # 加载时评分和所属动作都未知：掌握状态按日志补记，汇总行全部重算
+        partial = UserExerciseRecord.objects.only("id").get()
+        self.assertIsNone(partial._was_passing)
+        partial.accuracy_score = 95
+        partial.exercise = self.lunge
+        partial.save()
+        self.assertEqual(
+            list(UserMasteryChange.objects.values_list("exercise_id", "mastered")), [(self.lunge.id, True)]
+        )
+        self.assertEqual(self._summary(self.squat).record_count, 0)
+        self.assertEqual(self._summary(self.lunge).best_accuracy_score, 95)
+
+        UserExerciseRecord.objects.defer("accuracy_score").get().delete()
+        self.assertEqual(
+            list(UserMasteryChange.objects.values_list("mastered", flat=True)), [True, False]
+        )
+
+
+def _animated_gif(size=(600, 400), frames=3):
+    images = [Image.new("RGB", size, (80 * i, 120, 200)) for i in range(frames)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, "GIF", save_all=True, append_images=images[1:], duration=120, loop=0)
+    return buffer.getvalue()
+
+
+class DemoDerivativeTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_DERIVATIVES_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _exercise(self, name, content, filename="demo.gif", before_derivatives=None):
+        with self.captureOnCommitCallbacks() as callbacks:
+            exercise = Exercise.objects.create(
+                name=name, description="描述", target_muscle="legs", instructions="要领", level=1,
+                demo_gif=SimpleUploadedFile(filename, content),
+            )
+        if before_derivatives:
+            before_derivatives(exercise)
+        for callback in callbacks:
+            callback()
+        exercise.refresh_from_db()
+        return exercise
+
+    def test_animated_webp_and_posters_use_content_hash(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username="demo_tester", password="pwd123456"))
+        cached = []
+        content = _animated_gif()
+        squat = self._exercise(
+            "深蹲", content,
+            before_derivatives=lambda ex: cached.append(client.get(f"/api/exercises/{ex.id}/").data["demo_variants"]),
+        )
+        self.assertEqual(cached, [{}])
+        files = squat.demo_variants["files"]
+        self.assertEqual(set(files), {"animated", "poster_240", "poster_480"})
+
+        with default_storage.open(files["animated"]) as handle, Image.open(handle) as animated:
+            self.assertEqual(animated.format, "WEBP")
+            self.assertEqual(animated.n_frames, 3)
+            self.assertEqual(animated.size, (480, 320))
+        with default_storage.open(files["poster_240"]) as handle, Image.open(handle) as poster:
+            self.assertEqual(poster.size, (240, 160))
+
+        # 相同内容 (即使源文件名不同) 复用同一组派生文件
+        lunge = self._exercise("弓步蹲", content, filename="other.gif")
+        self.assertEqual(lunge.demo_variants["files"], files)
+
+        # 派生图写回后目录缓存失效，详情带上派生地址
+        response = client.get(f"/api/exercises/{squat.id}/")
+        self.assertTrue(response.data["demo_variants"]["animated"].endswith(files["animated"]))
+
+    def test_oversized_image_is_logged_not_raised(self):
+        with patch.object(Image, "MAX_IMAGE_PIXELS", 1000):
+            bomb = self._exercise("波比跳", _animated_gif())
+        self.assertEqual(bomb.demo_variants, {"source": bomb.demo_gif.name, "files": {}})
+
+    def test_backfill_command_generates_missing_derivatives(self):
+        existing = self._exercise("箭步蹲", _animated_gif())
+        # 模拟上线前已有的演示：没有派生记录
+        Exercise.objects.filter(pk=existing.pk).update(demo_variants={})
+        call_command("backfill_media_derivatives", "--model", "exercise", stdout=io.StringIO())
+        existing.refresh_from_db()
+        self.assertEqual(set(existing.demo_variants["files"]), {"animated", "poster_240", "poster_480"})
+
+    def test_video_demo_is_recorded_without_derivatives(self):
+        clip = self._exercise("平板支撑", b"\x00\x00\x00\x18ftypmp42", filename="demo.mp4")
+        self.assertEqual(clip.demo_variants, {"source": clip.demo_gif.name, "files": {}})
+
+
+class _StubChatHandler(BaseHTTPRequestHandler):
+    """本地 OpenAI 兼容接口：按提示词里的动作 ID / 名称构造回复"""
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.prompts.append(payload)
+        prompt = payload["messages"][-1]["content"]
+        if "动作ID" in prompt:
+            ids = [int(ex_id) for ex_id in re.findall(r"动作ID：(\d+)", prompt)]
+            content = {"results": [{"id": ex_id, "tags": ["标签", f"动作{ex_id}"]} for ex_id in ids]}
+        else:
+            names = re.findall(r"- (\S+) \(难度等级", prompt)
+            content = {"relationships": [
+                {"exercise": names[-1], "prerequisites": names[:-1] + ["不存在的动作"]},
+            ]}
+        body = json.dumps({"choices": [{"message": {"content": json.dumps(content, ensure_ascii=False)}}]})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+
+    def log_message(self, *args):
+        pass
+
+
+class LLMBatchCommandTests(TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubChatHandler)
+        self.server.prompts = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        env = patch.dict("os.environ", {"DEEPSEEK_API_KEY": "test-key"})
+        env.start()
+        self.addCleanup(env.stop)
+
+        def make(name, muscle, level):
+            return Exercise.objects.create(
+                name=name, description="描述", target_muscle=muscle, instructions="要领", level=level,
+            )
+
+        self.knee = make("跪姿俯卧撑", "chest", 1)
+        self.push = make("标准俯卧撑", "chest", 2)
+        self.squat = make("深蹲", "legs", 1)
+        self.lunge = make("弓步蹲", "legs", 2)
+        self.jump = make("跳跃深蹲", "legs", 3)
+
+    def _call(self, name, *args):
+        call_command(
+            name, *args, "--base-url", f"http://127.0.0.1:{self.server.server_port}",
+            "--cache-dir", self.cache_dir, "--rate", "0", stdout=io.StringIO(),
+        )
+
+    def test_generate_tags_batches_requests_and_caches_responses(self):
+        self._call("generate_tags", "--batch-size", "2")
+        self.assertEqual(len(self.server.prompts), 3)
+        self.assertEqual(Exercise.objects.get(pk=self.lunge.pk).tags, ["标签", f"动作{self.lunge.id}"])
+
+        # 重跑时相同的提示词直接读磁盘缓存
+        Exercise.objects.update(tags=[])
+        self._call("generate_tags", "--batch-size", "2")
+        self.assertEqual(len(self.server.prompts), 3)
+        self.assertEqual(Exercise.objects.get(pk=self.knee.pk).tags, ["标签", f"动作{self.knee.id}"])
+
+    def test_generate_progression_links_within_muscle_group(self):
+        self._call("generate_progression", "--concurrency", "2")
+        self.assertEqual(len(self.server.prompts), 2)
+        self.assertEqual(list(self.push.prerequisites.all()), [self.knee])
+        self.assertEqual(set(self.jump.prerequisites.all()), {self.squat, self.lunge})
@@ -4,8 +4,15 @@ from . import views
 urlpatterns = [
     path('categories/', views.ExerciseCategoryList.as_view(), name='exercise-categories'),
     path('', views.ExerciseList.as_view(), name='exercises'),
+    path('search/', views.exercise_search, name='exercise-search'),
+    path('search/hybrid/', views.exercise_hybrid_search, name='exercise-hybrid-search'),
     path('graph/', views.exercise_graph_data, name='exercise-graph'),
+    path('graph/diff/', views.exercise_graph_diff, name='exercise-graph-diff'),
+    path('graph/frontier/', views.exercise_graph_frontier, name='exercise-graph-frontier'),
+    path('graph/muscle/<str:muscle>/', views.exercise_graph_muscle, name='exercise-graph-muscle'),
+    path('graph/<int:id>/neighborhood/', views.exercise_graph_neighborhood, name='exercise-graph-neighborhood'),
     path('<int:id>/', views.ExerciseDetail.as_view(), name='exercise-detail'),
+    path('<int:id>/unlock-path/', views.exercise_unlock_path, name='exercise-unlock-path'),
     path('records/', views.UserExerciseRecords.as_view(), name='user-exercise-records'),
     path('records/<int:exercise_id>/', views.ExerciseRecordsByExercise.as_view(), name='exercise-records'),
     path('record-performance/', views.record_exercise_performance, name='record-exercise-performance'),
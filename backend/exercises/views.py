@@ -5,10 +5,10 @@ from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum
+from django.db.models import Count, OuterRef, Prefetch, Q, Subquery
 from django.utils import timezone
 
-from .models import ExerciseCategory, Exercise, UserExerciseRecord, ExerciseGraph
+from .models import ExerciseCategory, Exercise, UserExerciseRecord
 from .serializers import (
     ExerciseCategorySerializer, 
     ExerciseSerializer, 
@@ -17,41 +17,119 @@ from .serializers import (
     ExerciseWithUserProgressSerializer
 )
 from users.models import UserProfile
+from .catalog_cache import CachedCatalogMixin
+from .search import SNIPPET_LENGTH, IndexedSearchFilter, highlight, order_by_ids, search_exercise_ids
+from .hybrid_search import hybrid_search
+from .summaries import get_summaries
 
 class StandardResultsSetPagination(pagination.PageNumberPagination):
     page_size = 12
     page_size_query_param = 'page_size'
     max_page_size = 100
 
-class ExerciseCategoryList(generics.ListAPIView):
+def with_catalog_relations(queryset):
+    """预取分类和前置/解锁关系，列表每页的查询数是常数，与页大小无关"""
+    related = Exercise.objects.only('id', 'name')
+    return queryset.select_related('category').prefetch_related(
+        Prefetch('prerequisites', queryset=related),
+        Prefetch('unlocks', queryset=related),
+    )
+
+def user_progress_overlay(user, exercise_ids):
+    """
+    一条查询取出该用户在这些动作上的最佳得分与最近一次记录 (相关子查询)，
+    返回 {动作 id: {'user_best_score': ..., 'user_last_record': ...}}
+    """
+    records = UserExerciseRecord.objects.filter(user=user, exercise=OuterRef('pk'))
+    latest = records.order_by('-created_at', '-id')
+    rows = Exercise.objects.filter(id__in=exercise_ids).order_by().annotate(
+        best_score=Subquery(records.order_by('-accuracy_score').values('accuracy_score')[:1]),
+        last_accuracy_score=Subquery(latest.values('accuracy_score')[:1]),
+        last_count=Subquery(latest.values('count')[:1]),
+        last_duration=Subquery(latest.values('duration')[:1]),
+        last_created_at=Subquery(latest.values('created_at')[:1]),
+    ).values('id', 'best_score', 'last_accuracy_score', 'last_count', 'last_duration', 'last_created_at')
+    return {
+        row['id']: {
+            'user_best_score': row['best_score'],
+            'user_last_record': {
+                'accuracy_score': row['last_accuracy_score'],
+                'count': row['last_count'],
+                'duration': row['last_duration'],
+                'created_at': row['last_created_at'],
+            } if row['last_created_at'] is not None else None,
+        }
+        for row in rows
+    }
+
+class ExerciseCategoryList(CachedCatalogMixin, generics.ListAPIView):
     """获取所有运动类别"""
-    queryset=ExerciseCategory.objects.filter(is_active=True)
+    queryset=ExerciseCategory.objects.filter(is_active=True).annotate(
+        active_exercises_count=Count('exercise', filter=Q(exercise__is_active=True))
+    )
     serializer_class=ExerciseCategorySerializer
     permission_classes = [IsAuthenticated]
 
-class ExerciseList(generics.ListAPIView):
+    def list(self, request, *args, **kwargs):
+        return self.cached_catalog_response(request, *args, **kwargs)
+
+    def get_static_payload(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs).data
+
+class ExerciseList(CachedCatalogMixin, generics.ListAPIView):
     """获取所有动作列表，支持过滤、搜索和排序"""
     queryset = Exercise.objects.filter(is_active=True).order_by('order', 'id')
     serializer_class = ExerciseWithUserProgressSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # 索引检索放在排序之后：未指定 ordering 时按相关度排序
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, IndexedSearchFilter]
     filterset_fields = ['category', 'difficulty', 'target_muscle', 'equipment']
-    search_fields = ['name', 'english_name', 'description']
     ordering_fields = ['name', 'difficulty', 'order', 'id', 'level']
     ordering = ['order', 'id']
+    user_overlay = True
+
+    def get_queryset(self):
+        return with_catalog_relations(super().get_queryset())
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_catalog_response(request, *args, **kwargs)
+
+    def get_static_payload(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs).data
+
+    def apply_user_overlay(self, request, payload):
+        results = payload['results'] if isinstance(payload, dict) else payload
+        overlay = user_progress_overlay(request.user, [item['id'] for item in results])
+        for item in results:
+            item.update(overlay.get(item['id'], {}))
+        return payload
 
     def get_serializer_context(self):
         context=super().get_serializer_context()
         context['request']=self.request
         return context
     
-class ExerciseDetail(generics.RetrieveAPIView):
+class ExerciseDetail(CachedCatalogMixin, generics.RetrieveAPIView):
     """获取动作详情，包括用户进度"""
     queryset = Exercise.objects.filter(is_active=True)
     serializer_class = ExerciseDetailSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'id'
+    user_overlay = True
+
+    def get_queryset(self):
+        return with_catalog_relations(super().get_queryset())
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_catalog_response(request, *args, **kwargs)
+
+    def get_static_payload(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs).data
+
+    def apply_user_overlay(self, request, payload):
+        payload.update(user_progress_overlay(request.user, [payload['id']]).get(payload['id'], {}))
+        return payload
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -59,129 +137,145 @@ class ExerciseDetail(generics.RetrieveAPIView):
         return context
 
 from recommendations.services import KnowledgeGraphEngine
-from recommendations.gnn_models import KnowledgeGraphGNN
-import torch
+from .skill_tree import get_skill_tree, get_mastered_ids
+from .graph_skeleton import (
+    SUBGRAPH_DEFAULT_LIMIT, SUBGRAPH_MAX_LIMIT, MAX_HOPS,
+    frontier_graph, graph_diff, muscle_graph, neighborhood_graph, user_graph,
+)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def exercise_graph_data(request):
-    """获取动作知识图谱数据 (集成 GNN 结构分析与个人进度)"""
-    exercises = list(Exercise.objects.all().prefetch_related('prerequisites', 'unlocks')) # 获取所有动作
-    ex_id_to_idx = {ex.id: i for i, ex in enumerate(exercises)}
-    num_nodes = len(exercises)
-    
-    # 获取用户已完成的动作
-    mastered_ids = set(UserExerciseRecord.objects.filter(
-        user=request.user, 
-        accuracy_score__gte=80  # 假设 80 分以上为“掌握”
-    ).values_list('exercise_id', flat=True))
-
-    # 构造邻接矩阵用于 GNN 分析 (基于前置关系)
-    adj = torch.eye(num_nodes)
-    for ex in exercises:
-        for pre in ex.prerequisites.all():
-            if pre.id in ex_id_to_idx:
-                adj[ex_id_to_idx[pre.id], ex_id_to_idx[ex.id]] = 1.0
-
-    # 获取学习路径权重 (ExerciseGraph)
-    graph_transitions = ExerciseGraph.objects.select_related('from_exercise', 'to_exercise')
-    transition_map = {}
-    for gt in graph_transitions:
-        transition_map[(gt.from_exercise_id, gt.to_exercise_id)] = gt.probability
-
-    model = KnowledgeGraphGNN(num_nodes=num_nodes, feature_dim=16)
-    x_indices = torch.arange(num_nodes)
-    with torch.no_grad():
-        node_embeddings = model(x_indices, adj)
-        structural_scores = torch.norm(node_embeddings, dim=1).numpy()
-    
-    nodes = []
-    links = []
-    
-    category_colors = {
-        'chest': '#ff4d4f', 'back': '#40a9ff', 'legs': '#73d13d',
-        'shoulders': '#ffc53d', 'arms': '#ff7a45', 'abs': '#9254de', 
-        'glutes': '#eb2f96', 'full_body': '#fa8c16'
-    }
-    
-    # 状态提示色
-    MASTERED_COLOR = '#b7eb8f' # 浅绿
-    LOCKED_COLOR = '#efefef'    # 浅灰
-    READY_COLOR = '#fffbe6'     # 浅黄 (可解锁)
-
-    for i, ex in enumerate(exercises):
-        # 确定节点状态
-        is_mastered = ex.id in mastered_ids
-        # 检查是否可以进行（前置是否全部掌握）
-        all_pres_mastered = all(p.id in mastered_ids for p in ex.prerequisites.all())
-        
-        node_status = 'locked'
-        if is_mastered:
-            node_status = 'mastered'
-        elif all_pres_mastered:
-            node_status = 'ready'
-            
-        target_muscle = ex.target_muscle
-        gnn_score = float(structural_scores[i])
-        symbol_size = 30 + (gnn_score * 10) + (ex.level * 5)
-        
-        # 节点样式优化
-        item_style = {
-            'color': category_colors.get(target_muscle, '#bfbfbf'),
-            'borderColor': '#fff',
-            'borderWidth': 2 if gnn_score > 1.5 else 0
-        }
-        
-        # 如果已掌握，给一个外发光或特殊标记
-        if is_mastered:
-            item_style['borderColor'] = '#52c41a'
-            item_style['borderWidth'] = 4
-            item_style['shadowBlur'] = 10
-            item_style['shadowColor'] = '#52c41a'
-
-        nodes.append({
+    """获取动作知识图谱数据 (缓存的结构骨架 + 个人掌握状态)"""
+    return Response(user_graph(request.user), status=status.HTTP_200_OK)
+
+def _bounded_int(value, default, min_value, max_value):
+    try:
+        return max(min(int(value), max_value), min_value)
+    except (TypeError, ValueError):
+        return default
+
+def _subgraph_limit(request):
+    return _bounded_int(request.query_params.get('limit'), SUBGRAPH_DEFAULT_LIMIT, 1, SUBGRAPH_MAX_LIMIT)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def exercise_graph_frontier(request):
+    """图谱首屏：用户当前可以开始练的动作及其已掌握的前置，limit 限制节点数"""
+    return Response(frontier_graph(request.user, _subgraph_limit(request)), status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def exercise_graph_muscle(request, muscle):
+    """某个目标部位的子图，offset/limit 分页"""
+    if muscle not in dict(Exercise._meta.get_field('target_muscle').choices):
+        return Response({'error': '部位不存在'}, status=status.HTTP_404_NOT_FOUND)
+    offset = _bounded_int(request.query_params.get('offset'), 0, 0, 10 ** 6)
+    return Response(muscle_graph(request.user, muscle, offset, _subgraph_limit(request)), status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def exercise_graph_diff(request):
+    """
+    图谱增量同步：传入上次拿到的 version 与 mastery_version，只返回状态变化的节点
+    和结构变更；reset 为 true 时需要重新加载图谱
+    """
+    try:
+        graph_version = int(request.query_params['version'])
+        mastery_version = int(request.query_params['mastery_version'])
+    except (KeyError, ValueError):
+        return Response({'error': '需要提供整数 version 和 mastery_version'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(graph_diff(request.user, graph_version, mastery_version), status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def exercise_graph_neighborhood(request, id):
+    """某动作 hops 跳以内的邻域子图，用于在图上逐步展开"""
+    hops = _bounded_int(request.query_params.get('hops'), 1, 1, MAX_HOPS)
+    data = neighborhood_graph(request.user, id, hops, _subgraph_limit(request))
+    if data is None:
+        return Response({'error': '动作不存在'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(data, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def exercise_search(request):
+    """动作全文检索：按相关度排序，名称和描述摘要中的命中片段用 <mark> 标出"""
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': '请输入搜索关键词'}, status=status.HTTP_400_BAD_REQUEST)
+    limit = _bounded_int(request.query_params.get('limit'), 20, 1, 50)
+    ranked = search_exercise_ids(query, limit=limit)
+    scores = dict(ranked)
+    exercises = order_by_ids(Exercise.objects.all(), list(scores)).only(
+        'id', 'name', 'english_name', 'description', 'target_muscle', 'equipment', 'level', 'difficulty'
+    )
+    return Response({
+        'query': query,
+        'results': [{
+            'id': ex.id,
             'name': ex.name,
-            'id': str(ex.id),
-            'category': ex.get_target_muscle_display(),
-            'symbolSize': min(symbol_size, 80),
-            'value': round(gnn_score, 2),
-            'status': node_status,
-            'is_mastered': is_mastered,
-            'gnn_insight': f"结构重要性: {round(gnn_score, 2)}",
-            'itemStyle': item_style,
-            'level': ex.level
-        })
-        
-        for pre in ex.prerequisites.all():
-            weight = transition_map.get((pre.id, ex.id), 0.1)
-            line_color = '#91d5ff'
-            if pre.id in mastered_ids and ex.id in mastered_ids:
-                line_color = '#52c41a' # 已通关路径
-            elif pre.id in mastered_ids:
-                line_color = '#faad14' # 正在攻略路径
-
-            links.append({
-                'source': str(pre.id),
-                'target': str(ex.id),
-                'relation_label': '前置基础',
-                'label': {'show': True, 'formatter': '前置基础', 'fontSize': 10},
-                'lineStyle': {
-                    'width': 2 + (weight * 3), 
-                    'curveness': 0.2, 
-                    'color': line_color,
-                    'type': 'solid' if pre.id in mastered_ids else 'dashed'
-                }
-            })
-            
+            'english_name': ex.english_name,
+            'target_muscle': ex.target_muscle,
+            'equipment': ex.equipment,
+            'level': ex.level,
+            'difficulty': ex.difficulty,
+            'score': round(float(scores[ex.id]), 4),
+            'highlight': {
+                'name': highlight(ex.name, query),
+                'english_name': highlight(ex.english_name, query),
+                'description': highlight(ex.description, query, SNIPPET_LENGTH),
+            },
+        } for ex in exercises],
+    }, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def exercise_hybrid_search(request):
+    """
+    关键词 + 语义混合检索，支持口语化查询；muscle / equipment / level / max_level
+    为检索前生效的过滤条件
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': '请输入搜索关键词'}, status=status.HTTP_400_BAD_REQUEST)
+    params = request.query_params
+    filters = {}
+    if params.get('muscle') in dict(Exercise.TARGET_MUSCLE_CHOICES):
+        filters['target_muscle'] = params['muscle']
+    if params.get('equipment') in dict(Exercise.EQUIPMENT_CHOICES):
+        filters['equipment'] = params['equipment']
+    for key in ('level', 'max_level'):
+        if params.get(key):
+            filters[key] = _bounded_int(params[key], 1, 1, 5)
+    limit = _bounded_int(params.get('limit'), 20, 1, 50)
+    return Response(hybrid_search(query, filters, limit), status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def exercise_unlock_path(request, id):
+    """获取从用户已掌握的动作出发，解锁目标动作的最短学习路径"""
+    skill_tree = get_skill_tree()
+    target = skill_tree.exercises.get(id)
+    if target is None or not target.is_active:
+        return Response({'error': '动作不存在'}, status=status.HTTP_404_NOT_FOUND)
+
+    mastered_ids = get_mastered_ids(request.user, 80)
+    mastered_bits = skill_tree.mask_of(mastered_ids)
+
+    def brief(ex_id):
+        ex = skill_tree.exercises[ex_id]
+        return {'id': ex.id, 'name': ex.name, 'level': ex.level, 'target_muscle': ex.target_muscle}
+
+    stages = skill_tree.unlock_path(target.id, mastered_bits)
     return Response({
-        'nodes': nodes,
-        'links': links,
-        'categories': [{'name': v} for v in ['胸部', '背部', '腿部', '肩部', '手臂', '腹部', '臀部', '全身']],
-        'stats': {
-            'total': num_nodes,
-            'mastered': len(mastered_ids),
-            'percent': round((len(mastered_ids) / num_nodes * 100), 1) if num_nodes > 0 else 0
-        }
+        'exercise': brief(target.id),
+        'is_mastered': target.id in mastered_ids,
+        'is_unlocked': skill_tree.is_unlocked(target.id, mastered_bits),
+        'missing_prerequisites': [brief(ex_id) for ex_id in skill_tree.missing_prerequisites(target.id, mastered_bits)],
+        'path': [brief(ex_id) for stage in stages for ex_id in stage],
+        'stages': [[brief(ex_id) for ex_id in stage] for stage in stages],
+        'steps': sum(len(stage) for stage in stages),
     }, status=status.HTTP_200_OK)
 
 @api_view(['POST'])
@@ -242,23 +336,10 @@ def user_exercise_progress(request, exercise_id):
     except UserProfile.DoesNotExist:
         profile = None
 
-    # 统计用户的练习数据
-    total_exercises = UserExerciseRecord.objects.filter(user=user).count()
-    total_duration = UserExerciseRecord.objects.filter(user=user).aggregate(
-        Sum('duration')
-    )['duration__sum'] or 0
-
-    total_calories = UserExerciseRecord.objects.filter(user=user).aggregate(
-        Sum('calories_burned')
-    )['calories_burned__sum'] or 0
-
-    best_record = UserExerciseRecord.objects.filter(user=user).order_by('-accuracy_score').first()
-    
-    # 获取最近一次记录
-    latest_record = UserExerciseRecord.objects.filter(
-        user=user, 
-        exercise__id=exercise_id
-    ).order_by('-created_at').first()
+    # 用户总汇总和该动作的汇总由记录写入时维护，这里一次查询读出
+    totals, exercise_summary = get_summaries(user.id, exercise_id)
+    best_record = totals.best_record
+    latest_record = exercise_summary.latest_record
 
     stats = {
         'profile_info': {
@@ -269,9 +350,9 @@ def user_exercise_progress(request, exercise_id):
             'weight': profile.weight if profile else 0,
             'fitness_level': profile.fitness_level if profile else '',
         } if profile else None,
-        'total_exercises': total_exercises,
-        'total_duration': total_duration,
-        'total_calories': round(total_calories, 2),
+        'total_exercises': totals.record_count,
+        'total_duration': totals.total_duration,
+        'total_calories': round(totals.total_calories, 2),
         'best_accuracy_score': best_record.accuracy_score if best_record else 0,
         'best_exercise': best_record.exercise.name if best_record else '',
         'latest_record': {
@@ -280,6 +361,12 @@ def user_exercise_progress(request, exercise_id):
             'duration': latest_record.duration if latest_record else 0,
             'created_at': latest_record.created_at if latest_record else None
         } if latest_record else None,
+        'exercise_stats': {
+            'total_exercises': exercise_summary.record_count,
+            'total_duration': exercise_summary.total_duration,
+            'total_calories': round(exercise_summary.total_calories, 2),
+            'best_accuracy_score': exercise_summary.best_accuracy_score,
+        },
     }
     return Response(stats, status=status.HTTP_200_OK)
 
@@ -211,6 +211,24 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'Asia/Shanghai'
 
+# 每日统计汇总是否投递到 Celery 异步执行 (默认在事务提交后同步执行)
+ANALYTICS_ROLLUP_ASYNC = os.getenv('ANALYTICS_ROLLUP_ASYNC', 'false').lower() == 'true'
+
+# 上传图片的 WebP 派生图是否投递到 Celery 生成 (默认在事务提交后同步生成)
+MEDIA_DERIVATIVES_ASYNC = os.getenv('MEDIA_DERIVATIVES_ASYNC', 'false').lower() == 'true'
+# 不在应用 tasks.py 中的任务模块
+CELERY_IMPORTS = ('utils.media_derivatives',)
+
+# 定时任务 (需启动 celery beat)
+from celery.schedules import crontab
+CELERY_BEAT_SCHEDULE = {
+    # 每天凌晨从数据库重建排行榜，对账增量写入并清掉已中断的连续天数
+    'rebuild-leaderboards': {
+        'task': 'analytics.tasks.rebuild_leaderboards',
+        'schedule': crontab(hour=3, minute=10),
+    },
+}
+
 
 
 CORS_ALLOW_ALL_ORIGINS = True
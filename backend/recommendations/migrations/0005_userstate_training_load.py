@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recommendations", "0004_alter_recommendedexercise_algorithm"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userstate",
+            name="acute_load",
+            field=models.FloatField(
+                default=0.0, help_text="急性负荷 (约 7 天窗口的 EWMA)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="userstate",
+            name="chronic_load",
+            field=models.FloatField(
+                default=0.0, help_text="慢性负荷 (约 28 天窗口的 EWMA)"
+            ),
+        ),
+        migrations.AddField(
+            model_name="userstate",
+            name="load_updated_at",
+            field=models.DateTimeField(
+                blank=True, help_text="负荷累加器最后一次更新时间", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="userstate",
+            name="muscle_loads",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="各部位残余负荷 {部位: kg}，按恢复周期衰减",
+            ),
+        ),
+    ]
@@ -1,5 +1,8 @@
+import math
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from exercises.models import Exercise
 
 class UserInteraction(models.Model):
@@ -42,3 +45,65 @@ class UserState(models.Model):
     consistency_score = models.FloatField(default=0.0, help_text="坚持程度评分")
     last_trained_at = models.DateTimeField(null=True, blank=True)
     current_equipment_available = models.CharField(max_length=100, default='all')
+
+    # 训练负荷 (指数加权滑动平均)：每次完成训练 O(1) 更新，读取时按流逝时间衰减
+    acute_load = models.FloatField(default=0.0, help_text="急性负荷 (约 7 天窗口的 EWMA)")
+    chronic_load = models.FloatField(default=0.0, help_text="慢性负荷 (约 28 天窗口的 EWMA)")
+    muscle_loads = models.JSONField(default=dict, blank=True, help_text="各部位残余负荷 {部位: kg}，按恢复周期衰减")
+    load_updated_at = models.DateTimeField(null=True, blank=True, help_text="负荷累加器最后一次更新时间")
+
+    # EWMA 平滑系数 λ = 2 / (N + 1)，N 为以天计的窗口
+    ACUTE_DAYS = 7
+    CHRONIC_DAYS = 28
+    # 部位残余负荷的恢复时间常数 (天) 与判定为“过度使用”的阈值 (kg)
+    MUSCLE_RECOVERY_DAYS = 1.5
+    MUSCLE_OVERUSE_LOAD = 2000.0
+    # 新用户慢性负荷还没建立起来时使用的参考基线，避免第一次训练就被判为高疲劳
+    BASELINE_CHRONIC_LOAD = 2000.0
+
+    @classmethod
+    def _decay_factor(cls, window_days, elapsed_days):
+        return (1 - 2 / (window_days + 1)) ** max(elapsed_days, 0.0)
+
+    def current_loads(self, now=None):
+        """返回衰减到 now 的 (急性负荷, 慢性负荷, 各部位残余负荷)，不写库"""
+        if not self.load_updated_at:
+            return self.acute_load, self.chronic_load, dict(self.muscle_loads or {})
+        now = now or timezone.now()
+        elapsed = (now - self.load_updated_at).total_seconds() / 86400
+        recovery = math.exp(-max(elapsed, 0.0) / self.MUSCLE_RECOVERY_DAYS)
+        return (
+            self.acute_load * self._decay_factor(self.ACUTE_DAYS, elapsed),
+            self.chronic_load * self._decay_factor(self.CHRONIC_DAYS, elapsed),
+            {muscle: load * recovery for muscle, load in (self.muscle_loads or {}).items()},
+        )
+
+    def apply_load(self, load, muscle_loads=None, now=None):
+        """先把累加器衰减到 now，再计入一次训练的负荷 (kg)"""
+        now = now or timezone.now()
+        acute, chronic, muscles = self.current_loads(now)
+        self.acute_load = acute + load * 2 / (self.ACUTE_DAYS + 1)
+        self.chronic_load = chronic + load * 2 / (self.CHRONIC_DAYS + 1)
+        for muscle, value in (muscle_loads or {}).items():
+            muscles[muscle] = muscles.get(muscle, 0.0) + value
+        # 已基本恢复的部位不再保留，字典大小始终不超过部位数
+        self.muscle_loads = {m: round(v, 1) for m, v in muscles.items() if v >= 1.0}
+        self.load_updated_at = now
+        self.fatigue_level = self.current_fatigue(now)
+        return self
+
+    def current_fatigue(self, now=None):
+        """
+        由急慢性负荷比 (ACWR) 折算的疲劳度 0-1：比值 ≤0.8 视为充分恢复，
+        ≥1.5 视为高风险；慢性负荷不足时以参考基线代替
+        """
+        if not self.load_updated_at:
+            return self.fatigue_level
+        acute, chronic, _ = self.current_loads(now)
+        ratio = acute / max(chronic, self.BASELINE_CHRONIC_LOAD)
+        return min(max((ratio - 0.8) / 0.7, 0.0), 1.0)
+
+    def overused_muscles(self, now=None):
+        """残余负荷仍高于阈值、需要避让的部位"""
+        _, _, muscles = self.current_loads(now)
+        return [muscle for muscle, load in muscles.items() if load >= self.MUSCLE_OVERUSE_LOAD]
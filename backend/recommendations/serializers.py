@@ -2,6 +2,7 @@ from rest_framework import serializers
 from .models import UserInteraction, RecommendedExercise, UserState
 from exercises.serializers import ExerciseSerializer
 from exercises.models import Exercise
+from utils.media_derivatives import DEMO_CARD_WIDTH, pick_variant, variant_url
 
 
 class FeedbackActionSerializer(serializers.Serializer):
@@ -16,9 +17,19 @@ class FeedbackActionSerializer(serializers.Serializer):
 
 
 class ExerciseBriefSerializer(serializers.ModelSerializer):
+    demo_webp = serializers.SerializerMethodField()
+    demo_poster = serializers.SerializerMethodField()
+
     class Meta:
         model = Exercise
-        fields = ["id", "name", "target_muscle", "difficulty", "image_url", "demo_gif"]
+        fields = ["id", "name", "target_muscle", "difficulty", "image_url", "demo_gif", "demo_webp", "demo_poster"]
+
+    def get_demo_webp(self, obj):
+        return variant_url(self.context.get("request"), obj.demo_variants, "animated")
+
+    def get_demo_poster(self, obj):
+        # 推荐卡片先展示静态封面，按像素密度选档
+        return pick_variant(self.context.get("request"), obj.demo_variants, DEMO_CARD_WIDTH, prefix="poster_")
 
 
 class RecommendedExerciseSerializer(serializers.ModelSerializer):
@@ -54,3 +65,13 @@ class UserStateSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserState
         fields = "__all__"
+
+    def to_representation(self, instance):
+        # 库里存的是最后一次训练时的负荷，输出衰减到当前时刻的值 (与 user_status_view 一致)
+        data = super().to_representation(instance)
+        acute, chronic, muscle_loads = instance.current_loads()
+        data["fatigue_level"] = round(instance.current_fatigue(), 3)
+        data["acute_load"] = round(acute, 1)
+        data["chronic_load"] = round(chronic, 1)
+        data["muscle_loads"] = {muscle: round(load, 1) for muscle, load in muscle_loads.items()}
+        return data
@@ -2,7 +2,10 @@ import numpy as np
 import random
 from datetime import timedelta
 from django.utils import timezone
-from django.db.models import Count, Avg, F 
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Avg, F, FloatField, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from exercises.models import Exercise
 from .models import UserInteraction, RecommendedExercise, UserState
@@ -10,12 +13,48 @@ from utils.vector_db import VectorDB
 from .model_utils import DLModelManager
 from .gnn_models import KnowledgeGraphGNN
 from exercises.models import UserExerciseRecord
+from exercises.skill_tree import get_skill_tree, get_mastered_ids
+from analytics.services import BODYWEIGHT_LOAD_KG
+from training.models import UserTrainingExerciseSet
+from users.services import UserStatsService
 
 # 高级算法库依赖
 import torch
 import torch.nn.functional as F_torch 
 from sklearn.metrics.pairwise import cosine_similarity
 
+class TrainingLoadService:
+    """把完成的训练会话折算成训练负荷 (kg)，O(1) 累加到 UserState 的 EWMA 累加器"""
+
+    # 没有逐组数据的训练 (如纯计时动作) 按时长估算负荷
+    LOAD_PER_MINUTE = 50.0
+
+    @staticmethod
+    def session_loads(session):
+        """一次聚合查询得到 (总负荷, {部位: 负荷})，自重组按固定系数折算"""
+        rows = UserTrainingExerciseSet.objects.filter(
+            record__session=session, reps__isnull=False
+        ).values('record__exercise__target_muscle').annotate(
+            load=Sum(F('reps') * Coalesce('weight', Value(BODYWEIGHT_LOAD_KG)), output_field=FloatField())
+        ).order_by()
+        muscle_loads = {row['record__exercise__target_muscle']: row['load'] or 0.0 for row in rows}
+        total = sum(muscle_loads.values())
+        if not total:
+            total = UserStatsService.session_duration_seconds(session) / 60 * TrainingLoadService.LOAD_PER_MINUTE
+        return total, muscle_loads
+
+    @staticmethod
+    def record_session(session):
+        total, muscle_loads = TrainingLoadService.session_loads(session)
+        with transaction.atomic():
+            state, _ = UserState.objects.select_for_update().get_or_create(user_id=session.user_id)
+            state.apply_load(total, muscle_loads)
+            state.last_trained_at = timezone.now()
+            state.save()
+        cache.delete(f"rec_user_status:{session.user_id}")
+        return state
+
+
 class RecommendationEngine:
     """推荐系统核心抽象类"""
     def recommend(self, user, limit=5):
@@ -24,8 +63,9 @@ class RecommendationEngine:
 class KnowledgeGraphEngine(RecommendationEngine):
     """基于图神经网络 (GNN) 的知识图谱路径推荐"""
     def recommend(self, user, limit=5):
-        # 1. 构建图结构
-        exercises = list(Exercise.objects.filter(is_active=True).prefetch_related('prerequisites'))
+        # 1. 构建图结构 (直接复用内存中的技能树索引)
+        skill_tree = get_skill_tree()
+        exercises = [ex for ex in skill_tree.exercises.values() if ex.is_active]
         ex_id_to_idx = {ex.id: i for i, ex in enumerate(exercises)}
         num_nodes = len(exercises)
         
@@ -36,9 +76,9 @@ class KnowledgeGraphEngine(RecommendationEngine):
         device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         adj = torch.eye(num_nodes).to(device)
         for ex in exercises:
-            for pre in ex.prerequisites.all():
-                if pre.id in ex_id_to_idx:
-                    adj[ex_id_to_idx[pre.id], ex_id_to_idx[ex.id]] = 1.0
+            for pre_id in skill_tree.prerequisites[ex.id]:
+                if pre_id in ex_id_to_idx:
+                    adj[ex_id_to_idx[pre_id], ex_id_to_idx[ex.id]] = 1.0
         
         # 归一化 D^-1/2 * A * D^-1/2
         rowsum = adj.sum(1)
@@ -68,13 +108,13 @@ class KnowledgeGraphEngine(RecommendationEngine):
         # 4. 基于用户历史寻找“下一个逻辑动作”
         history = list(UserInteraction.objects.filter(user=user, interaction_type='finish').order_by('-timestamp')[:3])
         if not history:
-            # 优化：预加载 count 避免 N+1
-            start_nodes_query = Exercise.objects.filter(is_active=True).annotate(
-                num_pre=Count('prerequisites'),
-                num_unlocks=Count('unlocks')
-            ).filter(num_pre=0).order_by('-num_unlocks')[:limit]
-            
-            return [(ex, 0.5 + (ex.num_unlocks / 10.0 if hasattr(ex, 'num_unlocks') else 0)) for ex in start_nodes_query]
+            # 没有历史时从技能树的根节点 (无前置) 出发，解锁面越广越优先
+            start_nodes = sorted(
+                (ex for ex in exercises if not skill_tree.prerequisites[ex.id]),
+                key=lambda ex: len(skill_tree.unlocks[ex.id]),
+                reverse=True,
+            )[:limit]
+            return [(ex, 0.5 + len(skill_tree.unlocks[ex.id]) / 10.0) for ex in start_nodes]
             
         # 计算历史动作嵌入的均值作为当前“知识状态”
         history_indices = [ex_id_to_idx[h.exercise_id] for h in history if h.exercise_id in ex_id_to_idx]
@@ -84,12 +124,16 @@ class KnowledgeGraphEngine(RecommendationEngine):
         user_knowledge_emb = embeddings[history_indices].mean(dim=0)
         
         # 5. 计算备选动作与用户知识状态的关联度
-        # 优化：预加载关系
-        unlocked_candidates = Exercise.objects.filter(prerequisites__id__in=[h.exercise_id for h in history]).distinct()
+        # 备选集合 = 历史动作在技能树上直接解锁的动作
+        history_ids = {h.exercise_id for h in history}
+        candidate_ids = set()
+        for h_id in history_ids:
+            candidate_ids.update(skill_tree.unlocks.get(h_id, []))
+        unlocked_candidates = [skill_tree.exercises[ex_id] for ex_id in skill_tree.ids_of(skill_tree.mask_of(candidate_ids))]
         
         results = []
         for ex in unlocked_candidates:
-            if ex.id in [h.exercise_id for h in history]: continue
+            if ex.id in history_ids: continue
             if ex.id not in ex_id_to_idx: continue
             idx = ex_id_to_idx[ex.id]
             # 使用 GNN 嵌入计算余弦相似度 + 路径分值 (注意这里改用 F_torch)
@@ -280,22 +324,18 @@ class RLAdaptiveEngine(RecommendationEngine):
     """自适应强化学习推荐引擎 (基于 Thompson Sampling 的多臂老虎机)"""
     def recommend(self, user, limit=5):
         state, _ = UserState.objects.get_or_create(user=user)
-        
-        # 1. 疲劳度过度保护逻辑
-        if state.fatigue_level > 0.85:
+        now = timezone.now()
+
+        # 1. 疲劳度过度保护逻辑 (急慢性负荷比，读取时按时间衰减)
+        if state.current_fatigue(now) > 0.85:
             # 极高疲劳：只推荐拉伸/放松
             stretches = Exercise.objects.filter(tags__contains='stretching')[:limit]
             if not stretches:
                 stretches = Exercise.objects.filter(difficulty='beginner')[:limit]
             return [(ex, 1.0) for ex in stretches]
             
-        # 2. 部位避让逻辑 (Overuse Protection)
-        one_day_ago = timezone.now() - timedelta(days=1)
-        recent_muscles = list(UserInteraction.objects.filter(
-            user=user, 
-            interaction_type='finish',
-            timestamp__gte=one_day_ago
-        ).values_list('exercise__target_muscle', flat=True).distinct())
+        # 2. 部位避让逻辑 (Overuse Protection)：残余负荷仍未恢复的部位
+        recent_muscles = state.overused_muscles(now)
         
         # 3. Thompson Sampling 核心逻辑
         # 我们将动作库视为多臂老虎机，每个动作的回报服从 Beta 分布
@@ -527,29 +567,13 @@ class HybridRecommender:
                 })
                 seen_ids.add(ex.id)
 
+        # 校验前置条件是否全部达到 80 分以上 (技能树索引 + 一次掌握集合查询)
+        skill_tree = get_skill_tree()
+        mastered_bits = skill_tree.mask_of(get_mastered_ids(user, 80.0))
+
         final_recs = []
         for item in raw_final_recs:
-            ex = item['ex']
-            prereqs = ex.prerequisites.all()
-            
-            if not prereqs.exists():
-                final_recs.append(item) 
-                continue
-                
-            # 校验前置条件是否全部达到 80 分以上
-            is_unlocked = True
-            for req in prereqs:
-                has_passed = UserExerciseRecord.objects.filter(
-                    user=user,
-                    exercise=req,
-                    accuracy_score__gte=80.0
-                ).exists()
-                
-                if not has_passed:
-                    is_unlocked = False
-                    break 
-                    
-            if is_unlocked:
+            if skill_tree.is_unlocked(item['ex'].id, mastered_bits):
                 final_recs.append(item)
 
         # 4. 兜底策略：如果过滤后召回不足，使用热门冷启动补全
@@ -561,11 +585,9 @@ class HybridRecommender:
                 if len(final_recs) >= limit:
                     break
                 if ex.id not in seen_ids:
-                    prereqs = ex.prerequisites.all()
-                    if prereqs.exists():
-                        if not all(UserExerciseRecord.objects.filter(user=user, exercise=req, accuracy_score__gte=80.0).exists() for req in prereqs):
-                            continue 
-                            
+                    if not skill_tree.is_unlocked(ex.id, mastered_bits):
+                        continue
+
                     final_recs.append({
                         'ex': ex, 
                         'score': score, 
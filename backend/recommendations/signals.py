@@ -1,19 +1,27 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, pre_save
 from django.dispatch import receiver
-from training.models import UserTrainingSession  # 假设有这个或者 TrainingLog
-from analytics.models import UserDailyStats
-from .models import UserState
+from training.models import UserTrainingSession
 
-@receiver(post_save, sender=UserDailyStats)
-def update_user_state(sender, instance, **kwargs):
-    """当用户有新的统计数据产生时，更新其推荐状态"""
-    state, _ = UserState.objects.get_or_create(user=instance.user)
-    
-    # 根据今日评分调整疲劳度 (示例逻辑)
-    if instance.average_form_score < 60:
-        state.fatigue_level = min(1.0, state.fatigue_level + 0.2)
-    else:
-        state.fatigue_level = max(0.0, state.fatigue_level - 0.1)
-        
-    state.last_trained_at = instance.date
-    state.save()
+
+@receiver(post_init, sender=UserTrainingSession)
+def remember_load_completion(sender, instance, **kwargs):
+    # is_completed 被延迟加载时不读取 (否则每行多一次查询)，记为 None，保存前再查库
+    instance._load_was_completed = instance.__dict__.get('is_completed')
+
+
+@receiver(pre_save, sender=UserTrainingSession)
+def load_unknown_load_completion(sender, instance, **kwargs):
+    if instance._load_was_completed is None and instance.pk is not None:
+        instance._load_was_completed = UserTrainingSession.objects.filter(pk=instance.pk).values_list(
+            'is_completed', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=UserTrainingSession)
+def update_training_load(sender, instance, created, **kwargs):
+    """训练会话刚完成时，提交后把本次负荷累加到用户的急/慢性负荷 (每次 O(1))"""
+    if instance.is_completed and (created or not instance._load_was_completed):
+        from .services import TrainingLoadService
+        transaction.on_commit(lambda: TrainingLoadService.record_session(instance))
+    instance._load_was_completed = instance.is_completed
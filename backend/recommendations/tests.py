@@ -1,5 +1,7 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
 import random
 from rest_framework.test import APIClient
 from unittest.mock import patch
@@ -11,6 +13,7 @@ from recommendations.serializers import (
     FeedbackActionSerializer,
 )
 from recommendations.services import HybridRecommender
+from training.models import UserTrainingExerciseRecord, UserTrainingSession
 
 
 class _DummyExercise:
@@ -352,3 +355,71 @@ class HybridRecommenderStrategyTests(TestCase):
             candidates, goal_type="muscle_gain", fatigue_level=0.3
         )
         self.assertEqual(reranked[0]["ex"].id, 7)
+
+
+class TrainingLoadStateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="load_tester", password="pwd123456")
+        self.squat = Exercise.objects.create(
+            name="负重深蹲", description="描述", target_muscle="legs", instructions="要领", level=2,
+        )
+
+    def _finish_session(self, reps, weights):
+        start = timezone.now() - timedelta(hours=1)
+        session = UserTrainingSession.objects.create(user=self.user, start_time=start)
+        UserTrainingExerciseRecord.objects.create(
+            session=session, exercise=self.squat, reps_completed=reps, weights_used=weights,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            session.is_completed = True
+            session.end_time = timezone.now()
+            session.save()
+        return UserState.objects.get(user=self.user)
+
+    def test_loads_decay_between_sessions(self):
+        state = UserState(user=self.user)
+        now = timezone.now()
+        state.apply_load(800.0, now=now)
+        self.assertAlmostEqual(state.acute_load, 200.0)
+        acute, chronic, _ = state.current_loads(now + timedelta(days=7))
+        self.assertAlmostEqual(acute, 200.0 * 0.75 ** 7, places=3)
+        self.assertAlmostEqual(chronic, 800.0 * 2 / 29 * (27 / 29) ** 7, places=3)
+
+    def test_completed_session_updates_load_once(self):
+        state = self._finish_session([10, 10], [50, 50])
+        self.assertAlmostEqual(state.acute_load, 1000.0 * 0.25, places=1)
+        self.assertEqual(state.current_fatigue(), 0.0)
+
+        # 已完成的会话再次保存不会重复计入
+        session = UserTrainingSession.objects.get(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            session.save()
+        self.assertAlmostEqual(UserState.objects.get(user=self.user).acute_load, 250.0, places=1)
+
+        # is_completed 被延迟加载时：加载不多查询，保存前查库判断，仍不重复计入
+        with self.assertNumQueries(1):
+            session = UserTrainingSession.objects.defer("is_completed").get(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            session.save()
+        self.assertAlmostEqual(UserState.objects.get(user=self.user).acute_load, 250.0, places=1)
+
+    def test_heavy_session_triggers_overuse_until_recovered(self):
+        state = self._finish_session([10] * 10, [100] * 10)
+        self.assertGreater(state.current_fatigue(), 0.5)
+        self.assertEqual(state.overused_muscles(), ["legs"])
+        later = timezone.now() + timedelta(days=3)
+        self.assertEqual(state.overused_muscles(later), [])
+        self.assertLess(state.current_fatigue(later), state.current_fatigue())
+
+    def test_status_endpoints_report_the_same_decayed_fatigue(self):
+        self._finish_session([10] * 10, [100] * 10)
+        # 负荷记录在两天前，库里的 fatigue_level 是未衰减的旧值
+        UserState.objects.filter(user=self.user).update(
+            load_updated_at=timezone.now() - timedelta(days=2), fatigue_level=1.0
+        )
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        status_view = client.get("/api/recommendations/status/").data
+        user_status = client.get("/api/recommendations/list/user_status/").data
+        self.assertLess(user_status["fatigue_level"], 1.0)
+        self.assertEqual(user_status["fatigue_level"], status_view["fatigue_level"])
@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RecommendationViewSet, InteractionViewSet
+from .views import RecommendationViewSet, InteractionViewSet, user_status_view
 
 router = DefaultRouter()
 router.register(r'list', RecommendationViewSet, basename='recommendations')
 router.register(r'interactions', InteractionViewSet, basename='interactions')
 
 urlpatterns = [
+    path('status/', user_status_view, name='user-status'),
     path('', include(router.urls)),
 ]
@@ -100,72 +100,77 @@ class InteractionViewSet(viewsets.ModelViewSet):
         return super().create(request, *args, **kwargs)
 
 
+from django.db.models import Sum
+from analytics.models import UserMuscleVolume
+from exercises.models import Exercise
 from recommendations.models import UserState
-from training.models import UserTrainingExerciseRecord
+
+# 每周各部位的及格目标容量 (kg)，其他窗口按天数等比例折算
+WEEKLY_TARGET_VOLUME = 3000.0
+STATUS_CACHE_TIMEOUT = 30
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def user_status_view(request):
-    """获取用户当前状态与本周训练容量统计"""
+    """
+    获取用户当前状态与近期各部位训练容量 (读取 用户×部位×日期 预聚合表)
+
+    ?days=N      统计最近 N 天 (含今天)，默认 7
+    ?view=heatmap 额外返回 部位 × 日期 的训练量矩阵
+    """
     user = request.user
+    days = _parse_limit(request.query_params.get("days"), default=7, max_value=366)
+    view = request.query_params.get("view", "summary")
+
+    cache_key = f"user_status_view:{user.id}:{days}:{view}"
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return Response(cached)
 
     # 1. 获取强化学习引擎需要的疲劳状态
     state, _ = UserState.objects.get_or_create(user=user)
 
-    # 2. 计算本周各部位的真实训练容量
-    one_week_ago = timezone.now() - timedelta(days=7)
-    recent_records = UserTrainingExerciseRecord.objects.filter(
-        session__user=user, created_at__gte=one_week_ago
-    ).select_related("exercise")
-
-    # 初始化三个核心部位的容量为 0
-    raw_volume = {"chest": 0.0, "legs": 0.0, "abs": 0.0}
-
-    # 假设每周的及格目标容量是 3000kg (你可以根据 UserProfile 里的基础调整这个值)
-    TARGET_VOLUME = 3000.0
-
-    for record in recent_records:
-        muscle = record.exercise.target_muscle
-        # 我们前端只展示这三个，所以只统计这三个
-        if muscle not in raw_volume:
-            continue
-
-        # 清洗 JSON 里的脏数据
-        w_list = [
-            float(w)
-            for w in record.weights_used
-            if str(w).replace(".", "", 1).isdigit()
-        ]
-        r_list = [int(r) for r in record.reps_completed if str(r).isdigit()]
-
-        # 严谨计算容量 = 重量 * 次数
-        if w_list and len(w_list) == len(r_list):
-            vol = sum(w * r for w, r in zip(w_list, r_list))
-        elif r_list:
-            # 如果是俯卧撑这种自重动作，没有填重量，按固定系数(例如 20kg)折算
-            vol = sum(r_list) * 20.0
-        else:
-            vol = 0.0
-
-        raw_volume[muscle] += vol
-
-    # 3. 组装成前端 Vue 需要的精确格式
+    # 2. 从预聚合表读取窗口内各部位训练量
+    end_date = timezone.localdate()
+    start_date = end_date - timedelta(days=days - 1)
+    rows = UserMuscleVolume.objects.filter(user=user, date__range=(start_date, end_date))
+
+    muscles = Exercise.TARGET_MUSCLE_CHOICES
+    target_volume = WEEKLY_TARGET_VOLUME * days / 7
+    totals = dict(rows.values("muscle").annotate(total=Sum("volume")).values_list("muscle", "total").order_by())
+
+    # 3. 组装成前端 Vue 需要的格式
     volume_stats = [
         {
-            "name": "胸部",
-            "percentage": min(int((raw_volume["chest"] / TARGET_VOLUME) * 100), 100),
-        },
-        {
-            "name": "腿部",
-            "percentage": min(int((raw_volume["legs"] / TARGET_VOLUME) * 100), 100),
-        },
-        {
-            "name": "核心",
-            "percentage": min(int((raw_volume["abs"] / TARGET_VOLUME) * 100), 100),
-        },
+            "muscle": muscle,
+            "name": label,
+            "volume": round(totals.get(muscle) or 0.0, 1),
+            "percentage": min(int(((totals.get(muscle) or 0.0) / target_volume) * 100), 100),
+        }
+        for muscle, label in muscles
     ]
-
-    return Response(
-        {"fatigue_level": state.fatigue_level, "volume_stats": volume_stats}
-    )
+    data = {
+        "fatigue_level": round(state.current_fatigue(), 3),
+        "days": days,
+        "start_date": start_date,
+        "end_date": end_date,
+        "volume_stats": volume_stats,
+    }
+
+    if view == "heatmap":
+        dates = [start_date + timedelta(days=offset) for offset in range(days)]
+        muscle_index = {muscle: i for i, (muscle, _) in enumerate(muscles)}
+        values = [[0.0] * days for _ in muscles]
+        for day, muscle, volume in rows.values_list("date", "muscle", "volume"):
+            if muscle in muscle_index:
+                values[muscle_index[muscle]][(day - start_date).days] = round(volume, 1)
+        data["heatmap"] = {
+            "muscles": [muscle for muscle, _ in muscles],
+            "labels": [label for _, label in muscles],
+            "dates": dates,
+            "values": values,
+        }
+
+    cache.set(cache_key, data, timeout=STATUS_CACHE_TIMEOUT)
+    return Response(data)
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("training", "0002_usertrainingsession_ai_analysis_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserTrainingExerciseSet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("set_index", models.PositiveSmallIntegerField(verbose_name="组序号")),
+                (
+                    "reps",
+                    models.IntegerField(blank=True, null=True, verbose_name="完成次数"),
+                ),
+                (
+                    "weight",
+                    models.FloatField(blank=True, null=True, verbose_name="重量 (kg)"),
+                ),
+                (
+                    "record",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sets",
+                        to="training.usertrainingexerciserecord",
+                        verbose_name="动作记录",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "训练组明细",
+                "verbose_name_plural": "训练组明细",
+                "ordering": ["record", "set_index"],
+                "unique_together": {("record", "set_index")},
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations
+
+
+# 迁移必须固定行为：以下解析逻辑复制自编写迁移时的 training.models.parse_set_rows，
+# 之后模型中的实现如何修改都不影响重放本迁移
+def _set_value(value, cast):
+    if isinstance(value, bool):
+        return None
+    try:
+        number = cast(float(value))
+    except (TypeError, ValueError):
+        return None
+    return number if number >= 0 else None
+
+
+def parse_set_rows(reps_completed, weights_used):
+    reps_completed = reps_completed if isinstance(reps_completed, list) else []
+    weights_used = weights_used if isinstance(weights_used, list) else []
+    rows = []
+    for index in range(max(len(reps_completed), len(weights_used))):
+        reps = (
+            _set_value(reps_completed[index], int)
+            if index < len(reps_completed)
+            else None
+        )
+        weight = (
+            _set_value(weights_used[index], float)
+            if index < len(weights_used)
+            else None
+        )
+        rows.append((index, reps, weight))
+    return rows
+
+
+def backfill_sets(apps, schema_editor):
+    Record = apps.get_model("training", "UserTrainingExerciseRecord")
+    ExerciseSet = apps.get_model("training", "UserTrainingExerciseSet")
+
+    batch = []
+    records = Record.objects.filter(sets__isnull=True).values_list(
+        "id", "reps_completed", "weights_used"
+    )
+    for record_id, reps_completed, weights_used in records.iterator(chunk_size=2000):
+        batch.extend(
+            ExerciseSet(record_id=record_id, set_index=index, reps=reps, weight=weight)
+            for index, reps, weight in parse_set_rows(reps_completed, weights_used)
+        )
+        if len(batch) >= 5000:
+            ExerciseSet.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        ExerciseSet.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("training", "0003_usertrainingexerciseset"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sets, migrations.RunPython.noop),
+    ]
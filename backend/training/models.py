@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from exercises.models import Exercise, UserExerciseRecord, ExerciseCategory
 
@@ -146,6 +146,32 @@ class UserTrainingSession(models.Model):
     
 
 
+def _set_value(value, cast):
+    """把前端传来的单组数值 (数字或数字字符串) 转成非负数，无法识别时返回 None"""
+    if isinstance(value, bool):
+        return None
+    try:
+        number = cast(float(value))
+    except (TypeError, ValueError):
+        return None
+    return number if number >= 0 else None
+
+
+def parse_set_rows(reps_completed, weights_used):
+    """
+    把每组次数/重量两个 JSON 列表解析成逐组明细 [(组序号, 次数, 重量), ...]
+    缺失或无法识别的值记为 None
+    """
+    reps_completed = reps_completed if isinstance(reps_completed, list) else []
+    weights_used = weights_used if isinstance(weights_used, list) else []
+    rows = []
+    for index in range(max(len(reps_completed), len(weights_used))):
+        reps = _set_value(reps_completed[index], int) if index < len(reps_completed) else None
+        weight = _set_value(weights_used[index], float) if index < len(weights_used) else None
+        rows.append((index, reps, weight))
+    return rows
+
+
 class UserTrainingExerciseRecord(models.Model):
     """用户训练动作记录模型"""
     session = models.ForeignKey(UserTrainingSession, on_delete=models.CASCADE, 
@@ -180,3 +206,57 @@ class UserTrainingExerciseRecord(models.Model):
     def __str__(self):
         return f"{self.session} - {self.exercise.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记下加载时的原始列表，保存时据此判断逐组明细是否需要重写
+        instance._sets_source = (
+            list(instance.__dict__.get('reps_completed') or []),
+            list(instance.__dict__.get('weights_used') or []),
+        )
+        return instance
+
+    def save(self, *args, **kwargs):
+        is_new = self._state.adding
+        # 同一事务内写入逐组明细，保证提交后 (on_commit) 的统计读到的是一致数据
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            self.sync_sets(is_new=is_new)
+
+    def set_rows(self):
+        return parse_set_rows(self.reps_completed, self.weights_used)
+
+    def build_sets(self):
+        """按当前 JSON 列表生成未保存的逐组明细 (批量写入时配合 bulk_create 使用)"""
+        return [
+            UserTrainingExerciseSet(record=self, set_index=index, reps=reps, weight=weight)
+            for index, reps, weight in self.set_rows()
+        ]
+
+    def sync_sets(self, is_new=False):
+        source = (list(self.reps_completed or []), list(self.weights_used or []))
+        if source == getattr(self, '_sets_source', None):
+            return
+        if not is_new:
+            self.sets.all().delete()
+        UserTrainingExerciseSet.objects.bulk_create(self.build_sets())
+        self._sets_source = source
+
+
+class UserTrainingExerciseSet(models.Model):
+    """训练动作记录的逐组明细，由 reps_completed / weights_used 在写入时解析得到，便于 SQL 聚合"""
+    record = models.ForeignKey(UserTrainingExerciseRecord, on_delete=models.CASCADE,
+                               related_name='sets', verbose_name="动作记录")
+    set_index = models.PositiveSmallIntegerField("组序号")
+    reps = models.IntegerField("完成次数", null=True, blank=True)
+    weight = models.FloatField("重量 (kg)", null=True, blank=True)
+
+    class Meta:
+        verbose_name = "训练组明细"
+        verbose_name_plural = "训练组明细"
+        unique_together = ('record', 'set_index')
+        ordering = ['record', 'set_index']
+
+    def __str__(self):
+        return f"{self.record_id} #{self.set_index + 1}: {self.reps} x {self.weight}"
+
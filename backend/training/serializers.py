@@ -2,18 +2,24 @@ from rest_framework import serializers
 from .models import TrainingPlan, TrainingPlanDay, TrainingPlanExercise, UserTrainingSession, UserTrainingExerciseRecord
 from exercises.models import Exercise
 from users.models import UserProfile
+from utils.media_derivatives import variant_url
 
 class TrainingPlanExerciseSerializer(serializers.ModelSerializer):
     """训练计划动作序列化器"""
     exercise_name = serializers.CharField(source='exercise.name', read_only=True)
 
     demo_gif = serializers.FileField(source='exercise.demo_gif', read_only=True)
+    demo_webp = serializers.SerializerMethodField()
     
     class Meta:
         model = TrainingPlanExercise
         fields = '__all__'
         read_only_fields = ('order',)
 
+    def get_demo_webp(self, obj):
+        """动画 WebP 版演示，尚未生成或演示为视频时为 None (使用 demo_gif)"""
+        return variant_url(self.context.get('request'), obj.exercise.demo_variants, 'animated')
+
 
 class TrainingPlanDaySerializer(serializers.ModelSerializer):
     """训练计划日序列化器"""
@@ -58,6 +64,50 @@ class UserTrainingExerciseRecordSerializer(serializers.ModelSerializer):
         read_only_fields = ('session', 'created_at')
 
 
+class BulkExerciseRecordItemSerializer(serializers.ModelSerializer):
+    """批量上传中的单条动作记录，外键先按 id 收集，由外层一次性校验"""
+    exercise = serializers.IntegerField()
+    plan_exercise = serializers.IntegerField(required=False, allow_null=True)
+
+    class Meta:
+        model = UserTrainingExerciseRecord
+        fields = ('exercise', 'plan_exercise', 'sets_completed', 'reps_completed',
+                  'weights_used', 'duration_seconds_actual', 'form_score', 'feedback')
+
+    def validate(self, attrs):
+        for field in ('reps_completed', 'weights_used'):
+            if not isinstance(attrs.get(field, []), list):
+                raise serializers.ValidationError({field: '必须是按组排列的列表'})
+        return attrs
+
+
+class BulkExerciseRecordSerializer(serializers.Serializer):
+    """批量上传训练动作记录 (一次训练中缓存的多组数据)"""
+    MAX_RECORDS = 200
+
+    session_id = serializers.IntegerField()
+    records = BulkExerciseRecordItemSerializer(many=True, allow_empty=False, max_length=MAX_RECORDS)
+
+    def validate_records(self, records):
+        # 整批只查两次库：动作、计划动作各一次 IN 查询
+        exercise_ids = {item['exercise'] for item in records}
+        exercises = Exercise.objects.in_bulk(exercise_ids)
+        missing = sorted(exercise_ids - set(exercises))
+        if missing:
+            raise serializers.ValidationError(f'动作不存在: {missing}')
+
+        plan_exercise_ids = {item['plan_exercise'] for item in records if item.get('plan_exercise')}
+        plan_exercises = TrainingPlanExercise.objects.in_bulk(plan_exercise_ids)
+        missing = sorted(plan_exercise_ids - set(plan_exercises))
+        if missing:
+            raise serializers.ValidationError(f'计划动作不存在: {missing}')
+
+        for item in records:
+            item['exercise'] = exercises[item['exercise']]
+            item['plan_exercise'] = plan_exercises.get(item.get('plan_exercise'))
+        return records
+
+
 class UserTrainingSessionSerializer(serializers.ModelSerializer):
     """用户训练会话序列化器"""
     plan_name = serializers.CharField(source='plan.name', read_only=True)
@@ -1,61 +1,53 @@
 import os
+import logging
 import requests
 import numpy as np
 import random
-from sklearn.metrics.pairwise import cosine_similarity
 from django.db.models import Q
 from users.models import UserProfile
+from users.profile_index import encode_profile, get_profile_index
 from training.models import UserTrainingSession
 from exercises.models import Exercise, ExerciseGraph, UserExerciseRecord
+from exercises.skill_tree import get_skill_tree, get_mastered_ids
 from utils.vector_db import VectorDB  
 
+logger = logging.getLogger(__name__)
+
+
 class UserSimilarityService:
     @staticmethod
     def get_user_vector(profile):
         """将用户画像转化为向量 [BMI, 年龄, 水平, 目标_增肌...]"""
         if not profile: return np.zeros(6)
-        
-        # 简单归一化
-        bmi = profile.weight / ((profile.height/100) ** 2) if profile.height else 20
-        norm_bmi = (bmi - 15) / 20  
-        norm_age = (profile.age - 15) / 45 if profile.age else 0.5
-        norm_level = 1.0 # 默认
-        
-        # 目标 One-hot
-        goal_vec = [0, 0, 0]
-        if profile.goal == '增肌': goal_vec[0] = 1
-        elif profile.goal == '减脂': goal_vec[1] = 1
-        else: goal_vec[2] = 1
-        
-        return np.array([norm_bmi, norm_age, norm_level] + goal_vec)
+        return encode_profile(profile.gender, profile.height, profile.weight, profile.age, profile.goal)
 
     @staticmethod
-    def recommend_for_cold_start(target_user):
-        """寻找相似大神，直接 Copy 他的高分计划"""
+    def recommend_for_cold_start(target_user, min_similarity=0.80, top_k=3):
+        """寻找相似大神，直接 Copy 他的高分计划 (在全量用户画像索引里做 kNN)"""
         try:
-            if not hasattr(target_user, 'userprofile'): return None
-            
-            target_profile = target_user.userprofile
-            target_vec = UserSimilarityService.get_user_vector(target_profile)
-
-            other_profiles = UserProfile.objects.exclude(user=target_user).order_by('-updated_at')[:50]
-            candidates = []
-            
-            for p in other_profiles:
-                if p.gender != target_profile.gender: continue 
-                
-                p_vec = UserSimilarityService.get_user_vector(p)
-                sim = cosine_similarity([target_vec], [p_vec])[0][0]
-                if sim > 0.80: 
-                    candidates.append((p.user, sim))
-            
-            candidates.sort(key=lambda x: x[1], reverse=True)
-
-            for user, sim in candidates[:3]:
-                best_session = UserTrainingSession.objects.filter(
-                    user=user, performance_score__gte=4.0
-                ).order_by('-performance_score').first()
-                
+            target_profile = getattr(target_user, 'profile', None)
+            if target_profile is None: return None
+
+            index = get_profile_index()
+            vec = None if index.vector_of(target_user.id) is not None else \
+                UserSimilarityService.get_user_vector(target_profile)
+            neighbours = [
+                (user_id, sim)
+                for user_id, sim in index.nearest(target_user.id, target_profile.gender, k=top_k, vec=vec)
+                if sim > min_similarity
+            ]
+            if not neighbours: return None
+
+            # 候选人的最佳会话一次查出，按相似度顺序取第一个带计划的
+            best_sessions = {}
+            for session in UserTrainingSession.objects.filter(
+                user_id__in=[user_id for user_id, _ in neighbours],
+                performance_score__gte=4.0,
+            ).select_related('plan').order_by('-performance_score'):
+                best_sessions.setdefault(session.user_id, session)
+
+            for user_id, sim in neighbours:
+                best_session = best_sessions.get(user_id)
                 if best_session and best_session.plan:
                     return {
                         "source": "similarity",
@@ -70,26 +62,31 @@ class UserSimilarityService:
 class SmartRecommendationService:
     
     @staticmethod
-    def get_safe_exercise(exercise, user_level):
+    def get_safe_exercise(exercise, user_level, skill_tree=None):
         """
-        技能树降级逻辑：如果动作太难，递归找前置
+        技能树降级逻辑：如果动作太难，查预计算的降级表找最近的安全前置
         """
         if not exercise: return None
         if exercise.level <= user_level:
             return exercise
 
-        prerequisites = exercise.prerequisites.all()
-        if not prerequisites.exists():
-            return exercise 
-            
-        print(f"🛡️ 触发风控: {exercise.name}(Lv.{exercise.level}) -> 降级...")
-        return SmartRecommendationService.get_safe_exercise(prerequisites.first(), user_level)
+        skill_tree = skill_tree or get_skill_tree()
+        safe_exercise = skill_tree.safe_substitute(exercise.id, user_level)
+        if safe_exercise is None:
+            return exercise
+
+        if safe_exercise.id != exercise.id:
+            # 推荐循环中对每个候选都会调用，只在 debug 级别记录
+            logger.debug("动作降级: %s(Lv.%s) -> %s(Lv.%s)",
+                         exercise.name, exercise.level, safe_exercise.name, safe_exercise.level)
+        return safe_exercise
 
     @staticmethod
     def generate_chain_plan(seed_query, user_level, target_muscle, count=4):
 
         plan = []
         used_ids = set()
+        skill_tree = get_skill_tree()
 
         db = VectorDB()
         seed_ids = db.search(seed_query, top_k=10)
@@ -107,7 +104,7 @@ class SmartRecommendationService:
 
         if not seed_ex: return [] 
 
-        safe_seed = SmartRecommendationService.get_safe_exercise(seed_ex, user_level)
+        safe_seed = SmartRecommendationService.get_safe_exercise(seed_ex, user_level, skill_tree)
         plan.append(safe_seed)
         used_ids.add(safe_seed.id)
 
@@ -124,7 +121,7 @@ class SmartRecommendationService:
                 ).exclude(id__in=used_ids).order_by('?').first()
             
             if candidate and candidate.id not in used_ids:
-                safe_candidate = SmartRecommendationService.get_safe_exercise(candidate, user_level)
+                safe_candidate = SmartRecommendationService.get_safe_exercise(candidate, user_level, skill_tree)
                 plan.append(safe_candidate)
                 used_ids.add(safe_candidate.id)
                 current = safe_candidate
@@ -141,23 +138,16 @@ class SmartRecommendationService:
     @staticmethod
     def verify_manual_selection(user, exercise_ids, pass_score=80.0):
         """严格校验用户手动选择的动作是否达标"""
-        exercises = Exercise.objects.filter(id__in=exercise_ids)
+        skill_tree = get_skill_tree()
+        mastered_bits = skill_tree.mask_of(get_mastered_ids(user, pass_score))
         locked_reasons = []
 
-        for ex in exercises:
-            prereqs = ex.prerequisites.all()
-            if not prereqs.exists():
-                continue
-            
-            for req in prereqs:
-                has_passed = UserExerciseRecord.objects.filter(
-                    user=user,
-                    exercise=req,
-                    accuracy_score__gte=pass_score
-                ).exists()
-
-                if not has_passed:
-                    locked_reasons.append(f"【{ex.name}】未解锁：需先以{pass_score}分完成前置【{req.name}】")
+        selected_ids = [int(i) for i in exercise_ids if str(i).isdigit()]
+        for ex_id in skill_tree.ids_of(skill_tree.mask_of(selected_ids)):
+            ex = skill_tree.exercises[ex_id]
+            for req_id in skill_tree.missing_direct_prerequisites(ex_id, mastered_bits):
+                req = skill_tree.exercises[req_id]
+                locked_reasons.append(f"【{ex.name}】未解锁：需先以{pass_score}分完成前置【{req.name}】")
 
         return len(locked_reasons) == 0, locked_reasons
     
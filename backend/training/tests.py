@@ -1,3 +1,116 @@
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
 
-# Create your tests here.
+from analytics.models import ExerciseProgress
+from exercises.models import Exercise
+from recommendations.views import user_status_view
+from training.models import UserTrainingExerciseRecord, UserTrainingSession, parse_set_rows
+
+
+class BulkExerciseRecordAPITests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="bulk_tester", password="pwd123456")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.session = UserTrainingSession.objects.create(user=self.user, start_time=timezone.now())
+        self.squat = Exercise.objects.create(
+            name="深蹲", description="描述", target_muscle="legs", instructions="要领", level=1,
+        )
+        self.pushup = Exercise.objects.create(
+            name="俯卧撑", description="描述", target_muscle="chest", instructions="要领", level=1,
+        )
+
+    def test_bulk_create_records_and_progress(self):
+        payload = {
+            "session_id": self.session.id,
+            "records": [
+                {"exercise": self.squat.id, "sets_completed": 2, "reps_completed": [10, 8], "weights_used": [40, 50]},
+                {"exercise": self.squat.id, "sets_completed": 1, "reps_completed": [12], "weights_used": [30]},
+                {"exercise": self.pushup.id, "sets_completed": 1, "reps_completed": [20], "weights_used": [0]},
+            ],
+        }
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post("/api/training/exercise-records/bulk/", payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(response.data["created"], 3)
+        self.assertEqual(UserTrainingExerciseRecord.objects.filter(session=self.session).count(), 3)
+
+        progress = ExerciseProgress.objects.get(user=self.user, exercise=self.squat)
+        self.assertEqual(progress.max_weight, 50)
+        self.assertEqual(progress.max_reps, 12)
+        self.assertEqual(progress.total_volume, 40 * 10 + 50 * 8 + 30 * 12)
+        self.assertEqual(ExerciseProgress.objects.filter(user=self.user).count(), 2)
+
+    def test_invalid_item_rejects_whole_batch(self):
+        payload = {
+            "session_id": self.session.id,
+            "records": [
+                {"exercise": self.squat.id, "reps_completed": [10], "weights_used": [40]},
+                {"exercise": 999999, "reps_completed": [10], "weights_used": [40]},
+            ],
+        }
+        response = self.client.post("/api/training/exercise-records/bulk/", payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UserTrainingExerciseRecord.objects.exists())
+
+
+class ExerciseSetStorageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="set_tester", password="pwd123456")
+        self.session = UserTrainingSession.objects.create(user=self.user, start_time=timezone.now())
+        self.squat = Exercise.objects.create(
+            name="箱式深蹲", description="描述", target_muscle="legs", instructions="要领", level=1,
+        )
+
+    def test_parse_set_rows_keeps_positions(self):
+        self.assertEqual(
+            parse_set_rows([10, "8", "x"], [20, "22.5"]),
+            [(0, 10, 20.0), (1, 8, 22.5), (2, None, None)],
+        )
+
+    def test_sets_follow_record_writes(self):
+        record = UserTrainingExerciseRecord.objects.create(
+            session=self.session, exercise=self.squat, reps_completed=[10, 8], weights_used=[40, 50],
+        )
+        self.assertEqual(list(record.sets.values_list("reps", "weight")), [(10, 40.0), (8, 50.0)])
+
+        record = UserTrainingExerciseRecord.objects.get(pk=record.pk)
+        record.form_score = 88
+        with CaptureQueriesContext(connection) as queries:
+            record.save()
+        # 每组数据未变时不重写明细表
+        self.assertFalse(any("usertrainingexerciseset" in q["sql"] for q in queries.captured_queries))
+
+        record.reps_completed = [12]
+        record.weights_used = [45]
+        record.save()
+        self.assertEqual(list(record.sets.values_list("reps", "weight")), [(12, 45.0)])
+
+    def test_status_view_reads_muscle_volume_rollup(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            record = UserTrainingExerciseRecord.objects.create(
+                session=self.session, exercise=self.squat, reps_completed=[10, 10], weights_used=[60, 90],
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            UserTrainingExerciseRecord.objects.create(
+                session=self.session, exercise=self.squat, reps_completed=[20], weights_used=[],
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            record.delete()
+
+        request = APIRequestFactory().get("/", {"view": "heatmap", "days": 3})
+        force_authenticate(request, user=self.user)
+        response = user_status_view(request)
+        self.assertEqual(response.status_code, 200)
+        legs = next(item for item in response.data["volume_stats"] if item["muscle"] == "legs")
+        self.assertEqual(legs["volume"], 400.0)  # 自重组按 20kg 折算
+        self.assertEqual(len(response.data["volume_stats"]), len(Exercise.TARGET_MUSCLE_CHOICES))
+
+        heatmap = response.data["heatmap"]
+        self.assertEqual(len(heatmap["dates"]), 3)
+        self.assertEqual(heatmap["values"][heatmap["muscles"].index("legs")][-1], 400.0)
@@ -15,6 +15,7 @@ urlpatterns = [
     
     # 训练动作记录相关路由
     path('exercise-records/', views.record_training_exercise, name='record-training-exercise'),
+    path('exercise-records/bulk/', views.bulk_record_training_exercises, name='bulk-record-training-exercises'),
     path('exercise-records/<int:record_id>/', views.delete_training_exercise_record, name='delete-training-exercise-record'),
     
     # 用户统计数据路由
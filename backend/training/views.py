@@ -6,26 +6,30 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from .services import SmartRecommendationService 
 from django.shortcuts import get_object_or_404
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import timedelta
 import json 
 from openai import OpenAI  
 from utils.vector_db import VectorDB
+from utils.media_derivatives import DEMO_CARD_WIDTH, pick_variant, variant_url
 import os
 from .services import UserSimilarityService, SmartRecommendationService
 
-from .models import TrainingPlan, TrainingPlanDay, TrainingPlanExercise, UserTrainingSession, UserTrainingExerciseRecord
+from .models import TrainingPlan, TrainingPlanDay, TrainingPlanExercise, UserTrainingSession, UserTrainingExerciseRecord, UserTrainingExerciseSet
 from .serializers import (
     TrainingPlanSerializer,
     TrainingPlanDetailSerializer,
     TrainingPlanDaySerializer,
     UserTrainingSessionSerializer,
     UserTrainingSessionDetailSerializer,
-    UserTrainingExerciseRecordSerializer
+    UserTrainingExerciseRecordSerializer,
+    BulkExerciseRecordSerializer
 )
 from exercises.models import Exercise
-from users.models import UserProfile
+from users.models import UserProfile, UserStats
 
 DEEPSEEK_API_KEY = os.environ.get("DEEPSEEK_API_KEY")
 
@@ -256,6 +260,43 @@ def record_training_exercise(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_record_training_exercises(request):
+    """
+    批量记录训练动作 (客户端离线缓存的多组数据一次性上传)
+
+    整批校验通过后在一个事务内 bulk_create；bulk_create 不会触发 post_save，
+    这里把整批增量交给进步追踪聚合器，提交后每个 (动作, 日期) 只写一次。
+    """
+    from analytics.services import ExerciseProgressAggregator
+
+    serializer = BulkExerciseRecordSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    session = get_object_or_404(
+        UserTrainingSession, id=serializer.validated_data['session_id'], user=request.user
+    )
+    if session.is_completed:
+        return Response({'error': '训练会话已结束，无法添加记录'}, status=status.HTTP_400_BAD_REQUEST)
+
+    with transaction.atomic():
+        records = UserTrainingExerciseRecord.objects.bulk_create([
+            UserTrainingExerciseRecord(session=session, **item)
+            for item in serializer.validated_data['records']
+        ])
+        UserTrainingExerciseSet.objects.bulk_create(
+            [exercise_set for record in records for exercise_set in record.build_sets()]
+        )
+        ExerciseProgressAggregator.add_records(session.user_id, records)
+
+    return Response({
+        'created': len(records),
+        'records': UserTrainingExerciseRecordSerializer(records, many=True).data,
+    }, status=status.HTTP_201_CREATED)
+
+
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_training_exercise_record(request, record_id):
@@ -277,37 +318,25 @@ def user_training_stats(request):
     """获取用户训练统计数据"""
     user = request.user
     
-    try:
-        profile = UserProfile.objects.get(user=user)
-    except UserProfile.DoesNotExist:
-        profile = None
-    
-    # 统计用户的训练数据
-    total_sessions = UserTrainingSession.objects.filter(user=user, is_completed=True).count()
-    
-    # 计算总训练时长
-    sessions_with_duration = UserTrainingSession.objects.filter(
-        user=user, 
-        is_completed=True
-    ).exclude(end_time=None).exclude(start_time=None)
-    
-    total_duration = 0
-    for session in sessions_with_duration:
-        total_duration += (session.end_time - session.start_time).total_seconds()
-    
-    total_calories = UserTrainingSession.objects.filter(user=user, is_completed=True).aggregate(
-        Sum('calories_burned')
-    )['calories_burned__sum'] or 0
-    
-    best_record = UserTrainingSession.objects.filter(user=user, is_completed=True).order_by('-performance_score').first()
-    
-    # 最近7天的训练次数
+    # 统计数据由 UserStats 在训练完成时增量维护，这里只读一行 (连同画像)；
+    # weekly_sessions 保持“最近 7 天 (按开始时间)”的滚动口径，用子查询在同一条 SQL 中计数
     week_ago = timezone.now() - timedelta(days=7)
-    weekly_sessions = UserTrainingSession.objects.filter(
-        user=user, 
-        is_completed=True, 
-        start_time__gte=week_ago
-    ).count()
+    recent_sessions = UserTrainingSession.objects.filter(
+        user=OuterRef('user'), is_completed=True, start_time__gte=week_ago
+    ).values('user').annotate(count=Count('id')).values('count')
+    user_stats, _ = UserStats.objects.select_related('user__profile').annotate(
+        rolling_week_sessions=Coalesce(Subquery(recent_sessions), 0)
+    ).get_or_create(user=user)
+    user_stats.roll_windows()
+    weekly_sessions = getattr(user_stats, 'rolling_week_sessions', None)
+    if weekly_sessions is None:
+        # 刚创建的统计行没有注解结果
+        weekly_sessions = UserTrainingSession.objects.filter(
+            user=user, is_completed=True, start_time__gte=week_ago
+        ).count()
+    profile = getattr(user_stats.user, 'profile', None)
+
+    total_duration = user_stats.total_training_seconds
     
     stats = {
         'profile_info': {
@@ -318,13 +347,18 @@ def user_training_stats(request):
             'weight': profile.weight if profile else 0,
             'fitness_level': profile.fitness_level if profile else '',
         } if profile else None,
-        'total_sessions': total_sessions,
+        'total_sessions': user_stats.total_trainings,
         'total_duration': int(total_duration),  # 转换为整数秒
         'total_duration_formatted': str(timedelta(seconds=int(total_duration))),  # 格式化时间
         'weekly_sessions': weekly_sessions,
-        'total_calories': round(total_calories, 2),
-        'best_performance_score': best_record.performance_score if best_record else 0,
-        'favorite_plan': best_record.plan.name if best_record and best_record.plan else '',
+        # 自然周 / 自然月的计数
+        'this_week_sessions': user_stats.calendar_week_trainings,
+        'this_month_sessions': user_stats.calendar_month_trainings,
+        'current_streak': user_stats.current_training_streak,
+        'longest_streak': user_stats.longest_training_streak,
+        'total_calories': round(user_stats.total_calories_burned, 2),
+        'best_performance_score': user_stats.best_performance_score,
+        'favorite_plan': user_stats.best_plan_name,
     }
     
     return Response(stats, status=status.HTTP_200_OK)
@@ -452,6 +486,8 @@ def generate_smart_plan(request):
                     "sets": rec.sets_completed or 3,
                     "reps": "8-12次",
                     "gif": ex.demo_gif.url if ex.demo_gif else "",
+                    "webp": variant_url(request, ex.demo_variants, 'animated') or "",
+                    "poster": pick_variant(request, ex.demo_variants, DEMO_CARD_WIDTH, prefix='poster_') or "",
                     "img": ex.image_url if hasattr(ex, 'image_url') else "",
                     "ai_desc": f"大神同款：{cold_start_result.get('report_summary', '经典训练')}"
                 })
@@ -524,6 +560,8 @@ def generate_smart_plan(request):
                 "sets": 3,
                 "reps": "8-12次",
                 "gif": ex.demo_gif.url if ex.demo_gif else "",
+                "webp": variant_url(request, ex.demo_variants, 'animated') or "",
+                "poster": pick_variant(request, ex.demo_variants, DEMO_CARD_WIDTH, prefix='poster_') or "",
                 "img": ex.image_url if hasattr(ex, 'image_url') else "",
                 "ai_desc": f"适合Lv.{user_level}的进阶动作"
             })
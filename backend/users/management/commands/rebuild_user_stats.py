@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from users.services import UserStatsService
+
+
+class Command(BaseCommand):
+    help = '用分组聚合 SQL 全量对账重建 UserStats (总量、连续天数、周/月计数)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='只重建指定用户 ID，可重复传入')
+
+    def handle(self, *args, **options):
+        user_ids = options.get('user_ids')
+        self.stdout.write("正在重建用户统计数据...")
+        count = UserStatsService.rebuild(user_ids=user_ids)
+        self.stdout.write(self.style.SUCCESS(f"已重建 {count} 位用户的统计数据。"))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_userprofile_avatar"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userstats",
+            name="best_performance_score",
+            field=models.FloatField(default=0.0, verbose_name="最佳训练表现评分"),
+        ),
+        migrations.AddField(
+            model_name="userstats",
+            name="best_plan_name",
+            field=models.CharField(
+                blank=True, default="", max_length=100, verbose_name="最佳表现对应计划"
+            ),
+        ),
+        migrations.AddField(
+            model_name="userstats",
+            name="current_training_streak",
+            field=models.IntegerField(default=0, verbose_name="当前连续训练天数"),
+        ),
+        migrations.AddField(
+            model_name="userstats",
+            name="last_training_date",
+            field=models.DateField(blank=True, null=True, verbose_name="最近训练日期"),
+        ),
+        migrations.AddField(
+            model_name="userstats",
+            name="month_start",
+            field=models.DateField(blank=True, null=True, verbose_name="本月起始日"),
+        ),
+        migrations.AddField(
+            model_name="userstats",
+            name="total_training_seconds",
+            field=models.IntegerField(default=0, verbose_name="总训练时长(秒)"),
+        ),
+        migrations.AddField(
+            model_name="userstats",
+            name="week_start",
+            field=models.DateField(blank=True, null=True, verbose_name="本周起始日"),
+        ),
+    ]
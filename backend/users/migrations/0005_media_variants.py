@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_userstats_incremental_fields"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="avatar_variants",
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name="头像缩略图"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0005_media_variants"),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name="userstats",
+            old_name="weekly_trainings",
+            new_name="calendar_week_trainings",
+        ),
+        migrations.RenameField(
+            model_name="userstats",
+            old_name="monthly_trainings",
+            new_name="calendar_month_trainings",
+        ),
+    ]
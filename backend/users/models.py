@@ -2,6 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
+from datetime import timedelta
 from exercises.models import Exercise
 
 class UserProfile(models.Model):
@@ -15,6 +17,7 @@ class UserProfile(models.Model):
     
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     avatar = models.ImageField("头像", upload_to='avatars/', null=True, blank=True)
+    avatar_variants = models.JSONField("头像缩略图", default=dict, blank=True, editable=False)
     nickname = models.CharField("昵称", max_length=50, blank=True)
     gender = models.CharField("性别", max_length=10, choices=[('male', '男'), ('female', '女')], default='male')
     age = models.IntegerField("年龄", default=20)
@@ -117,13 +120,22 @@ class UserStats(models.Model):
     total_training_time = models.IntegerField("总训练时长(分钟)", default=0)
     total_calories_burned = models.FloatField("总消耗卡路里", default=0.0)
     
+    total_training_seconds = models.IntegerField("总训练时长(秒)", default=0)
+    
     # 最佳记录
     best_accuracy_score = models.FloatField("最佳动作准确度", default=0.0)
+    best_performance_score = models.FloatField("最佳训练表现评分", default=0.0)
+    best_plan_name = models.CharField("最佳表现对应计划", max_length=100, blank=True, default="")
     longest_training_streak = models.IntegerField("最长连续训练天数", default=0)
+    current_training_streak = models.IntegerField("当前连续训练天数", default=0)
+    last_training_date = models.DateField("最近训练日期", null=True, blank=True)
     
-    # 周/月统计
-    weekly_trainings = models.IntegerField("本周训练次数", default=0)
-    monthly_trainings = models.IntegerField("本月训练次数", default=0)
+    # 自然周/自然月计数 (不是滚动窗口)：跨周/跨月后按窗口起始日归零。
+    # 需要“最近 7 天”这类滚动口径时在读取时按会话计数，见 training.views.user_training_stats
+    calendar_week_trainings = models.IntegerField("本周训练次数", default=0)
+    calendar_month_trainings = models.IntegerField("本月训练次数", default=0)
+    week_start = models.DateField("本周起始日", null=True, blank=True)
+    month_start = models.DateField("本月起始日", null=True, blank=True)
     
     last_updated = models.DateTimeField(auto_now=True)
     
@@ -134,6 +146,62 @@ class UserStats(models.Model):
     def __str__(self):
         return f"{self.user.username} 的统计数据"
 
+    @staticmethod
+    def window_starts(day):
+        """返回 day 所在自然周 (周一) 与自然月的起始日"""
+        return day - timedelta(days=day.weekday()), day.replace(day=1)
+
+    def roll_windows(self, today=None):
+        """
+        读取前把过期的自然周/自然月计数与连续天数归零 (只改内存中的值)
+
+        计数只在训练完成时写入，若本周还没有训练，库里保存的仍是上周的值。
+        """
+        today = today or timezone.localdate()
+        week_start, month_start = self.window_starts(today)
+        if self.week_start != week_start:
+            self.calendar_week_trainings = 0
+            self.week_start = week_start
+        if self.month_start != month_start:
+            self.calendar_month_trainings = 0
+            self.month_start = month_start
+        if self.last_training_date is None or (today - self.last_training_date).days > 1:
+            self.current_training_streak = 0
+        return self
+
+    def apply_session(self, day, duration_seconds, calories, performance_score=0.0, plan_name=""):
+        """
+        以 O(1) 增量合入一次完成的训练
+
+        day 早于 last_training_date 的乱序补录无法增量维护连续天数，返回 False，
+        由调用方改走全量重算。
+        """
+        if self.last_training_date and day < self.last_training_date:
+            return False
+
+        self.total_trainings += 1
+        self.total_training_seconds += int(duration_seconds)
+        self.total_training_time = self.total_training_seconds // 60
+        self.total_calories_burned += float(calories or 0)
+
+        if self.last_training_date != day:
+            self.total_training_days += 1
+            if self.last_training_date and (day - self.last_training_date).days == 1:
+                self.current_training_streak += 1
+            else:
+                self.current_training_streak = 1
+            self.last_training_date = day
+        self.longest_training_streak = max(self.longest_training_streak, self.current_training_streak)
+
+        self.roll_windows(today=day)
+        self.calendar_week_trainings += 1
+        self.calendar_month_trainings += 1
+
+        if performance_score and performance_score > self.best_performance_score:
+            self.best_performance_score = performance_score
+            self.best_plan_name = plan_name or ""
+        return True
+
 @receiver(post_save, sender=User)
 def create_user_stats(sender, instance, created, **kwargs):
     if created:
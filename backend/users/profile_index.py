@@ -0,0 +1,243 @@
+"""
+全量用户画像向量的进程内 kNN 索引
+
+冷启动推荐需要在所有用户里找体型、目标相近的人。这里把画像一次性编码成
+float32 矩阵 (每行已做 L2 归一化，点积即余弦相似度)，按性别分区存放，
+画像保存时原地更新对应行；其他进程通过缓存中的版本号感知变化后重建。
+"""
+import time
+
+import numpy as np
+from django.core.cache import cache
+from sklearn.neighbors import BallTree
+
+from .models import UserGoal, UserProfile
+
+PROFILE_INDEX_VERSION_KEY = "users:profile_index_version"
+
+# 向量维度: [BMI, 年龄, 水平, 目标_增肌, 目标_减脂, 目标_其他]
+VECTOR_DIM = 6
+
+# 分区人数超过该值时改用 BallTree 查询，小分区直接矩阵乘法更快
+BALL_TREE_MIN_SIZE = 50000
+
+
+def encode_profile(gender, height, weight, age, goal_type=None):
+    """把单个画像编码为未归一化的向量，与批量编码保持同一套公式"""
+    bmi = weight / ((height / 100) ** 2) if height else 20
+    vec = np.zeros(VECTOR_DIM, dtype=np.float32)
+    vec[0] = (bmi - 15) / 20
+    vec[1] = (age - 15) / 45 if age else 0.5
+    vec[2] = 1.0  # 默认水平
+    if goal_type == 'muscle_gain':
+        vec[3] = 1
+    elif goal_type == 'weight_loss':
+        vec[4] = 1
+    else:
+        vec[5] = 1
+    return vec
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return (matrix / norms).astype(np.float32)
+
+
+def active_goals(user_ids=None):
+    """每个用户当前激活的目标 (与 UserProfile.goal 一样取 pk 最小的一条)，一次查询"""
+    goals = UserGoal.objects.filter(is_active=True)
+    if user_ids is not None:
+        goals = goals.filter(user_id__in=user_ids)
+    result = {}
+    for user_id, goal_type in goals.order_by('user_id', 'pk').values_list('user_id', 'goal_type'):
+        result.setdefault(user_id, goal_type)
+    return result
+
+
+class _Partition:
+    """单个性别分区：容量倍增的矩阵 + 行号索引，增删都是均摊 O(1)"""
+
+    def __init__(self, user_ids, matrix):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.matrix = matrix
+        self.size = len(user_ids)
+        self.position = {int(uid): i for i, uid in enumerate(self.user_ids)}
+        self._ball_tree = None
+
+    def upsert(self, user_id, vec):
+        row = self.position.get(user_id)
+        if row is None:
+            if self.size == len(self.user_ids):
+                capacity = max(16, self.size * 2)
+                self.user_ids = np.resize(self.user_ids, capacity)
+                matrix = np.zeros((capacity, VECTOR_DIM), dtype=np.float32)
+                matrix[:self.size] = self.matrix[:self.size]
+                self.matrix = matrix
+            row = self.size
+            self.size += 1
+            self.position[user_id] = row
+            self.user_ids[row] = user_id
+        self.matrix[row] = vec
+        self._ball_tree = None
+
+    def remove(self, user_id):
+        row = self.position.pop(user_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            # 用最后一行填补空位
+            moved = int(self.user_ids[last])
+            self.user_ids[row] = moved
+            self.matrix[row] = self.matrix[last]
+            self.position[moved] = row
+        self.size = last
+        self._ball_tree = None
+
+    def nearest(self, target, k, exclude_id=None):
+        """返回 [(user_id, 余弦相似度)]，按相似度降序"""
+        if self.size == 0:
+            return []
+        limit = k
+        k = min(k + (1 if exclude_id in self.position else 0), self.size)
+
+        if self.size >= BALL_TREE_MIN_SIZE:
+            if self._ball_tree is None:
+                self._ball_tree = BallTree(self.matrix[:self.size])
+            dist, rows = self._ball_tree.query(target.reshape(1, -1), k=k)
+            # 单位向量之间: cos = 1 - d^2 / 2
+            sims, rows = 1 - dist[0] ** 2 / 2, rows[0]
+        else:
+            scores = self.matrix[:self.size] @ target
+            rows = np.argpartition(-scores, k - 1)[:k] if k < self.size else np.arange(self.size)
+            rows = rows[np.argsort(-scores[rows], kind='stable')]
+            sims = scores[rows]
+
+        return [
+            (int(self.user_ids[row]), float(sim))
+            for row, sim in zip(rows, sims)
+            if int(self.user_ids[row]) != exclude_id
+        ][:limit]
+
+
+class ProfileIndex:
+    def __init__(self, rows, goals, version=None):
+        """rows: [(user_id, gender, height, weight, age), ...]"""
+        self.version = version
+        self.gender_of = {}
+        self.partitions = {}
+
+        grouped = {}
+        for user_id, gender, height, weight, age in rows:
+            self.gender_of[user_id] = gender
+            grouped.setdefault(gender, []).append((user_id, height, weight, age))
+
+        for gender, items in grouped.items():
+            user_ids = [item[0] for item in items]
+            height = np.array([item[1] or 0 for item in items], dtype=np.float32)
+            weight = np.array([item[2] or 0 for item in items], dtype=np.float32)
+            age = np.array([item[3] or 0 for item in items], dtype=np.float32)
+
+            # 与 encode_profile 相同的公式，整列一次算完
+            matrix = np.zeros((len(items), VECTOR_DIM), dtype=np.float32)
+            has_height = height > 0
+            safe_height = np.where(has_height, height, 1)
+            bmi = np.where(has_height, weight / (safe_height / 100) ** 2, 20)
+            matrix[:, 0] = (bmi - 15) / 20
+            matrix[:, 1] = np.where(age > 0, (age - 15) / 45, 0.5)
+            matrix[:, 2] = 1.0
+            goal_col = np.array([
+                {'muscle_gain': 3, 'weight_loss': 4}.get(goals.get(uid), 5) for uid in user_ids
+            ])
+            matrix[np.arange(len(items)), goal_col] = 1
+            self.partitions[gender] = _Partition(user_ids, _normalize(matrix))
+
+    @classmethod
+    def from_db(cls, version=None):
+        rows = UserProfile.objects.values_list('user_id', 'gender', 'height', 'weight', 'age')
+        return cls(rows.iterator(chunk_size=5000), active_goals(), version=version)
+
+    def __len__(self):
+        return sum(p.size for p in self.partitions.values())
+
+    def vector_of(self, user_id):
+        gender = self.gender_of.get(user_id)
+        if gender is None:
+            return None
+        partition = self.partitions[gender]
+        return partition.matrix[partition.position[user_id]]
+
+    def upsert(self, user_id, gender, vec):
+        old_gender = self.gender_of.get(user_id)
+        if old_gender is not None and old_gender != gender:
+            self.partitions[old_gender].remove(user_id)
+        self.gender_of[user_id] = gender
+        if gender not in self.partitions:
+            self.partitions[gender] = _Partition([], np.zeros((0, VECTOR_DIM), dtype=np.float32))
+        self.partitions[gender].upsert(user_id, _normalize(vec))
+
+    def remove(self, user_id):
+        gender = self.gender_of.pop(user_id, None)
+        if gender is not None:
+            self.partitions[gender].remove(user_id)
+
+    def nearest(self, user_id, gender, k=10, vec=None):
+        """同性别分区内的 k 个最相似用户 (不含自己)"""
+        partition = self.partitions.get(gender)
+        if partition is None:
+            return []
+        target = self.vector_of(user_id) if vec is None else _normalize(vec)
+        if target is None:
+            return []
+        return partition.nearest(target, k, exclude_id=user_id)
+
+
+_profile_index = None
+
+
+def get_profile_index_version():
+    version = cache.get(PROFILE_INDEX_VERSION_KEY)
+    if version is None:
+        cache.add(PROFILE_INDEX_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(PROFILE_INDEX_VERSION_KEY)
+    return version
+
+
+def get_profile_index():
+    """获取当前版本的画像索引，版本过期时从数据库重建"""
+    global _profile_index
+    version = get_profile_index_version()
+    if _profile_index is None or _profile_index.version != version:
+        _profile_index = ProfileIndex.from_db(version=version)
+    return _profile_index
+
+
+def _publish_change(apply):
+    """
+    本进程原地更新索引后递增版本号；只有在版本恰好连续时才沿用本地索引，
+    否则说明期间有别的进程改过数据，下次访问时整体重建。
+    """
+    local = _profile_index
+    old_version = get_profile_index_version()
+    if local is not None and local.version == old_version:
+        apply(local)
+    try:
+        new_version = cache.incr(PROFILE_INDEX_VERSION_KEY)
+    except ValueError:
+        new_version = None
+        cache.set(PROFILE_INDEX_VERSION_KEY, int(time.time() * 1000), timeout=None)
+    if local is not None:
+        local.version = new_version if local.version == old_version and new_version == old_version + 1 else None
+
+
+def update_profile_vector(profile, goal_type=None):
+    """画像或目标变化后调用：更新该用户的向量行"""
+    if goal_type is None:
+        goal_type = active_goals([profile.user_id]).get(profile.user_id)
+    vec = encode_profile(profile.gender, profile.height, profile.weight, profile.age, goal_type)
+    _publish_change(lambda index: index.upsert(profile.user_id, profile.gender, vec))
+
+
+def remove_profile_vector(user_id):
+    _publish_change(lambda index: index.remove(user_id))
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import UserProfile, TrainingLog, UserGoal, UserStats
+from utils.media_derivatives import AVATAR_DISPLAY_SIZE, VariantURLsField, pick_variant
 
 class UserRegisterSerializer(serializers.ModelSerializer):
     password_confirm = serializers.CharField(write_only=True)
@@ -29,14 +30,19 @@ class UserProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', required=False)
     avatar = serializers.ImageField(required=False, allow_null=True)
+    avatar_thumb = serializers.SerializerMethodField()
+    avatar_variants = VariantURLsField()
     
     class Meta:
         model = UserProfile
-        fields = ('username', 'email', 'avatar', 'nickname', 'gender', 'age', 'height', 'weight', 
+        fields = ('username', 'email', 'avatar', 'avatar_thumb', 'avatar_variants', 'nickname', 'gender', 'age', 'height', 'weight', 
                   'injury_history', 'fitness_level', 'activity_level', 'target_weight',
                   'target_date', 'daily_calorie_intake', 'daily_calorie_burn', 'bmi', 'bmr')
         read_only_fields = ('bmi', 'bmr')
 
+    def get_avatar_thumb(self, obj):
+        """按客户端像素密度挑选的 WebP 缩略图，尚未生成时为 None (使用 avatar 原图)"""
+        return pick_variant(self.context.get('request'), obj.avatar_variants, AVATAR_DISPLAY_SIZE)
     def update(self, instance, validated_data):
         user_data = validated_data.pop('user', {})
         email = user_data.get('email')
@@ -0,0 +1,145 @@
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from exercises.models import UserExerciseRecord
+from training.models import UserTrainingSession
+from .models import UserStats
+
+
+def _as_datetime(value):
+    # complete_training_session 允许前端直接传 end_time 字符串
+    if isinstance(value, str):
+        return parse_datetime(value)
+    return value
+
+
+class UserStatsService:
+    """UserStats 的增量维护与全量对账"""
+
+    @staticmethod
+    def session_day(session):
+        return timezone.localtime(session.start_time).date()
+
+    @staticmethod
+    def session_duration_seconds(session):
+        start_time, end_time = _as_datetime(session.start_time), _as_datetime(session.end_time)
+        if not start_time or not end_time:
+            return 0
+        return max(int((end_time - start_time).total_seconds()), 0)
+
+    @staticmethod
+    def record_completed_session(session):
+        """训练会话完成时调用：锁定统计行，按 O(1) 增量更新"""
+        with transaction.atomic():
+            stats, _ = UserStats.objects.select_for_update().get_or_create(user_id=session.user_id)
+            applied = stats.apply_session(
+                day=UserStatsService.session_day(session),
+                duration_seconds=UserStatsService.session_duration_seconds(session),
+                calories=session.calories_burned,
+                performance_score=float(session.performance_score or 0),
+                plan_name=session.plan.name if session.plan_id else "",
+            )
+            if applied:
+                stats.save()
+                return stats
+
+        # 乱序补录的会话无法增量维护连续天数，退回到单用户重算
+        UserStatsService.rebuild(user_ids=[session.user_id])
+        return UserStats.objects.get(user_id=session.user_id)
+
+    @staticmethod
+    def record_accuracy(user_id, accuracy_score):
+        """动作准确度只需维护最大值，一条条件 UPDATE 即可"""
+        UserStats.objects.filter(
+            user_id=user_id, best_accuracy_score__lt=accuracy_score
+        ).update(best_accuracy_score=accuracy_score, last_updated=timezone.now())
+
+    @staticmethod
+    def rebuild(user_ids=None, today=None):
+        """
+        用分组聚合 SQL 全量重建 UserStats，返回更新的行数
+
+        总量、周/月计数、最佳成绩均由数据库按用户分组算出；连续天数需要按日期
+        顺序扫描，这里只流式读取 (用户, 训练日) 去重后的有序结果。
+        """
+        today = today or timezone.localdate()
+        week_start, month_start = UserStats.window_starts(today)
+
+        sessions = UserTrainingSession.objects.filter(is_completed=True)
+        records = UserExerciseRecord.objects.all()
+        stats_rows = UserStats.objects.all()
+        if user_ids is not None:
+            sessions = sessions.filter(user_id__in=user_ids)
+            records = records.filter(user_id__in=user_ids)
+            stats_rows = stats_rows.filter(user_id__in=user_ids)
+
+        duration = ExpressionWrapper(F('end_time') - F('start_time'), output_field=DurationField())
+        totals = {
+            row['user_id']: row
+            for row in sessions.annotate(day=TruncDate('start_time')).values('user_id').annotate(
+                trainings=Count('id'),
+                training_days=Count('day', distinct=True),
+                duration=Sum(duration, filter=Q(end_time__isnull=False)),
+                calories=Sum('calories_burned'),
+                best_performance=Max('performance_score'),
+                weekly=Count('id', filter=Q(day__gte=week_start)),
+                monthly=Count('id', filter=Q(day__gte=month_start)),
+            )
+        }
+        best_accuracy = dict(
+            records.values('user_id').annotate(best=Max('accuracy_score')).values_list('user_id', 'best')
+        )
+
+        streaks = {}
+        days = sessions.annotate(day=TruncDate('start_time')).values_list('user_id', 'day').distinct().order_by('user_id', 'day')
+        for user_id, day in days.iterator(chunk_size=2000):
+            longest, current, last = streaks.get(user_id, (0, 0, None))
+            current = current + 1 if last and (day - last).days == 1 else 1
+            streaks[user_id] = (max(longest, current), current, day)
+
+        # 补齐缺失的统计行，再连同最佳表现对应的计划名一次读出
+        missing_ids = (set(totals) | set(best_accuracy)) - set(stats_rows.values_list('user_id', flat=True))
+        if missing_ids:
+            UserStats.objects.bulk_create([UserStats(user_id=uid) for uid in missing_ids], ignore_conflicts=True)
+
+        best_plan = sessions.filter(user_id=OuterRef('user_id')).order_by(
+            '-performance_score', 'start_time'
+        ).values('plan__name')[:1]
+        existing = {stats.user_id: stats for stats in stats_rows.annotate(best_plan=Subquery(best_plan))}
+
+        for user_id, stats in existing.items():
+            row = totals.get(user_id, {})
+            seconds = int(row['duration'].total_seconds()) if row.get('duration') else 0
+            longest, current, last = streaks.get(user_id, (0, 0, None))
+
+            stats.total_trainings = row.get('trainings', 0)
+            stats.total_training_days = row.get('training_days', 0)
+            stats.total_training_seconds = seconds
+            stats.total_training_time = seconds // 60
+            stats.total_calories_burned = row.get('calories') or 0.0
+            stats.best_performance_score = row.get('best_performance') or 0.0
+            stats.best_plan_name = stats.best_plan or ""
+            stats.best_accuracy_score = best_accuracy.get(user_id) or 0.0
+            stats.longest_training_streak = longest
+            stats.current_training_streak = current
+            stats.last_training_date = last
+            stats.calendar_week_trainings = row.get('weekly', 0)
+            stats.calendar_month_trainings = row.get('monthly', 0)
+            stats.week_start = week_start
+            stats.month_start = month_start
+            stats.last_updated = timezone.now()
+
+        UserStats.objects.bulk_update(
+            existing.values(),
+            [
+                'total_trainings', 'total_training_days', 'total_training_seconds', 'total_training_time',
+                'total_calories_burned', 'best_performance_score', 'best_plan_name', 'best_accuracy_score',
+                'longest_training_streak', 'current_training_streak', 'last_training_date',
+                'calendar_week_trainings', 'calendar_month_trainings', 'week_start', 'month_start', 'last_updated',
+            ],
+            batch_size=500,
+        )
+        return len(existing)
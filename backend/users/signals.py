@@ -0,0 +1,90 @@
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete, pre_save
+from django.dispatch import receiver
+from exercises.models import UserExerciseRecord
+from training.models import UserTrainingSession
+from .models import UserGoal, UserProfile
+from .profile_index import remove_profile_vector, update_profile_vector
+from .services import UserStatsService
+from utils.media_derivatives import schedule_derivatives
+
+PROFILE_VECTOR_FIELDS = ('gender', 'height', 'weight', 'age')
+
+
+@receiver(post_init, sender=UserTrainingSession)
+def remember_session_completion(sender, instance, **kwargs):
+    """
+    记下加载时的完成状态，用于判断本次保存是否是“刚刚完成”。
+    is_completed 被延迟加载时不读取 (否则每行多一次查询)，记为 None，保存前再查库
+    """
+    instance._stats_was_completed = instance.__dict__.get('is_completed')
+
+
+@receiver(pre_save, sender=UserTrainingSession)
+def load_unknown_session_completion(sender, instance, **kwargs):
+    if instance._stats_was_completed is None and instance.pk is not None:
+        instance._stats_was_completed = UserTrainingSession.objects.filter(pk=instance.pk).values_list(
+            'is_completed', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=UserTrainingSession)
+def update_user_stats_on_completion(sender, instance, created, **kwargs):
+    """会话从未完成变为完成时，增量更新 UserStats (重复保存不会重复计数)"""
+    if instance.is_completed and (created or not instance._stats_was_completed):
+        UserStatsService.record_completed_session(instance)
+    instance._stats_was_completed = instance.is_completed
+
+
+@receiver(post_delete, sender=UserTrainingSession)
+def rebuild_user_stats_on_delete(sender, instance, **kwargs):
+    """删除已完成的会话无法增量回退连续天数，提交后对该用户重算"""
+    if instance.is_completed:
+        user_id = instance.user_id
+        transaction.on_commit(lambda: UserStatsService.rebuild(user_ids=[user_id]))
+
+
+@receiver(post_save, sender=UserProfile)
+def generate_avatar_derivatives(sender, instance, **kwargs):
+    """头像变化后生成多档 WebP 缩略图"""
+    schedule_derivatives(instance, 'avatar')
+
+
+@receiver(post_save, sender=UserExerciseRecord)
+def update_best_accuracy(sender, instance, created, **kwargs):
+    if created:
+        UserStatsService.record_accuracy(instance.user_id, instance.accuracy_score)
+
+
+@receiver(post_init, sender=UserProfile)
+def remember_profile_vector_fields(sender, instance, **kwargs):
+    """
+    只记已加载的字段：only()/defer() 延迟的字段在这里读取会重新加载并再次触发
+    post_init，无限递归。有字段未加载时快照为 None，保存时按“已变化”处理
+    """
+    values = instance.__dict__
+    if all(f in values for f in PROFILE_VECTOR_FIELDS):
+        instance._vector_snapshot = tuple(values[f] for f in PROFILE_VECTOR_FIELDS)
+    else:
+        instance._vector_snapshot = None
+
+
+@receiver(post_save, sender=UserProfile)
+def update_profile_index(sender, instance, created, **kwargs):
+    """画像中参与相似度计算的字段变化时才更新索引 (保存 User 时也会连带保存画像)"""
+    snapshot = tuple(getattr(instance, f) for f in PROFILE_VECTOR_FIELDS)
+    if created or instance._vector_snapshot is None or snapshot != instance._vector_snapshot:
+        update_profile_vector(instance)
+    instance._vector_snapshot = snapshot
+
+
+@receiver(post_delete, sender=UserProfile)
+def remove_from_profile_index(sender, instance, **kwargs):
+    remove_profile_vector(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=UserGoal)
+def update_profile_index_on_goal_change(sender, instance, **kwargs):
+    profile = UserProfile.objects.filter(user_id=instance.user_id).first()
+    if profile:
+        update_profile_vector(profile)
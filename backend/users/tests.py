@@ -1,3 +1,218 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from training.models import TrainingPlan, UserTrainingSession
+from training.services import UserSimilarityService
+from users import profile_index
+from users.models import UserProfile, UserStats
+from users.services import UserStatsService
+
+
+class UserStatsIncrementalTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="stats_tester", password="pwd123456")
+
+    def _complete(self, days_ago, minutes=30, calories=100.0, score=3.0):
+        start = timezone.now() - timedelta(days=days_ago)
+        session = UserTrainingSession.objects.create(user=self.user, start_time=start)
+        session.end_time = start + timedelta(minutes=minutes)
+        session.is_completed = True
+        session.calories_burned = calories
+        session.performance_score = score
+        session.save()
+        return session
+
+    def test_completion_updates_totals_and_streak(self):
+        self._complete(days_ago=2)
+        self._complete(days_ago=1, score=4.5)
+        self._complete(days_ago=1)
+
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(stats.total_trainings, 3)
+        self.assertEqual(stats.total_training_days, 2)
+        self.assertEqual(stats.total_training_seconds, 90 * 60)
+        self.assertEqual(stats.current_training_streak, 2)
+        self.assertEqual(stats.longest_training_streak, 2)
+        self.assertEqual(stats.best_performance_score, 4.5)
+
+    def test_resaving_completed_session_does_not_double_count(self):
+        session = self._complete(days_ago=0)
+        session.ai_analysis = "补充分析"
+        session.save()
+        self.assertEqual(UserStats.objects.get(user=self.user).total_trainings, 1)
+
+    def test_deferred_completion_costs_no_query_and_is_checked_on_save(self):
+        self._complete(days_ago=1)
+        pending = UserTrainingSession.objects.create(user=self.user, start_time=timezone.now())
+        with self.assertNumQueries(1):
+            sessions = list(UserTrainingSession.objects.defer("is_completed"))
+        self.assertEqual(len(sessions), 2)
+
+        for session in UserTrainingSession.objects.defer("is_completed").order_by("id"):
+            session.ai_analysis = "补充分析"
+            session.save()
+        self.assertEqual(UserStats.objects.get(user=self.user).total_trainings, 1)
+
+        session = UserTrainingSession.objects.defer("is_completed").get(pk=pending.pk)
+        session.end_time = timezone.now()
+        session.is_completed = True
+        session.save()
+        self.assertEqual(UserStats.objects.get(user=self.user).total_trainings, 2)
+
+    def test_out_of_order_completion_falls_back_to_rebuild(self):
+        self._complete(days_ago=1)
+        self._complete(days_ago=3)
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(stats.total_trainings, 2)
+        self.assertEqual(stats.longest_training_streak, 1)
+        self.assertEqual(stats.last_training_date, timezone.localdate() - timedelta(days=1))
+
+    def test_rebuild_matches_incremental_values(self):
+        for days_ago in (5, 4, 4, 1, 0):
+            self._complete(days_ago=days_ago)
+        incremental = UserStats.objects.get(user=self.user)
+
+        UserStats.objects.filter(user=self.user).update(total_trainings=0, longest_training_streak=0)
+        UserStatsService.rebuild(user_ids=[self.user.id])
+        rebuilt = UserStats.objects.get(user=self.user)
+
+        for field in ("total_trainings", "total_training_days", "total_training_seconds",
+                      "longest_training_streak", "current_training_streak", "total_calories_burned"):
+            self.assertEqual(getattr(rebuilt, field), getattr(incremental, field), field)
+
+    def test_stale_window_reads_as_zero(self):
+        stats = UserStats.objects.get(user=self.user)
+        stats.calendar_week_trainings = 5
+        stats.week_start = timezone.localdate() - timedelta(days=14)
+        stats.roll_windows()
+        self.assertEqual(stats.calendar_week_trainings, 0)
+
+
+class TrainingStatsAPITests(TestCase):
+    def test_stats_endpoint_reads_single_row(self):
+        user = User.objects.create_user(username="stats_api", password="pwd123456")
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        with self.assertNumQueries(1):
+            response = client.get("/api/training/stats/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total_sessions"], 0)
+
+    def test_weekly_sessions_is_a_rolling_seven_day_count(self):
+        user = User.objects.create_user(username="stats_rolling", password="pwd123456")
+        for days_ago in (2, 8):
+            start = timezone.now() - timedelta(days=days_ago)
+            UserTrainingSession.objects.create(
+                user=user, start_time=start, end_time=start + timedelta(minutes=30), is_completed=True
+            )
+        client = APIClient()
+        client.force_authenticate(user=user)
+        with self.assertNumQueries(1):
+            response = client.get("/api/training/stats/")
+        self.assertEqual(response.data["total_sessions"], 2)
+        self.assertEqual(response.data["weekly_sessions"], 1)
+        self.assertIn("this_week_sessions", response.data)
+
+
+class ProfileIndexTests(TestCase):
+    def _user(self, username, gender="male", height=175.0, weight=70.0, age=25):
+        user = User.objects.create_user(username=username, password="pwd123456")
+        profile = user.profile
+        profile.gender, profile.height, profile.weight, profile.age = gender, height, weight, age
+        profile.save()
+        return user
+
+    def test_index_tracks_profile_saves_and_gender_partitions(self):
+        target = self._user("target")
+        twin = self._user("twin", height=176.0, weight=71.0)
+        self._user("other_gender", gender="female")
+
+        index = profile_index.get_profile_index()
+        neighbours = index.nearest(target.id, "male", k=5)
+        self.assertEqual([uid for uid, _ in neighbours], [twin.id])
+
+        twin.profile.gender = "female"
+        twin.profile.save()
+        self.assertEqual(profile_index.get_profile_index().nearest(target.id, "male", k=5), [])
+
+    def test_partial_profile_loads_do_not_recurse_and_reindex_on_save(self):
+        target = self._user("partial_target")
+        twin = self._user("partial_twin", height=176.0, weight=71.0)
+        self.assertEqual(len(UserProfile.objects.only("id")), 2)
+        self.assertEqual(len(UserProfile.objects.defer("gender")), 2)
+        twin.profile.refresh_from_db(fields=["weight"])
+
+        # 加载时 gender 未知，保存时按已变化处理并更新索引
+        profile = UserProfile.objects.defer("gender").get(user=twin)
+        self.assertIsNone(profile._vector_snapshot)
+        profile.gender = "female"
+        profile.save()
+        self.assertEqual(profile_index.get_profile_index().nearest(target.id, "male", k=5), [])
+
+    def test_ball_tree_matches_brute_force(self):
+        rows = [(i, "male", 150 + i, 50 + (i * 7) % 40, 18 + i % 30) for i in range(1, 60)]
+        index = profile_index.ProfileIndex(rows, goals={3: "muscle_gain"})
+        brute = index.nearest(5, "male", k=5)
+        with mock.patch.object(profile_index, "BALL_TREE_MIN_SIZE", 10):
+            tree = index.nearest(5, "male", k=5)
+        self.assertEqual([uid for uid, _ in tree], [uid for uid, _ in brute])
+
+    def test_cold_start_copies_similar_users_plan(self):
+        target = self._user("newbie")
+        mentor = self._user("mentor", height=174.0, weight=69.0)
+        plan = TrainingPlan.objects.create(
+            name="新手全身", description="描述", goal="general_fitness", created_by=mentor
+        )
+        UserTrainingSession.objects.create(
+            user=mentor, plan=plan, start_time=timezone.now(), performance_score=4.5
+        )
+
+        result = UserSimilarityService.recommend_for_cold_start(target)
+        self.assertIsNotNone(result)
+        self.assertEqual(result["ref_session"].plan, plan)
+
+
+class AvatarDerivativeTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_DERIVATIVES_ASYNC=False)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="avatar_tester", password="pwd123456")
+        self.client.force_authenticate(user=self.user)
+
+    def _upload(self, color):
+        buffer = io.BytesIO()
+        Image.new("RGB", (400, 300), color).save(buffer, "PNG")
+        avatar = SimpleUploadedFile("avatar.png", buffer.getvalue(), content_type="image/png")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch("/api/auth/profile/", {"avatar": avatar}, format="multipart")
+
+    def test_thumbnail_matches_client_pixel_density(self):
+        self._upload("red")
+        response = self.client.get("/api/auth/profile/")
+        self.assertEqual(set(response.data["avatar_variants"]), {"64", "128", "256"})
+        self.assertEqual(response.data["avatar_thumb"], response.data["avatar_variants"]["128"])
+        self.assertEqual(self.client.get("/api/auth/profile/?dpr=1").data["avatar_thumb"],
+                         response.data["avatar_variants"]["64"])
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        me = self.client.get("/api/auth/me/", HTTP_SEC_CH_DPR="3")
+        self.assertEqual(me.data["avatar_thumb"], response.data["avatar_variants"]["256"])
+
+        # 换头像后派生图跟着换成新内容的哈希地址
+        self._upload("blue")
+        updated = self.client.get("/api/auth/profile/").data["avatar_variants"]
+        self.assertNotEqual(updated["64"], response.data["avatar_variants"]["64"])
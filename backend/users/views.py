@@ -6,6 +6,7 @@ from rest_framework.decorators import api_view, permission_classes
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
 from rest_framework_simplejwt.tokens import RefreshToken
+from utils.media_derivatives import AVATAR_DISPLAY_SIZE, pick_variant
 from .models import UserProfile, TrainingLog, UserGoal, UserStats
 from .serializers import (UserRegisterSerializer, UserProfileSerializer, 
                          TrainingLogSerializer, UserGoalSerializer, 
@@ -56,12 +57,14 @@ class MeView(APIView):
     def get(self, request):
         profile = getattr(request.user, 'profile', None)
         avatar_url = request.build_absolute_uri(profile.avatar.url) if profile and profile.avatar else ""
+        avatar_thumb = pick_variant(request, profile.avatar_variants, AVATAR_DISPLAY_SIZE) if profile else None
         return Response({
             'id': request.user.id,
             'username': request.user.username,
             'nickname': profile.nickname if profile else "",
             'email': request.user.email,
-            'avatar': avatar_url
+            'avatar': avatar_url,
+            'avatar_thumb': avatar_thumb or avatar_url,
         })
 
 class TrainingLogView(generics.ListCreateAPIView):
@@ -101,7 +104,7 @@ class UserStatsView(generics.RetrieveAPIView):
 
     def get_object(self):
         stats, _ = UserStats.objects.get_or_create(user=self.request.user)
-        return stats
+        return stats.roll_windows()
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -116,7 +119,7 @@ def user_dashboard(request):
     
     dashboard_data = {
         'profile': UserProfileSerializer(profile).data,
-        'stats': UserStatsSerializer(stats).data,
+        'stats': UserStatsSerializer(stats.roll_windows()).data,
         'recent_logs': TrainingLogSerializer(recent_logs, many=True).data,
         'active_goals': UserGoalSerializer(active_goals, many=True).data,
     }
@@ -0,0 +1,195 @@
+"""
+批量调用 OpenAI 兼容的对话接口 (默认 DeepSeek)
+
+管理命令 (generate_tags / generate_progression) 把一批提示词交给 LLMBatchClient.run：
+请求在线程池中并发发送，并发数和每秒请求数都有上限，限流或服务端错误时指数退避重试。
+响应按请求体 (模型 + 消息) 的哈希缓存在磁盘上，重跑时相同的提示词直接读缓存，不再计费。
+结果按完成顺序返回给调用方线程，数据库写入留在调用方 (主线程) 完成。
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from django.conf import settings
+
+DEFAULT_BASE_URL = os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com')
+DEFAULT_MODEL = 'deepseek-chat'
+DEFAULT_CONCURRENCY = 4
+# 每秒最多发出的请求数
+DEFAULT_RATE = 2.0
+DEFAULT_TIMEOUT = 60
+MAX_RETRIES = 3
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def default_cache_dir():
+    return os.path.join(settings.BASE_DIR, 'llm_cache')
+
+
+def chunked(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class RateLimiter:
+    """按固定间隔放行请求 (多线程共享)，rate <= 0 时不限速"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_at = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_at)
+            self.next_at = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class ResponseCache:
+    """以请求体哈希为文件名的磁盘缓存，写入先落临时文件再原子替换"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @staticmethod
+    def key(payload):
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as handle:
+                return json.load(handle)['content']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, key, content):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as handle:
+            json.dump({'content': content}, handle, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+class LLMBatchClient:
+    """
+    并发、限速、带磁盘缓存的对话接口客户端。
+    cache_dir 为 None 时不使用缓存；base_url 可指向本地的 OpenAI 兼容服务做测试
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, model=DEFAULT_MODEL, concurrency=DEFAULT_CONCURRENCY,
+                 rate=DEFAULT_RATE, cache_dir=None, timeout=DEFAULT_TIMEOUT, max_retries=MAX_RETRIES):
+        self.api_key = api_key
+        self.url = base_url.rstrip('/') + '/chat/completions'
+        self.model = model
+        self.concurrency = max(1, concurrency)
+        self.limiter = RateLimiter(rate)
+        self.cache = ResponseCache(cache_dir) if cache_dir else None
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.request_count = 0
+        self.cache_hits = 0
+        self._local = threading.local()
+        self._count_lock = threading.Lock()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers.update({
+                'Content-Type': 'application/json',
+                'Authorization': f'Bearer {self.api_key}',
+            })
+        return session
+
+    def payload(self, system, prompt):
+        return {
+            'model': self.model,
+            'messages': [
+                {'role': 'system', 'content': system},
+                {'role': 'user', 'content': prompt},
+            ],
+            'response_format': {'type': 'json_object'},
+        }
+
+    def _post(self, payload):
+        for attempt in range(self.max_retries + 1):
+            self.limiter.wait()
+            with self._count_lock:
+                self.request_count += 1
+            try:
+                response = self._session().post(self.url, json=payload, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS:
+                    response.raise_for_status()
+                    return response.json()['choices'][0]['message']['content']
+                error = requests.HTTPError(f'HTTP {response.status_code}', response=response)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = exc
+            if attempt == self.max_retries:
+                raise error
+            time.sleep(2 ** attempt)
+
+    def complete(self, system, prompt):
+        """单个请求：返回解析后的 JSON 对象，优先读缓存；只有合法 JSON 才写入缓存"""
+        payload = self.payload(system, prompt)
+        key = ResponseCache.key(payload)
+        if self.cache is not None:
+            content = self.cache.get(key)
+            if content is not None:
+                with self._count_lock:
+                    self.cache_hits += 1
+                return json.loads(content)
+        content = self._post(payload)
+        data = json.loads(content)
+        if self.cache is not None:
+            self.cache.set(key, content)
+        return data
+
+    def run(self, jobs):
+        """
+        jobs: [(标识, system, prompt)]。按完成顺序产出 (标识, JSON 结果, 异常)，
+        失败的任务结果为 None、异常非空，不影响其他任务
+        """
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='llm-batch') as executor:
+            futures = {executor.submit(self.complete, system, prompt): job_id for job_id, system, prompt in jobs}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as exc:
+                    yield futures[future], None, exc
+
+
+def add_batch_arguments(parser):
+    """管理命令共用的并发、限速、缓存参数"""
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL, help='OpenAI 兼容接口地址')
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='同时进行的请求数上限')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='每秒最多发出的请求数 (0 为不限)')
+    parser.add_argument('--cache-dir', default=None, help='响应缓存目录，默认 BASE_DIR/llm_cache')
+    parser.add_argument('--no-cache', action='store_true', help='不读写响应缓存')
+
+
+def client_from_options(api_key, options):
+    return LLMBatchClient(
+        api_key,
+        base_url=options['base_url'],
+        model=options['model'],
+        concurrency=options['concurrency'],
+        rate=options['rate'],
+        cache_dir=None if options['no_cache'] else options['cache_dir'] or default_cache_dir(),
+    )
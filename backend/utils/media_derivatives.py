@@ -0,0 +1,240 @@
+"""
+上传媒体的派生文件 (WebP) 生成
+
+动作演示 (Exercise.demo_gif) 生成限宽的动画 WebP 和两种宽度的静态封面帧；
+头像 (UserProfile.avatar) 生成多种边长的正方形缩略图；姿态快照
+(PostureDiagnosis.snapshot) 生成多种宽度的缩略图。文件名包含源文件内容的哈希，
+内容不变则地址不变，可以按不可变资源长期缓存。
+
+派生结果记录在模型的 *_variants 字段：{'source': 源文件名, 'files': {规格: 存储路径}}。
+源文件变化后在事务提交时生成 (MEDIA_DERIVATIVES_ASYNC 开启时投递到 Celery)，
+生成前接口返回原文件，序列化器通过 variant_urls / pick_variant 给出派生地址。
+"""
+import hashlib
+import io
+
+from celery import shared_task
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.dispatch import Signal
+from PIL import Image, ImageOps, ImageSequence
+from rest_framework import serializers
+
+WEBP_QUALITY = 75
+DERIVATIVE_ROOT = 'derivatives'
+
+DEMO_MAX_SIZE = 480
+DEMO_POSTER_WIDTHS = (240, 480)
+AVATAR_SIZES = (64, 128, 256)
+SNAPSHOT_WIDTHS = (320, 640, 1280)
+# 前端默认的显示尺寸 (CSS 像素)，pick_variant 据此按像素密度选档
+AVATAR_DISPLAY_SIZE = 64
+DEMO_CARD_WIDTH = 160
+SNAPSHOT_DISPLAY_WIDTH = 320
+
+# (app_label, 模型名, 文件字段) -> (派生记录字段, 类型)
+MEDIA_FIELDS = {
+    ('exercises', 'exercise', 'demo_gif'): ('demo_variants', 'demo'),
+    ('users', 'userprofile', 'avatar'): ('avatar_variants', 'avatar'),
+    ('ai_models', 'posturediagnosis', 'snapshot'): ('snapshot_variants', 'snapshot'),
+}
+
+# 派生记录写回后发送 (sender=模型, pk, field_name)；写回用的是 update，不会触发 post_save
+derivatives_ready = Signal()
+
+
+def _encode(image, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4, **options)
+    return buffer.getvalue()
+
+
+def _rgb(image):
+    return image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+
+def _resized(image, width):
+    """等比缩放到不超过 width 的宽度 (不放大)"""
+    image = image.copy()
+    image.thumbnail((width, width * 10), Image.LANCZOS)
+    return image
+
+
+def _widths(original, widths):
+    """不大于原图的规格；原图比最小规格还小时只保留原尺寸一档"""
+    kept = [width for width in widths if width <= original]
+    return kept or [original]
+
+
+def render_demo(image):
+    """动画 WebP (限制最长边) + 首帧封面"""
+    outputs = {}
+    frames, durations = [], []
+    for frame in ImageSequence.Iterator(image):
+        scaled = _rgb(frame)
+        scaled.thumbnail((DEMO_MAX_SIZE, DEMO_MAX_SIZE), Image.LANCZOS)
+        frames.append(scaled)
+        durations.append(frame.info.get('duration', image.info.get('duration', 100)) or 100)
+    if len(frames) > 1:
+        outputs['animated'] = _encode(
+            frames[0], save_all=True, append_images=frames[1:], duration=durations, loop=0
+        )
+    else:
+        outputs['animated'] = _encode(frames[0])
+
+    image.seek(0)
+    poster = _rgb(image)
+    for width in _widths(poster.width, DEMO_POSTER_WIDTHS):
+        outputs[f'poster_{width}'] = _encode(_resized(poster, width))
+    return outputs
+
+
+def render_avatar(image):
+    """居中裁成正方形的多档缩略图"""
+    image = _rgb(ImageOps.exif_transpose(image))
+    return {
+        str(size): _encode(ImageOps.fit(image, (size, size), Image.LANCZOS))
+        for size in _widths(min(image.size), AVATAR_SIZES)
+    }
+
+
+def render_snapshot(image):
+    image = _rgb(ImageOps.exif_transpose(image))
+    return {str(width): _encode(_resized(image, width)) for width in _widths(image.width, SNAPSHOT_WIDTHS)}
+
+
+RENDERERS = {
+    'demo': render_demo,
+    'avatar': render_avatar,
+    'snapshot': render_snapshot,
+}
+
+
+def _derivative_name(kind, digest, label):
+    return f"{DERIVATIVE_ROOT}/{kind}/{digest[:2]}/{digest[:20]}_{label}.webp"
+
+
+def build_derivatives(fieldfile, kind):
+    """
+    读取源文件生成派生文件，返回 *_variants 字段的内容。无法识别的格式 (如视频)、
+    超出像素上限 (DecompressionBombError) 或解码出错的文件不生成，继续使用原文件；
+    同步模式下这里运行在上传请求中，不能让异常变成 500
+    """
+    variants = {'source': fieldfile.name, 'files': {}}
+    try:
+        with fieldfile.open('rb') as source:
+            data = source.read()
+        image = Image.open(io.BytesIO(data))
+        outputs = RENDERERS[kind](image)
+    except Exception as exc:
+        print(f"无法生成派生图 {fieldfile.name}: {exc}")
+        return variants
+    digest = hashlib.sha256(data).hexdigest()
+
+    for label, content in outputs.items():
+        name = _derivative_name(kind, digest, label)
+        # 同样内容的派生文件已存在时直接复用
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(content))
+        variants['files'][label] = name
+    return variants
+
+
+def needs_derivatives(instance, field_name):
+    """派生记录与当前源文件不一致 (新上传、替换或清空) 时需要重新生成"""
+    variants_field, _ = MEDIA_FIELDS[(instance._meta.app_label, instance._meta.model_name, field_name)]
+    fieldfile = getattr(instance, field_name)
+    recorded = (getattr(instance, variants_field) or {}).get('source')
+    return recorded != (fieldfile.name or None)
+
+
+def generate_for(model, pk, field_name):
+    """为某条记录生成派生文件并写回；期间源文件又被替换时放弃写入，由新一轮生成负责"""
+    variants_field, kind = MEDIA_FIELDS[(model._meta.app_label, model._meta.model_name, field_name)]
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not needs_derivatives(instance, field_name):
+        return
+    fieldfile = getattr(instance, field_name)
+    variants = build_derivatives(fieldfile, kind) if fieldfile else {}
+    # 用 update 写回，不触发 post_save，也不会覆盖并发的其他字段修改
+    updated = model.objects.filter(pk=pk, **{field_name: fieldfile.name or ''}).update(**{variants_field: variants})
+    if updated:
+        derivatives_ready.send(sender=model, pk=pk, field_name=field_name)
+
+
+@shared_task
+def generate_media_derivatives(app_label, model_name, pk, field_name):
+    generate_for(apps.get_model(app_label, model_name), pk, field_name)
+
+
+def schedule_derivatives(instance, field_name):
+    """源文件变化时登记生成任务，事务提交后执行 (或投递到 Celery)"""
+    if not needs_derivatives(instance, field_name):
+        return
+    model, pk = type(instance), instance.pk
+
+    def run():
+        if getattr(settings, 'MEDIA_DERIVATIVES_ASYNC', False):
+            try:
+                generate_media_derivatives.delay(model._meta.app_label, model._meta.model_name, pk, field_name)
+                return
+            except Exception as exc:
+                print(f"派生图任务投递失败，改为同步生成: {exc}")
+        generate_for(model, pk, field_name)
+    transaction.on_commit(run)
+
+
+def variant_urls(request, variants):
+    """{规格: 绝对地址}，尚未生成时为空字典"""
+    urls = {}
+    for label, name in ((variants or {}).get('files') or {}).items():
+        url = default_storage.url(name)
+        urls[label] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def variant_url(request, variants, label):
+    return variant_urls(request, variants).get(label)
+
+
+class VariantURLsField(serializers.Field):
+    """只读字段：把 *_variants 记录输出为 {规格: 地址}，由客户端按需选用 (如 <picture>/srcset)"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return variant_urls(self.context.get('request'), value)
+
+
+def client_dpr(request):
+    """客户端像素密度：优先 ?dpr=，其次 Client Hints 请求头，默认按 2 倍屏"""
+    if request is None:
+        return 2.0
+    value = request.query_params.get('dpr') if hasattr(request, 'query_params') else None
+    value = value or request.headers.get('Sec-CH-DPR') or request.headers.get('DPR')
+    try:
+        return min(max(float(value), 1.0), 4.0)
+    except (TypeError, ValueError):
+        return 2.0
+
+
+def pick_variant(request, variants, display_size, prefix=''):
+    """
+    在 prefix + 尺寸 命名的规格中，按显示尺寸 (CSS 像素) × 像素密度挑选最小的够用一档，
+    都不够时取最大一档；没有对应规格时返回 None
+    """
+    urls = variant_urls(request, variants)
+    sizes = sorted(
+        int(label[len(prefix):]) for label in urls
+        if label.startswith(prefix) and label[len(prefix):].isdigit()
+    )
+    if not sizes:
+        return None
+    needed = display_size * client_dpr(request)
+    chosen = next((size for size in sizes if size >= needed), sizes[-1])
+    return urls[f'{prefix}{chosen}']
@@ -4,49 +4,60 @@ from sentence_transformers import SentenceTransformer
 from django.conf import settings
 import os
 import shutil
+import threading
 
 class VectorDB:
     _instance = None
+    # 混合检索会在线程池中首次创建实例，加锁保证模型只加载一次、不会拿到未初始化完的实例
+    _lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(VectorDB, cls).__new__(cls)
-            print("⏳ 正在初始化 M3E 中文向量模型...")
-            
-            persist_path = os.path.join(settings.BASE_DIR, 'chroma_db_data')
-            model_name = "moka-ai/m3e-base"
-            
-            cls._instance.client = chromadb.PersistentClient(path=persist_path)
-            
-            cls._instance.ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name=model_name
-            )
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = cls._create()
+        return cls._instance
+
+    @classmethod
+    def _create(cls):
+        instance = super(VectorDB, cls).__new__(cls)
+        instance._metadata_fields = None
+        print("⏳ 正在初始化 M3E 中文向量模型...")
+        
+        persist_path = os.path.join(settings.BASE_DIR, 'chroma_db_data')
+        model_name = "moka-ai/m3e-base"
+        
+        instance.client = chromadb.PersistentClient(path=persist_path)
+        
+        instance.ef = embedding_functions.SentenceTransformerEmbeddingFunction(
+            model_name=model_name
+        )
 
-            # 🔥🔥🔥 修正后的逻辑 🔥🔥🔥
+        # 🔥🔥🔥 修正后的逻辑 🔥🔥🔥
+        try:
+            # 1. 尝试获取现有集合
+            instance.collection = instance.client.get_collection(
+                name="fitness_exercises",
+                embedding_function=instance.ef
+            )
+        except Exception:
+            # 2. 如果获取失败（不存在，或维度不匹配），准备重建
+            print("⚠️ 检测到需要重建向量集合...")
+            
+            # 3. 尝试删除旧的（如果不存在就忽略错误，防止报错）
             try:
-                # 1. 尝试获取现有集合
-                cls._instance.collection = cls._instance.client.get_collection(
-                    name="fitness_exercises",
-                    embedding_function=cls._instance.ef
-                )
+                instance.client.delete_collection("fitness_exercises")
             except Exception:
-                # 2. 如果获取失败（不存在，或维度不匹配），准备重建
-                print("⚠️ 检测到需要重建向量集合...")
-                
-                # 3. 尝试删除旧的（如果不存在就忽略错误，防止报错）
-                try:
-                    cls._instance.client.delete_collection("fitness_exercises")
-                except Exception:
-                    pass # 删不掉就算了，说明本来就没有
+                pass # 删不掉就算了，说明本来就没有
 
-                # 4. 创建新的
-                cls._instance.collection = cls._instance.client.create_collection(
-                    name="fitness_exercises",
-                    embedding_function=cls._instance.ef
-                )
-                
-            print("✅ M3E 中文向量库初始化完成！")
-        return cls._instance
+            # 4. 创建新的
+            instance.collection = instance.client.create_collection(
+                name="fitness_exercises",
+                embedding_function=instance.ef
+            )
+            
+        print("✅ M3E 中文向量库初始化完成！")
+        return instance
 
     def rebuild_index(self):
         from exercises.models import Exercise
@@ -87,9 +98,12 @@ class VectorDB:
             metadatas.append({
                 "name": ex.name,
                 "target_muscle": ex.target_muscle,
-                "muscle_cn": target_muscle_cn
+                "muscle_cn": target_muscle_cn,
+                "equipment": ex.equipment,
+                "level": ex.level
             })
 
+        self._metadata_fields = None
         if ids:
             self.collection.add(
                 documents=documents,
@@ -99,10 +113,22 @@ class VectorDB:
         
         print(f"🎉 成功将 {len(ids)} 个动作载入 M3E 向量库！")
 
-    def search(self, query_text, top_k=10):
+    def metadata_fields(self):
+        """
+        索引中记录带有的元数据字段。早期建立的索引只有 name / target_muscle / muscle_cn，
+        按 equipment、level 过滤会什么都匹配不到，调用方据此丢弃不支持的过滤条件
+        """
+        if self._metadata_fields is None:
+            sample = self.collection.get(limit=1, include=['metadatas'])
+            metadatas = sample.get('metadatas') or []
+            self._metadata_fields = frozenset(metadatas[0] or {}) if metadatas else frozenset()
+        return self._metadata_fields
+
+    def search(self, query_text, top_k=10, where=None):
+        # where 为 Chroma 元数据过滤条件，如 {"target_muscle": "chest"}
         count = self.collection.count()
         if count == 0: return []
         real_k = min(top_k, count)
-        results = self.collection.query(query_texts=[query_text], n_results=real_k)
+        results = self.collection.query(query_texts=[query_text], n_results=real_k, where=where)
         if results['ids']: return results['ids'][0]
         return []
\ No newline at end of file
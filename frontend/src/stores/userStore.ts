@@ -1,6 +1,15 @@
 import { defineStore } from 'pinia'
 import apiClient from '@/api'
 
+// 会话中按用户缓存的知识图谱 (key 为前缀 + 用户 id)，切换账号时需要清掉
+export const GRAPH_CACHE_PREFIX = 'exercise-graph-cache'
+
+const clearGraphCache = () => {
+  Object.keys(sessionStorage)
+    .filter((key) => key.startsWith(GRAPH_CACHE_PREFIX))
+    .forEach((key) => sessionStorage.removeItem(key))
+}
+
 // 定义用户类型
 interface User {
   id: number
@@ -50,6 +59,7 @@ export const useUserStore = defineStore('user', {
         
         localStorage.setItem('jwt_token', access)
         localStorage.setItem('refresh_token', refresh)
+        clearGraphCache()
         
         // 获取用户信息
         const userRes = await apiClient.get('/auth/me/')
@@ -68,6 +78,7 @@ export const useUserStore = defineStore('user', {
     logout() {
       localStorage.removeItem('jwt_token')
       localStorage.removeItem('refresh_token')
+      clearGraphCache()
       this.user = null
       this.isAuthenticated = false
       this.error = null